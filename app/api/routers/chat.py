@@ -1,136 +1,194 @@
+import asyncio
+import json
+import logging
 import time
-import numpy as np
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_read_db
 from app.services.auth import auth_service
 from app.models.chat import ChatRequest, ChatResponse, ChatCitation
-from app.models.database import Document as DBDocument, DocumentChunk as DBDocumentChunk
-from app.ml.embeddings import EmbeddingGenerator
+from app.retrieval import RetrievalQuery, RetrievalResult, retriever
+from app.services.answer_cache import CacheLookup, answer_cache
 
 router = APIRouter()
-embedding_generator = EmbeddingGenerator()
+logger = logging.getLogger(__name__)
+
+NO_DOCUMENTS_ANSWER = "I couldn't find any documents to answer your question. Please upload some documents first."
+NO_PASSAGES_ANSWER = "I searched your documents but couldn't find any relevant information to answer your question."
 
 def get_user_id(user: Any) -> str:
     """Safely get user ID from either a Supabase object or a test dictionary."""
     if isinstance(user, dict):
         return user.get("id")
-    
+
     # Handle UserResponse object from newer Supabase client
     if hasattr(user, "user") and user.user:
         return str(user.user.id)
-        
+
     return str(user.id)
 
+async def _find_passages(
+    db: AsyncSession, request: ChatRequest, user_id: str
+) -> Tuple[CacheLookup, Optional[RetrievalResult]]:
+    """
+    Embed the query, then answer from the cache or retrieve the best chunks.
+
+    Returns:
+        tuple: (cache lookup, retrieval result or None on a cache hit)
+    """
+    # 1. Embed the query; a near-duplicate question over the same documents is answered from cache
+    embedding = retriever.embed(request.query)
+    cached = await answer_cache.lookup(
+        user_id, answer_cache.scope("chat", request.document_ids or []), embedding
+    )
+    if cached.response is not None:
+        return cached, None
+
+    # 2-3. Keep the best chunks above the relevance threshold,
+    # from the user's documents (or just the requested ones)
+    top = await retriever.search(db, RetrievalQuery(
+        embedding=embedding,
+        user_id=user_id,
+        k=settings.CHAT_TOP_K,
+        min_similarity=settings.CHAT_MIN_SIMILARITY,
+        document_ids=request.document_ids,
+    ), conversation_id=request.conversation_id)
+    return cached, top
+
+def _compose(top: RetrievalResult) -> Tuple[List[ChatCitation], Iterator[str]]:
+    """Citations and the answer as pieces of text; joined, the pieces are the full answer."""
+    if not top.scanned:
+        return [], iter([NO_DOCUMENTS_ANSWER])
+    if not top.hits:
+        return [], iter([NO_PASSAGES_ANSWER])
+
+    citations = [
+        ChatCitation(
+            document_id=hit.document.id,
+            chunk_id=hit.chunk.id,
+            text=hit.chunk.text[:300] + ("..." if len(hit.chunk.text) > 300 else ""),
+            page_number=hit.chunk.meta_info.get("page_number") if hit.chunk.meta_info else None,
+            similarity_score=float(hit.score)
+        )
+        for hit in top.hits
+    ]
+    return citations, _answer_parts(top)
+
+def _answer_parts(top: RetrievalResult) -> Iterator[str]:
+    # 4. Construct Answer (Retrieval-based)
+    # In a full implementation, this text would be fed to an LLM (OpenAI/Anthropic)
+    # to generate a natural language response, and its tokens yielded here.
+    # For now, we present the most relevant excerpts in a conversational format.
+    count = len(top.hits)
+    yield f"Based on your documents, I found {count} relevant passage{'s' if count > 1 else ''} that answer your question:\n\n"
+
+    for idx, hit in enumerate(top.hits, 1):
+        # Format each excerpt with numbering
+        yield ("\n\n" if idx > 1 else "") + f"{idx}. {hit.chunk.text.strip()}"
+
+    # Add a helpful closing
+    if count > 1:
+        yield "\n\nThese passages are ordered by relevance. You can view the source citations below for more context."
+
 @router.post("", response_model=ChatResponse)
 async def chat_with_documents(
     request: ChatRequest,
     current_user: Any = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Chat with your documents. 
+    Chat with your documents.
     Currently implements a Retrieval-Augmented Generation (RAG) flow.
     """
     start_time = time.time()
     user_id = get_user_id(current_user)
-    
+
     try:
-        # 1. Generate embedding for the query
-        query_embedding = embedding_generator.generate_embeddings([request.query])[0]
-        
-        # 2. Build base query
-        base_query = db.query(DBDocumentChunk, DBDocument)\
-            .join(DBDocument)\
-            .filter(DBDocument.user_id == user_id)
-            
-        # 3. Filter by specific documents if requested
-        if request.document_ids:
-            base_query = base_query.filter(DBDocument.id.in_(request.document_ids))
-            
-        # 4. Get all candidate chunks (for re-ranking/filtering)
-        # Note: In a production app with millions of chunks, you'd use the vector index directly 
-        # via SQL/pgvector operators. For this scale, fetching and computing similarity in-memory 
-        # or using a simpler filter is acceptable, but ideally we use the vector operator.
-        # Since we are using python-based similarity in other parts, we'll stick to that for consistency
-        # but limit the fetch to avoid OOM.
-        
-        # Optimization: Fetch only necessary fields
-        chunks = base_query.all()
-        
-        if not chunks:
-            return ChatResponse(
-                answer="I couldn't find any documents to answer your question. Please upload some documents first.",
-                citations=[],
-                processing_time=time.time() - start_time
-            )
-            
-        # 5. Calculate similarity
-        scored_results = []
-        for chunk, document in chunks:
-            if chunk.embedding is None:
-                continue
-                
-            chunk_embedding = np.array(chunk.embedding)
-            similarity = np.dot(query_embedding, chunk_embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
-            )
-            
-            if similarity >= 0.4:  # Threshold for relevance
-                scored_results.append((similarity, chunk, document))
-                
-        # 6. Sort and select top results
-        scored_results.sort(key=lambda x: x[0], reverse=True)
-        top_results = scored_results[:5]
-        
-        if not top_results:
-             return ChatResponse(
-                answer="I searched your documents but couldn't find any relevant information to answer your question.",
-                citations=[],
-                processing_time=time.time() - start_time
-            )
-            
-        # 7. Construct Answer (Retrieval-based)
-        # In a full implementation, this text would be fed to an LLM (OpenAI/Anthropic)
-        # to generate a natural language response.
-        # For now, we present the most relevant excerpts in a conversational format.
-        
-        # Create a more conversational response
-        intro = f"Based on your documents, I found {len(top_results)} relevant passage{'s' if len(top_results) > 1 else ''} that answer your question:\n\n"
-        excerpts = []
-        citations = []
-        
-        for idx, (score, chunk, doc) in enumerate(top_results, 1):
-            # Format each excerpt with numbering
-            excerpt_text = chunk.text.strip()
-            excerpts.append(f"{idx}. {excerpt_text}")
-            
-            citations.append(ChatCitation(
-                document_id=doc.id,
-                chunk_id=chunk.id,
-                text=chunk.text[:300] + ("..." if len(chunk.text) > 300 else ""),
-                page_number=chunk.meta_info.get("page_number") if chunk.meta_info else None,
-                similarity_score=float(score)
-            ))
-        
-        # Combine into a natural answer
-        answer = intro + "\n\n".join(excerpts)
-        
-        # Add a helpful closing
-        if len(top_results) > 1:
-            answer += "\n\nThese passages are ordered by relevance. You can view the source citations below for more context."
-        
-        
-        return ChatResponse(
-            answer=answer,
+        cached, top = await _find_passages(db, request, user_id)
+        if top is None:
+            return cached.response.model_copy(update={"processing_time": time.time() - start_time})
+
+        citations, parts = _compose(top)
+        response = ChatResponse(
+            answer="".join(parts),
             citations=citations,
             processing_time=time.time() - start_time
         )
-        
+        if top.hits:
+            answer_cache.store(cached, response)
+        return response
+
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Chat error: {str(e)}"
         )
+
+def _encode_event(event: str, data: Dict[str, Any], sse: bool) -> str:
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+@router.post("/stream")
+async def stream_chat_with_documents(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: Any = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Chat with your documents, streamed as the answer is assembled.
+
+    Emits newline-delimited JSON objects, or server-sent events when the
+    client accepts ``text/event-stream``:
+
+    - ``citations``: sent as soon as the top-k chunks are known
+    - ``delta``: the next piece of answer text, in order
+    - ``done``: processing time, after the last delta
+    - ``error``: the stream failed; nothing follows
+
+    If the client disconnects, the response task is cancelled, which stops
+    any retrieval still in flight.
+    """
+    start_time = time.time()
+    user_id = get_user_id(current_user)
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            cached, top = await _find_passages(db, request, user_id)
+            if top is None:
+                citations, parts = cached.response.citations, iter([cached.response.answer])
+            else:
+                citations, parts = _compose(top)
+            yield _encode_event("citations", {
+                "citations": [citation.model_dump(mode="json") for citation in citations]
+            }, sse)
+
+            answer = []
+            for part in parts:
+                answer.append(part)
+                yield _encode_event("delta", {"text": part}, sse)
+
+            processing_time = time.time() - start_time
+            yield _encode_event("done", {"processing_time": processing_time}, sse)
+            if top is not None and top.hits:
+                answer_cache.store(cached, ChatResponse(
+                    answer="".join(answer), citations=citations, processing_time=processing_time
+                ))
+        except asyncio.CancelledError:
+            logger.info("Chat stream for user %s cancelled by client disconnect", user_id)
+            raise
+        except Exception as e:
+            yield _encode_event("error", {"detail": f"Chat error: {str(e)}"}, sse)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Header
-from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import Any, Optional
 import os
 import logging
 
+from app.core.config import settings
+from app.services.auth import auth_service
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+async def require_debug_access(current_user: Any = Depends(auth_service.get_current_user)) -> None:
+    """
+    Gate endpoints that expose data across tenants: they need an
+    authenticated user and are hidden entirely unless DEBUG is set.
+    """
+    if not settings.DEBUG:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
 @router.get("/debug/auth")
 async def debug_auth(authorization: Optional[str] = Header(None)):
     """
@@ -56,3 +68,34 @@ async def debug_auth(authorization: Optional[str] = Header(None)):
     
     logger.info(f"Debug auth info: {debug_info}")
     return debug_info
+
+
+@router.get("/debug/queue", dependencies=[Depends(require_debug_access)])
+async def debug_queue():
+    """
+    Report ingestion queue depth per tenant and lane, plus the RQ backlog.
+    """
+    from app.workers.queue import get_queue
+    from app.workers.scheduler import get_scheduler
+
+    try:
+        return {
+            "tenants": get_scheduler().depths(),
+            "dispatched": get_queue().count,
+        }
+    except Exception as e:
+        logger.warning(f"Queue stats unavailable: {str(e)}")
+        return {"error": str(e)}
+
+
+@router.get("/debug/sql", dependencies=[Depends(require_debug_access)])
+async def debug_sql(top: int = 10, reset: bool = False):
+    """
+    Report SQL time per endpoint and the statements that dominate it.
+    """
+    from app.core.sql_stats import endpoint_sql_stats
+
+    report = endpoint_sql_stats.snapshot(top=top)
+    if reset:
+        endpoint_sql_stats.reset()
+    return report
@@ -1,16 +1,25 @@
+import base64
+import io
+import logging
 import uuid
+import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import List, Any
+from typing import Any, AsyncIterator, BinaryIO, Iterator, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 import time
 
 from app.core.config import settings
 from app.models.schemas import (
+    BatchUploadError,
+    BatchUploadResponse,
     Document,
     DocumentChunk as DocumentChunkSchema,
+    DocumentListItem,
+    DocumentPage,
     SearchQuery,
     SearchResponse,
     SearchResult,
@@ -19,18 +28,22 @@ from app.models.schemas import (
 )
 from app.models.database import Document as DBDocument, DocumentChunk as DBDocumentChunk
 from app.services.auth import auth_service
-from app.core.database import get_db
+from app.core.database import get_async_db, get_read_db
+from app.retrieval import RetrievalQuery, retriever
+from app.services.answer_cache import answer_cache
 from app.services.storage import save_document_bytes
-from app.workers.queue import QueueUnavailableError, enqueue_document_processing
-from app.workers.tasks import process_document_task
+from app.workers.pg_queue import enqueue_job
+from app.workers.queue import (
+    QueueUnavailableError,
+    enqueue_document_batch_processing,
+    enqueue_document_processing,
+)
 from gotrue import User as SupabaseUser
-from app.ml.embeddings import EmbeddingGenerator
 from app.ml.summarization import summarization_generator
-import numpy as np
 import fitz
 
 router = APIRouter()
-embedding_generator = EmbeddingGenerator()
+logger = logging.getLogger(__name__)
 
 def get_user_id(user: Any) -> str:
     """Safely get user ID from either a Supabase object or a test dictionary."""
@@ -43,12 +56,78 @@ def get_user_id(user: Any) -> str:
         
     return str(user.id)
 
+# Fields selectable via ?fields= on GET /documents, mapped to their columns
+_DOCUMENT_LIST_FIELDS = {
+    "id": DBDocument.id,
+    "user_id": DBDocument.user_id,
+    "title": DBDocument.title,
+    "storage_path": DBDocument.storage_path,
+    "status": DBDocument.status,
+    "created_at": DBDocument.created_at,
+    "metadata": DBDocument.meta_info,
+}
+
+def _encode_cursor(created_at: datetime, document_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of _encode_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        created_at, document_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(document_id)
+    except (UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _read_pdf_metadata(file_content: bytes) -> dict:
+    """Validate PDF bytes and return the metadata stored on upload."""
+    with fitz.open(stream=file_content, filetype="pdf") as doc:
+        if not doc.page_count:
+            raise ValueError("Invalid or empty PDF file")
+        return {
+            "page_count": doc.page_count,
+            "title": doc.metadata.get("title", ""),
+            "author": doc.metadata.get("author", ""),
+        }
+
+def _build_document(
+    user_id: str,
+    file_id: str,
+    filename: str,
+    file_content: bytes,
+    content_type: str,
+    pdf_metadata: dict,
+) -> DBDocument:
+    """Save PDF bytes to storage and return an unsaved document row."""
+    safe_filename = Path(filename).name or f"document-{file_id}.pdf"
+    storage_key = f"{user_id}/{file_id}/{safe_filename}"
+    storage_result = save_document_bytes(
+        file_content,
+        storage_key,
+        content_type=content_type or "application/pdf",
+    )
+    return DBDocument(
+        id=file_id,
+        user_id=user_id,
+        title=safe_filename,
+        storage_path=storage_result["path"],
+        status="uploaded",
+        meta_info={
+            "original_name": filename,
+            "size": len(file_content),
+            "content_type": content_type,
+            "upload_date": datetime.utcnow().isoformat(),
+            "storage_provider": storage_result.get("provider"),
+            "storage_public_url": storage_result.get("public_url"),
+            **pdf_metadata,
+        }
+    )
+
 @router.post("/upload", response_model=Document)
 async def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: SupabaseUser = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a new document and queue it for processing"""
     if not file.filename or not file.filename.lower().endswith('.pdf'):
@@ -72,36 +151,27 @@ async def upload_document(
         )
 
     try:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.info(f"Starting document upload for user: {user_id}, filename: {file.filename}")
         
         try:
-            with fitz.open(stream=file_content, filetype="pdf") as doc:
-                if not doc.page_count:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or empty PDF file")
-                pdf_metadata = {
-                    "page_count": doc.page_count,
-                    "title": doc.metadata.get("title", ""),
-                    "author": doc.metadata.get("author", ""),
-                }
-                logger.info(f"PDF validated: {doc.page_count} pages")
+            pdf_metadata = _read_pdf_metadata(file_content)
+            logger.info(f"PDF validated: {pdf_metadata['page_count']} pages")
         except Exception as e:
             logger.error(f"PDF validation failed: {str(e)}")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid or corrupted PDF file: {str(e)}")
 
-        safe_filename = Path(file.filename).name or f"document-{file_id}.pdf"
-        storage_key = f"{user_id}/{file_id}/{safe_filename}"
-        
-        logger.info(f"Attempting to save file with storage_key: {storage_key}")
-        
+        logger.info(f"Attempting to save file for document: {file_id}")
+
         try:
-            storage_result = save_document_bytes(
+            db_document = _build_document(
+                user_id,
+                file_id,
+                file.filename,
                 file_content,
-                storage_key,
-                content_type=file.content_type or "application/pdf",
+                file.content_type,
+                pdf_metadata,
             )
-            logger.info(f"File saved successfully: {storage_result}")
+            logger.info(f"File saved successfully: {db_document.storage_path}")
         except Exception as e:
             logger.error(f"Storage save failed: {str(e)}")
             raise HTTPException(
@@ -109,73 +179,252 @@ async def upload_document(
                 detail=f"Failed to save file: {str(e)}"
             )
 
-        db_document = DBDocument(
-            id=file_id,
-            user_id=user_id,
-            title=safe_filename,
-            storage_path=storage_result["path"],
-            status="uploaded",
-            meta_info={
-                "original_name": file.filename,
-                "size": len(file_content),
-                "content_type": file.content_type,
-                "upload_date": datetime.utcnow().isoformat(),
-                "storage_provider": storage_result.get("provider"),
-                "storage_public_url": storage_result.get("public_url"),
-                **pdf_metadata,
-            }
-        )
-        
         logger.info(f"Creating database record for document: {file_id}")
         db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
+        await db.commit()
+        await db.refresh(db_document)
         logger.info(f"Database record created successfully")
 
         try:
-            enqueue_document_processing(str(db_document.id))
+            enqueue_document_processing(
+                str(db_document.id),
+                user_id=user_id,
+                page_count=pdf_metadata.get("page_count"),
+            )
             logger.info(f"Document queued for processing: {db_document.id}")
         except QueueUnavailableError:
-            logger.warning(f"Queue unavailable, using background task for: {db_document.id}")
-            background_tasks.add_task(process_document_task, str(db_document.id))
+            logger.warning(f"Queue unavailable, using durable job table for: {db_document.id}")
+            enqueue_job(db, db_document.id)
+            await db.commit()
 
         return Document.from_orm(db_document)
 
     except HTTPException as e:
-        db.rollback()
+        await db.rollback()
         raise e
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Unexpected error in upload_document: {str(e)}", exc_info=True)
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
+
+
+def _spooled_size(upload: UploadFile) -> int:
+    """Size of an upload already spooled by the multipart parser, without reading it."""
+    upload.file.seek(0, io.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    return size
+
+def _iter_zip_pdfs(archive_file: BinaryIO) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """Yield (filename, content, error) for each PDF in a zip, one entry at a time."""
+    with zipfile.ZipFile(archive_file) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                continue
+            name = Path(info.filename).name
+            # Check the declared size before inflating to avoid zip bombs
+            if info.file_size > settings.MAX_UPLOAD_SIZE:
+                yield name, None, "File is too large"
+                continue
+            # and never inflate more than the limit, whatever the header claims
+            with archive.open(info) as entry:
+                content = entry.read(settings.MAX_UPLOAD_SIZE + 1)
+            if len(content) > settings.MAX_UPLOAD_SIZE:
+                yield name, None, "File is too large"
+                continue
+            yield name, content, None
+
+async def _iter_batch_files(
+    files: List[UploadFile],
+) -> AsyncIterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Yield (filename, content, error) for every PDF in the upload, expanding zips.
+
+    Uploads are read from the parser's temp files: archives are opened in
+    place, so at most one PDF is held in memory at a time.
+    """
+    for upload in files:
+        filename = upload.filename or ""
+        lowered = filename.lower()
+        if lowered.endswith(".zip"):
+            if _spooled_size(upload) > settings.MAX_BATCH_ARCHIVE_SIZE:
+                yield filename, None, "Archive is too large"
+                continue
+            try:
+                for entry in _iter_zip_pdfs(upload.file):
+                    yield entry
+            except zipfile.BadZipFile:
+                yield filename, None, "Invalid zip archive"
+        elif lowered.endswith(".pdf"):
+            if _spooled_size(upload) > settings.MAX_UPLOAD_SIZE:
+                yield filename, None, "File is too large"
+                continue
+            yield filename, await upload.read(), None
+        else:
+            yield filename, None, "Only PDF files are supported"
+
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    current_user: SupabaseUser = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Upload many PDFs, or zip archives of PDFs, and queue them as one job.
+
+    Files are validated and written to storage one at a time, every document
+    row is inserted in a single transaction, and the whole batch is queued as
+    one coalesced job so the worker can embed chunks across documents in
+    full-sized batches. Invalid files are reported in ``errors`` and do not
+    fail the batch.
+    """
+    user_id = get_user_id(current_user)
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not determine user ID")
+
+    db_documents: List[DBDocument] = []
+    errors: List[BatchUploadError] = []
+    total_pages = 0
+
+    async for filename, file_content, error in _iter_batch_files(files):
+        if len(db_documents) >= settings.MAX_BATCH_FILES:
+            errors.append(BatchUploadError(filename=filename, detail=f"Batch limit of {settings.MAX_BATCH_FILES} files reached"))
+            continue
+        if error is None and not file_content:
+            error = "Uploaded file is empty"
+        elif error is None and len(file_content) > settings.MAX_UPLOAD_SIZE:
+            error = "File is too large"
+        if error is not None:
+            errors.append(BatchUploadError(filename=filename, detail=error))
+            continue
+
+        try:
+            pdf_metadata = _read_pdf_metadata(file_content)
+        except Exception as e:
+            errors.append(BatchUploadError(filename=filename, detail=f"Invalid or corrupted PDF file: {str(e)}"))
+            continue
+
+        try:
+            db_documents.append(_build_document(
+                user_id,
+                str(uuid.uuid4()),
+                filename,
+                file_content,
+                "application/pdf",
+                pdf_metadata,
+            ))
+        except Exception as e:
+            logger.error(f"Storage save failed for {filename}: {str(e)}")
+            errors.append(BatchUploadError(filename=filename, detail=f"Failed to save file: {str(e)}"))
+            continue
+        total_pages += pdf_metadata["page_count"]
+
+    if not db_documents:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No valid PDF files in batch"
+        )
+
+    try:
+        db.add_all(db_documents)
+        await db.commit()
+        logger.info(f"Created {len(db_documents)} document records for user: {user_id}")
+
+        document_ids = [str(document.id) for document in db_documents]
+        try:
+            enqueue_document_batch_processing(document_ids, user_id=user_id, page_count=total_pages)
+        except QueueUnavailableError:
+            logger.warning(f"Queue unavailable, using durable job table for batch of {len(document_ids)}")
+            for document_id in document_ids:
+                enqueue_job(db, document_id)
+            await db.commit()
+
+        return BatchUploadResponse(
+            documents=[Document.from_orm(document) for document in db_documents],
+            errors=errors,
+            total_pages=total_pages,
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in upload_documents_batch: {str(e)}", exc_info=True)
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
 
 
-@router.get("", response_model=List[Document])
+@router.get("", response_model=DocumentPage, response_model_exclude_unset=True)
 async def list_documents(
+    limit: int = Query(settings.DOCUMENTS_PAGE_SIZE, ge=1, le=settings.DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,status"),
+    include_total: bool = Query(True, description="Count all of the user's documents"),
     current_user: SupabaseUser = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """List documents for the current user"""
+    """
+    List documents for the current user, newest first.
+
+    Pages are keyed on (created_at, id) rather than OFFSET, so every page costs
+    the same regardless of depth. Pass the returned next_cursor to get the
+    following page; it is omitted on the last page.
+    """
     user_id = get_user_id(current_user)
-    documents = (
-        db.query(DBDocument)
-        .filter(DBDocument.user_id == user_id)
-        .order_by(DBDocument.created_at.desc())
-        .all()
+
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in _DOCUMENT_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+    else:
+        selected = list(_DOCUMENT_LIST_FIELDS)
+    # id and created_at are needed for the cursor even when not returned
+    columns = list(dict.fromkeys(["id", "created_at", *selected]))
+
+    query = (
+        select(*[_DOCUMENT_LIST_FIELDS[name].label(name) for name in columns])
+        .where(DBDocument.user_id == user_id)
+        .order_by(DBDocument.created_at.desc(), DBDocument.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = _decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        query = query.where(tuple_(DBDocument.created_at, DBDocument.id) < tuple_(cursor_created_at, cursor_id))
+
+    rows = (await db.execute(query)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        item = {name: row[name] for name in selected}
+        item["id"] = row["id"]
+        if "metadata" in item:
+            item["metadata"] = item["metadata"] or {}
+        items.append(DocumentListItem(**item))
+
+    page = DocumentPage(
+        items=items,
+        next_cursor=_encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None,
     )
-    return [Document.from_orm(doc) for doc in documents]
+    if include_total:
+        page.total = (await db.execute(
+            select(func.count()).select_from(DBDocument).where(DBDocument.user_id == user_id)
+        )).scalar_one()
+    return page
 
 @router.get("/{document_id}", response_model=Document)
 async def get_document(
     document_id: uuid.UUID,
     current_user: SupabaseUser = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get document metadata"""
     user_id = get_user_id(current_user)
-    document = db.query(DBDocument).filter(DBDocument.id == document_id).first()
+    document = await db.get(DBDocument, document_id)
 
     if not document:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
@@ -189,49 +438,36 @@ async def get_document(
 async def search_documents(
     query: SearchQuery,
     current_user: SupabaseUser = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Search across documents using semantic similarity"""
     start_time = time.time()
     user_id = get_user_id(current_user)
 
     try:
-        query_embedding = embedding_generator.generate_embeddings([query.query])[0]
-
-        base_query = db.query(DBDocumentChunk, DBDocument)\
-            .join(DBDocument)\
-            .filter(DBDocument.user_id == user_id)
-
-        if query.filters:
-            for key, value in query.filters.items():
-                base_query = base_query.filter(DBDocumentChunk.meta_info[key].astext == str(value))
-
-        results = base_query.all()
-
-        scored_results = []
-        for chunk, document in results:
-            if chunk.embedding is None:
-                continue
-            chunk_embedding = np.array(chunk.embedding)
-            similarity = np.dot(query_embedding, chunk_embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
+        top = await retriever.retrieve(
+            db,
+            query.query,
+            user_id,
+            query.top_k,
+            min_similarity=query.min_similarity,
+            filters=query.filters,
+        )
+        top_results = [
+            SearchResult(
+                chunk=DocumentChunkSchema.from_orm(hit.chunk),
+                document=Document.from_orm(hit.document),
+                similarity_score=hit.score
             )
-            if similarity >= query.min_similarity:
-                scored_results.append(SearchResult(
-                    chunk=DocumentChunkSchema.from_orm(chunk),
-                    document=Document.from_orm(document),
-                    similarity_score=float(similarity)
-                ))
-
-        scored_results.sort(key=lambda x: x.similarity_score, reverse=True)
-        top_results = scored_results[:query.top_k]
+            for hit in top.hits
+        ]
 
         execution_time = time.time() - start_time
 
         return SearchResponse(
             query=query.query,
             results=top_results,
-            total_results=len(scored_results),
+            total_results=top.matched,
             execution_time=execution_time
         )
 
@@ -248,7 +484,7 @@ async def search_documents(
 async def summarize_documents(
     request: SummarizeRequest,
     current_user: SupabaseUser = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Generate an AI-powered summary of documents.
@@ -266,65 +502,67 @@ async def summarize_documents(
         SummarizeResponse: Generated summary with metadata
     """
     start_time = time.time()
+    cached = None
     
     try:
         # If query is provided, use semantic search to find relevant chunks
         if request.query:
-            query_embedding = embedding_generator.generate_embeddings([request.query])[0]
-
-            chunks = db.query(DBDocumentChunk).join(DBDocument).filter(
-                DBDocument.user_id == get_user_id(current_user)
-            ).all()
-
-            if not chunks:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No document chunks found for summarization"
+            # Near-duplicate queries with the same parameters reuse an earlier summary
+            embedding = retriever.embed(request.query)
+            cached = await answer_cache.lookup(
+                get_user_id(current_user),
+                answer_cache.scope("summarize", request.mode, request.max_length, request.min_length),
+                embedding,
+            )
+            if cached.response is not None:
+                return cached.response.model_copy(
+                    update={"query": request.query, "processing_time": time.time() - start_time}
                 )
 
-            scored_chunks = []
-            for chunk in chunks:
-                if not chunk.embedding:
-                    continue
-                chunk_embedding = np.array(chunk.embedding)
-                similarity = np.dot(query_embedding, chunk_embedding) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding)
-                )
-                scored_chunks.append((similarity, chunk))
+            top = await retriever.search(db, RetrievalQuery(
+                embedding=embedding, user_id=get_user_id(current_user), k=settings.SUMMARIZE_TOP_K
+            ))
 
-            if not scored_chunks:
+            if not top.hits:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="No document chunks with embeddings available for summarization"
                 )
 
-            scored_chunks.sort(key=lambda item: item[0], reverse=True)
-            relevant_chunks = [chunk for _, chunk in scored_chunks[:10]]
-
+            # In document order, which is the order summary sentences are emitted in
+            hits = sorted(top.hits, key=lambda hit: (str(hit.chunk.document_id), hit.chunk.chunk_index))
             chunk_data = [
                 {
-                    "text": chunk.text,
-                    "metadata": chunk.meta_info or {},
-                    "similarity_score": float(score)
+                    "text": hit.chunk.text,
+                    "metadata": hit.chunk.meta_info or {},
+                    "similarity_score": hit.score,
+                    "embedding": hit.chunk.embedding,
+                    "chunk_index": hit.chunk.chunk_index,
                 }
-                for score, chunk in scored_chunks[:10]
+                for hit in hits
             ]
 
             # Generate summary using RAG
             summary = summarization_generator.summarize_chunks(
-                chunk_data, 
-                request.query
+                chunk_data,
+                request.query,
+                query_embedding=embedding,
+                max_length=request.max_length,
+                min_length=request.min_length,
             )
 
-            document_ids = list(set([chunk.document_id for chunk in relevant_chunks]))
+            document_ids = list({hit.chunk.document_id for hit in top.hits})
 
         # If specific document IDs are provided
         elif request.document_ids:
             # Get documents
-            documents = db.query(DBDocument).filter(
-                DBDocument.id.in_(request.document_ids),
-                DBDocument.user_id == get_user_id(current_user)
-            ).all()
+            result = await db.execute(
+                select(DBDocument).where(
+                    DBDocument.id.in_(request.document_ids),
+                    DBDocument.user_id == get_user_id(current_user)
+                )
+            )
+            documents = result.scalars().all()
             
             if not documents:
                 raise HTTPException(
@@ -332,28 +570,48 @@ async def summarize_documents(
                     detail="No documents found with the provided IDs"
                 )
             
-            # Get chunks for these documents
-            chunks = db.query(DBDocumentChunk).filter(
-                DBDocumentChunk.document_id.in_(request.document_ids)
-            ).all()
+            # Rank chunks by their stored embeddings; text is loaded only for the chosen ones
+            chunk_scope = [
+                DBDocumentChunk.user_id == get_user_id(current_user),
+                DBDocumentChunk.document_id.in_([document.id for document in documents]),
+            ]
+            result = await db.execute(
+                select(DBDocumentChunk.id, DBDocumentChunk.chunk_index, DBDocumentChunk.embedding)
+                .where(*chunk_scope)
+                .order_by(DBDocumentChunk.document_id, DBDocumentChunk.chunk_index)
+            )
+            chunks = result.all()
 
             if not chunks:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="No document chunks found for summarization"
                 )
-            
-            # Convert to dict format
-            chunk_data = [
-                {
-                    "text": chunk.text,
-                    "metadata": chunk.meta_info or {}
-                }
-                for chunk in chunks
-            ]
-            
-            # Generate summary
-            summary = summarization_generator.summarize_chunks(chunk_data)
+
+            embedded = [chunk for chunk in chunks if chunk.embedding is not None]
+            if embedded:
+                order = summarization_generator.select_chunks(
+                    [chunk.embedding for chunk in embedded], max_length=request.max_length
+                )
+                chosen = [embedded[i].id for i in order]
+                result = await db.execute(
+                    select(DBDocumentChunk.id, DBDocumentChunk.text)
+                    .where(chunk_scope[0], DBDocumentChunk.id.in_(chosen))
+                )
+                texts = dict(result.all())
+                summary = summarization_generator.compose(
+                    [(i, texts.get(embedded[i].id, ""), embedded[i].chunk_index > 0) for i in order],
+                    request.max_length,
+                    request.min_length,
+                )
+            else:
+                # Chunks stored before embedding; fall back to the text-only summarizer
+                result = await db.execute(select(DBDocumentChunk.text).where(*chunk_scope))
+                summary = summarization_generator.summarize_chunks(
+                    [{"text": text} for text in result.scalars().all()],
+                    max_length=request.max_length,
+                    min_length=request.min_length,
+                )
             document_ids = request.document_ids
             
         else:
@@ -364,14 +622,17 @@ async def summarize_documents(
         
         processing_time = time.time() - start_time
         
-        return SummarizeResponse(
+        response = SummarizeResponse(
             summary=summary,
             query=request.query,
             document_ids=document_ids,
             mode=request.mode,
-            model_info=summarization_generator.get_model_info(),
+            model_info=summarization_generator.get_model_info(request.max_length, request.min_length),
             processing_time=processing_time
         )
+        if cached is not None:
+            answer_cache.store(cached, response)
+        return response
         
     except HTTPException:
         raise
@@ -23,11 +23,29 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
     DB_ECHO: bool = False
+    DB_POOL_PRE_PING: bool = True  # test connections before handing them out
+    DB_POOL_RECYCLE: int = 1800  # seconds before a pooled connection is replaced
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    ASYNC_DATABASE_URL: Optional[str] = None  # defaults to DATABASE_URL with the asyncpg driver
+    DB_ASYNC_POOL_SIZE: int = 20
+    DB_ASYNC_MAX_OVERFLOW: int = 10
+    READ_REPLICA_URLS: str = ""  # comma-separated; retrieval and listing reads go here
+    READ_REPLICA_MAX_LAG: float = 5.0  # seconds of replication lag tolerated before using the primary
+    READ_REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # seconds between lag checks per replica
+    READ_REPLICA_LAG_CHECK_TIMEOUT: float = 1.0  # seconds before an unanswered lag check marks the replica down
+    SQL_SLOW_QUERY_MS: float = 200.0  # statements slower than this are logged (with EXPLAIN when DEBUG)
     
     # Supabase
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_JWT_SECRET: str
+    SUPABASE_JWT_ALGORITHM: str = "HS256"
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+
+    # Token verification
+    AUTH_REMOTE_CHECK: bool = False  # confirm every request with Supabase (catches revocation); bypasses the claims cache
+    AUTH_CACHE_TTL: int = 300  # seconds a verified token is trusted without re-checking (local verification only)
+    AUTH_CACHE_MAX_SIZE: int = 10000
     
     # Vector Store
     VECTOR_STORE: str = "pgvector"
@@ -35,10 +53,47 @@ class Settings(BaseSettings):
     EMBEDDING_DIMENSION: int = 384
     VECTOR_INDEX_LIST_SIZE: int = 100  # IVF-Flat list size
     VECTOR_PROBES: int = 10  # Number of probes for search
+    VECTOR_SCAN_BATCH_SIZE: int = 2000  # embeddings per cursor batch when scoring in Python
+    VECTOR_QUANTIZATION: str = "int8"  # "int8" scans the quantized column first, "none" the float32 one
+    VECTOR_RESCORE_FACTOR: int = 4  # int8 candidates kept per result for exact re-scoring
+    DOC_CHUNKS_PARTITIONS: int = 16  # hash partitions of doc_chunks by user_id, for create_all; must match what migration 005 built
+    TENANT_VECTOR_INDEX_MIN_ROWS: int = 100000  # chunks before a tenant gets its own partial index
+    VECTOR_INDEX_RETUNE_FACTOR: float = 2.0  # rebuild when lists is this far off the recommendation
+    VECTOR_INDEX_MAINTENANCE_INTERVAL: int = 86400  # seconds between scheduled maintenance runs
+
+    # Retrieval
+    RETRIEVAL_BACKEND: str = "numpy"  # "python" (reference), "numpy" (streaming scan), "pgvector" (IVFFlat in SQL) or "sharded" (shard nodes)
+    RETRIEVAL_CENTROID_DOCUMENTS: int = 0  # rank documents by centroid and score only the best N; 0 scores every chunk
+    ANN_INDEX_MIN_ROWS: int = 0  # chunks before a tenant is served from an in-process IVF-PQ index; 0 disables
+    ANN_INDEX_DIR: str = "./data/ann_indexes"  # shared by workers (writers) and API processes (readers)
+    ANN_PQ_SUBQUANTIZERS: int = 48  # bytes per stored vector; must divide EMBEDDING_DIMENSION
+    ANN_TRAIN_SAMPLE: int = 100000  # vectors sampled to train the quantizers
+    ANN_NPROBE: int = 16  # lists scanned per query; more trades speed for recall
+    RETRIEVAL_TENANT_SLICES: int = 1  # slices per tenant in the sharded tier, each placed on its own node
+    RETRIEVAL_SHARD_VNODES: int = 64  # points per node on the consistent hash ring
+    RETRIEVAL_SHARD_TTL: float = 15.0  # seconds without a heartbeat before a shard node leaves the ring
+    RETRIEVAL_SHARD_TIMEOUT: float = 2.0  # per-node request timeout before falling back to a local scan
+    RETRIEVAL_SHARD_MEMORY_MB: int = 4096  # resident slice budget per shard node
+    RETRIEVAL_SHARD_REFRESH_SECONDS: float = 3600.0  # age at which a resident slice is reloaded; corpus events keep it current meanwhile
+    RETRIEVAL_SHARD_NODE_URL: str = ""  # URL a shard node advertises; defaults to http://localhost:<port>
+    RETRIEVAL_SHARD_SECRET: str = ""  # shared by API and shard nodes; required before a node listens beyond loopback
+    CORPUS_EVENTS_ENABLED: bool = True  # workers publish chunk changes on Redis for resident caches
+    SUMMARIZE_TOP_K: int = 10  # chunks retrieved for query-based summaries
+    CHAT_TOP_K: int = 5  # chunks cited in a chat answer
+    CHAT_MIN_SIMILARITY: float = 0.4  # chat ignores chunks scoring below this
+    CONVERSATION_POOL_SIZE: int = 200  # candidate chunks kept per chat conversation for follow-up turns; 0 disables
+    CONVERSATION_POOL_MIN_SIMILARITY: float = 0.5  # follow-ups search fully when the pool's k-th best scores below this
+    CONVERSATION_POOL_TTL: int = 1800  # seconds a conversation's pool is kept
+    CONVERSATION_POOL_MAX_CONVERSATIONS: int = 1000  # pools per process (~300KB each at the default size)
+    ANSWER_CACHE_MAX_ENTRIES: int = 0  # chat/summarize responses kept per user for near-duplicate queries; 0 disables
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # query cosine similarity at which a cached response is reused
+    ANSWER_CACHE_MAX_USERS: int = 10000  # users with cached responses per process, least recently active dropped
     
     # ML Models
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     SUMMARIZATION_MODEL: str = "sshleifer/distilbart-cnn-6-6"
+    SUMMARY_SENTENCES_PER_CHUNK: int = 2  # leading sentences an extractive summary takes from each chosen chunk
+    SUMMARY_DIVERSITY: float = 0.3  # 0 ranks chunks by centrality alone; higher penalises chunks like ones already chosen
     MODEL_CACHE_DIR: str = "./data/models"
     MODEL_BATCH_SIZE: int = 32
     
@@ -47,11 +102,12 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 100
     MIN_CHUNK_SIZE: int = 50
     MAX_CHUNKS_PER_DOC: int = 1000
+    PROCESSING_CHECKPOINT_PAGES: int = 25  # pages committed per checkpoint
     
     # Redis Cache
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_MAX_CONNECTIONS: int = 10
-    CACHE_TTL: int = 3600  # 1 hour in seconds
+    CACHE_TTL: int = 3600  # 1 hour in seconds; also bounds semantic answer cache entries
     
     # Rate Limiting
     RATE_LIMIT_UPLOADS: int = 10  # uploads per minute
@@ -76,7 +132,11 @@ class Settings(BaseSettings):
     # File Storage
     UPLOAD_DIR: str = "./data/uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_BATCH_FILES: int = 1000  # PDFs accepted per batch upload, including zip entries
+    MAX_BATCH_ARCHIVE_SIZE: int = 500 * 1024 * 1024  # 500MB per zip archive
     ALLOWED_EXTENSIONS: List[str] = ["pdf"]
+    DOCUMENTS_PAGE_SIZE: int = 50  # default page size for GET /documents
+    DOCUMENTS_MAX_PAGE_SIZE: int = 500
     STORAGE_PROVIDER: str = "local"  # or "s3", "supabase"
     
     # AWS S3 (optional)
@@ -93,8 +153,23 @@ class Settings(BaseSettings):
     # Background Tasks
     BACKGROUND_WORKERS: int = 2
     TASK_TIMEOUT: int = 300  # seconds
+    BATCH_TASK_TIMEOUT_PER_DOCUMENT: int = 60  # seconds added to TASK_TIMEOUT per document in a batch job
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 60  # seconds
+    JOB_LEASE_SECONDS: int = 600  # Postgres queue lease, renewed while a job runs
+    JOB_POLL_INTERVAL: float = 2.0  # seconds between polls of an empty job table
+
+    # Ingestion Pipeline
+    PIPELINE_PREFETCH_WORKERS: int = 4  # concurrent blob downloads
+    PIPELINE_PARSE_WORKERS: int = 2  # PDF parsing processes
+    PIPELINE_QUEUE_SIZE: int = 8  # max documents buffered between stages
+
+    # Fair-share Scheduling
+    ENABLE_FAIR_SCHEDULING: bool = False  # parks uploads in per-tenant lanes; needs the dispatcher process running
+    SCHEDULER_FAST_LANE_MAX_PAGES: int = 10  # documents up to this size skip the bulk lane
+    SCHEDULER_FAST_LANE_BURST: int = 4  # fast-lane jobs dispatched before yielding once
+    SCHEDULER_DISPATCH_DEPTH: int = 4  # max jobs waiting in the RQ queue
+    SCHEDULER_POLL_INTERVAL: float = 1.0  # seconds
     
     # Feature Flags
     ENABLE_AUTHENTICATION: bool = True
@@ -122,14 +197,21 @@ class Settings(BaseSettings):
             return timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
         return timedelta(days=self.REFRESH_TOKEN_EXPIRE_DAYS)
 
-    def get_db_pool_settings(self) -> Dict[str, Any]:
-        """Get database pool settings"""
+    def get_db_pool_settings(self, async_pool: bool = False) -> Dict[str, Any]:
+        """Get database pool settings for the sync (workers) or async (API) engine"""
         return {
-            "pool_size": self.DB_POOL_SIZE,
-            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_size": self.DB_ASYNC_POOL_SIZE if async_pool else self.DB_POOL_SIZE,
+            "max_overflow": self.DB_ASYNC_MAX_OVERFLOW if async_pool else self.DB_MAX_OVERFLOW,
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_timeout": self.DB_POOL_TIMEOUT,
             "echo": self.DB_ECHO
         }
 
+    def get_read_replica_urls(self) -> List[str]:
+        """Read replica URLs, in configuration order"""
+        return [url.strip() for url in self.READ_REPLICA_URLS.split(",") if url.strip()]
+
     class Config:
         env_file = ".env"
         case_sensitive = True
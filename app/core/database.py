@@ -1,32 +1,194 @@
 """Database configuration and session management."""
-from typing import Generator
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import logging
+import time
+from typing import AsyncGenerator, Dict, Generator, List, Optional, Tuple
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import QueuePool
 from app.core.config import settings
+from app.core.sql_stats import current_request_sql, fingerprint
 
-# Create SQLAlchemy engine with connection pooling
+# Create SQLAlchemy engine with connection pooling (used by workers and scripts)
 engine = create_engine(
     settings.DATABASE_URL,
     poolclass=QueuePool,
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_MAX_OVERFLOW,
-    echo=settings.DB_ECHO
+    **settings.get_db_pool_settings()
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_database_url(url: str) -> str:
+    """
+    Derive an asyncpg URL from a psycopg2-style DATABASE_URL.
+
+    ``sslmode`` is translated to asyncpg's ``ssl`` query argument.
+    """
+    async_url = make_url(url).set(drivername="postgresql+asyncpg")
+    if "sslmode" in async_url.query:
+        sslmode = async_url.query["sslmode"]
+        async_url = async_url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return async_url.render_as_string(hide_password=False)
+
+# Async engine for request handlers, so queries do not block the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL),
+    **settings.get_db_pool_settings(async_pool=True)
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class ReplicaRouter:
+    """
+    Round-robin over read replicas, skipping any that lag too far behind.
+
+    Lag is measured at most once per check_interval per replica, in a
+    background task: requests keep using the last known value while a check
+    is in flight, and only a replica's very first check is waited for. A
+    replica that cannot be reached within check_timeout counts as infinitely
+    stale until its next check.
+    """
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        max_lag: float,
+        check_interval: float,
+        check_timeout: float = settings.READ_REPLICA_LAG_CHECK_TIMEOUT,
+    ):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._lag: Dict[int, Tuple[float, float]] = {}  # engine index -> (lag, checked_at)
+        self._checks: Dict[int, asyncio.Task] = {}  # engine index -> check in flight
+        self._next = itertools.cycle(range(len(engines))) if engines else None
+
+    async def _measure_lag(self, engine: AsyncEngine) -> float:
+        async with engine.connect() as conn:
+            return float((await conn.execute(REPLICA_LAG_SQL)).scalar_one())
+
+    async def _check(self, index: int) -> None:
+        try:
+            lag = await asyncio.wait_for(self._measure_lag(self.engines[index]), timeout=self.check_timeout)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Read replica %d unavailable: %s", index, exc or type(exc).__name__)
+            lag = float("inf")
+        finally:
+            self._checks.pop(index, None)
+        self._lag[index] = (lag, time.monotonic())
+
+    async def lag(self, index: int) -> float:
+        known = self._lag.get(index)
+        if known is not None and time.monotonic() - known[1] < self.check_interval:
+            return known[0]
+        check = self._checks.get(index)
+        if check is None:
+            check = self._checks[index] = asyncio.ensure_future(self._check(index))
+        if known is not None:
+            return known[0]
+        # Never measured: wait (at most check_timeout), without cancelling the check for others
+        await asyncio.shield(check)
+        return self._lag[index][0]
+
+    async def pick(self) -> Optional[AsyncEngine]:
+        """A replica within the staleness tolerance, or None to use the primary."""
+        for _ in range(len(self.engines)):
+            index = next(self._next)
+            if await self.lag(index) <= self.max_lag:
+                return self.engines[index]
+        return None
+
+replica_router = ReplicaRouter(
+    [
+        create_async_engine(get_async_database_url(url), **settings.get_db_pool_settings(async_pool=True))
+        for url in settings.get_read_replica_urls()
+    ],
+    max_lag=settings.READ_REPLICA_MAX_LAG,
+    check_interval=settings.READ_REPLICA_LAG_CHECK_INTERVAL,
+)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+    rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+
+    request_stats = current_request_sql.get()
+    if request_stats is not None:
+        request_stats.record(statement, elapsed_ms, rows)
+
+    if elapsed_ms >= settings.SQL_SLOW_QUERY_MS:
+        plan = None
+        if settings.DEBUG and not executemany:
+            plan = _explain(conn, statement, parameters)
+        logger.warning(
+            "Slow query %s took %.1fms (rows=%s): %s%s",
+            fingerprint(statement), elapsed_ms, rows, " ".join(statement.split())[:1000],
+            f"\n{plan}" if plan else "",
+        )
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for failed statements
+    starts = exception_context.connection.info.get("query_start_time") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """EXPLAIN a read statement on a separate cursor, so the original result is untouched."""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN {statement}", parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception as exc:  # noqa: BLE001
+        logger.debug("EXPLAIN failed: %s", exc)
+        return None
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Time every statement on an engine (use async_engine.sync_engine for async engines)."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+for _replica in replica_router.engines:
+    instrument_engine(_replica.sync_engine)
+
 # Create declarative base for models
 Base = declarative_base()
 
 def get_db() -> Generator:
     """
     Get database session.
-    
+
     Yields:
         Session: Database session
-        
+
     Usage:
         ```
         @app.get("/items/")
@@ -41,9 +203,40 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get async database session.
+
+    Yields:
+        AsyncSession: Database session bound to the asyncpg engine
+
+    Usage:
+        ```
+        @app.get("/items/")
+        async def read_items(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Item))
+            return result.scalars().all()
+        ```
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get async database session for read-only retrieval and listing queries.
+
+    Uses a read replica when one is configured and within READ_REPLICA_MAX_LAG,
+    otherwise the primary. Writes, and reads that must see a write the client
+    just made (such as fetching a document right after upload), should use
+    get_async_db instead.
+    """
+    replica = await replica_router.pick()
+    async with AsyncSessionLocal(bind=replica or async_engine) as db:
+        yield db
+
 def init_db() -> None:
     """Initialize database with required tables."""
     # Import models here to ensure they are registered with Base
-    from app.models.database import User, Document, DocumentChunk  # noqa
-    
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from app.models.database import User, Document, DocumentChunk, ProcessingJob  # noqa
+
+    Base.metadata.create_all(bind=engine)
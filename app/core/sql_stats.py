@@ -0,0 +1,140 @@
+"""
+Per-request SQL statistics.
+
+The engine hooks in ``app.core.database`` record every statement into the
+``RequestSQLStats`` held by ``current_request_sql``. The HTTP middleware
+sets that contextvar for each request and, once the response is ready,
+folds the request's numbers into ``endpoint_sql_stats``, keyed by route.
+"""
+
+import hashlib
+import re
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+# Distinct statements tracked per endpoint; further ones are counted as "other"
+MAX_FINGERPRINTS = 200
+
+
+def normalize_statement(statement: str) -> str:
+    """Replace literals and bind parameters with ? so equivalent queries compare equal."""
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _STRING.sub("?", normalized)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    return _IN_LIST.sub("(?)", normalized)
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+
+    def add(self, calls: int, total_ms: float, max_ms: float, rows: int) -> None:
+        self.calls += calls
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, max_ms)
+        self.rows += rows
+
+    def to_dict(self, fingerprint_id: str) -> Dict[str, Any]:
+        return {
+            "fingerprint": fingerprint_id,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+        }
+
+
+class RequestSQLStats:
+    """Statements executed while serving one request."""
+
+    def __init__(self):
+        self.statements: Dict[str, StatementStats] = {}
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, statement: str, elapsed_ms: float, rows: Optional[int]) -> None:
+        key = fingerprint(statement)
+        if key not in self.statements:
+            self.statements[key] = StatementStats(normalize_statement(statement)[:500])
+        self.statements[key].add(1, elapsed_ms, elapsed_ms, rows or 0)
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, shown in browser dev tools."""
+        return f'db;dur={self.total_ms:.1f};desc="{self.count} queries"'
+
+
+class EndpointSQLStats:
+    """Aggregates across requests, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, endpoint: str, request_stats: RequestSQLStats, request_ms: float) -> None:
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                "requests": 0,
+                "request_ms": 0.0,
+                "sql_ms": 0.0,
+                "statements": 0,
+                "by_statement": {},
+            })
+            entry["requests"] += 1
+            entry["request_ms"] += request_ms
+            entry["sql_ms"] += request_stats.total_ms
+            entry["statements"] += request_stats.count
+
+            by_statement = entry["by_statement"]
+            for key, stats in request_stats.statements.items():
+                if key not in by_statement and len(by_statement) >= MAX_FINGERPRINTS:
+                    key, stats = "other", StatementStats("other", stats.calls, stats.total_ms, stats.max_ms, stats.rows)
+                target = by_statement.setdefault(key, StatementStats(stats.statement))
+                target.add(stats.calls, stats.total_ms, stats.max_ms, stats.rows)
+
+    def snapshot(self, top: int = 10) -> Dict[str, Any]:
+        """Per-endpoint averages and the statements with the most total time."""
+        with self._lock:
+            report = {}
+            for endpoint, entry in sorted(self._endpoints.items()):
+                requests = entry["requests"]
+                heaviest: List = sorted(
+                    entry["by_statement"].items(), key=lambda item: item[1].total_ms, reverse=True
+                )[:top]
+                report[endpoint] = {
+                    "requests": requests,
+                    "avg_request_ms": round(entry["request_ms"] / requests, 3),
+                    "avg_sql_ms": round(entry["sql_ms"] / requests, 3),
+                    "avg_statements": round(entry["statements"] / requests, 2),
+                    "sql_share": round(entry["sql_ms"] / entry["request_ms"], 3) if entry["request_ms"] else 0.0,
+                    "top_statements": [stats.to_dict(key) for key, stats in heaviest],
+                }
+            return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+
+current_request_sql: ContextVar[Optional[RequestSQLStats]] = ContextVar("current_request_sql", default=None)
+endpoint_sql_stats = EndpointSQLStats()
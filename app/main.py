@@ -5,6 +5,7 @@ from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from app.api.routers import documents, users, chat
 from app.core.config import settings
+from app.core.sql_stats import RequestSQLStats, current_request_sql, endpoint_sql_stats
 from app.models.schemas import ErrorDetail
 import time
 
@@ -52,11 +53,36 @@ app.add_middleware(
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
-    response = await call_next(request)
+    sql_stats = RequestSQLStats()
+    token = current_request_sql.set(sql_stats)
+    try:
+        response = await call_next(request)
+    finally:
+        current_request_sql.reset(token)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    # Headers go out before a streamed body runs, so this covers SQL issued up to here
+    response.headers["Server-Timing"] = sql_stats.server_timing()
+
+    # Aggregate by route template so /documents/{document_id} is one endpoint
+    route = request.scope.get("route")
+    if route is not None:
+        response.body_iterator = _record_sql_after_body(
+            response.body_iterator, f"{request.method} {route.path}", sql_stats, start_time
+        )
     return response
 
+async def _record_sql_after_body(body, endpoint: str, sql_stats: RequestSQLStats, start_time: float):
+    """
+    Pass the body through, then record the endpoint's SQL. Streaming endpoints
+    (e.g. /chat/stream) run their queries while the body is produced.
+    """
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        endpoint_sql_stats.record(endpoint, sql_stats, (time.time() - start_time) * 1000)
+
 # Global error handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,20 @@
+"""
+Document centroids for two-stage retrieval.
+
+A document's centroid is the normalised mean of its chunk embeddings. A
+query that scores low against it rarely scores high against any one chunk,
+so ranking centroids first lets retrieval skip most documents' chunks.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def centroid(embeddings: Sequence) -> Optional[np.ndarray]:
+    """Unit-length mean of the embeddings, or None if there are none."""
+    if len(embeddings) == 0:
+        return None
+    mean = np.mean(np.vstack([np.asarray(embedding, dtype=np.float32) for embedding in embeddings]), axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm else mean
@@ -30,6 +30,8 @@ class EmbeddingGenerator:
                 attention_mask = inputs["attention_mask"]
                 token_embeddings = outputs.last_hidden_state
                 input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-                embeddings.extend(torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9))
+                pooled = torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
+                # Unit length, so cosine similarity is a plain dot product everywhere downstream
+                embeddings.extend(torch.nn.functional.normalize(pooled, p=2, dim=1))
         
         return [emb.cpu().numpy() for emb in embeddings]
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+IVF-PQ approximate nearest-neighbour index in NumPy.
+
+A coarse k-means quantizer assigns each vector to one of ``nlist`` lists.
+The residual (vector minus its list's centroid) is cut into ``m``
+sub-vectors, and each of those is replaced by the id of its nearest of 256
+sub-centroids. A 384-dimensional embedding is then stored in ``m`` bytes.
+
+Searching uses asymmetric distances: the query stays exact. Inner product
+splits as ``q.x ~= q.c + sum_j q_j.b_j[code_j]``, so a query needs one
+``(m, 256)`` lookup table plus one dot product per list. Only the
+``nprobe`` lists whose centroids score best are scanned.
+
+``AnnIndexStore`` keeps one index per tenant on disk. Workers extend the
+file as chunks are written, and API processes reload it when it changes.
+"""
+
+import fcntl
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+PQ_CENTROIDS = 256  # one byte per sub-vector code
+
+
+def nearest(data: np.ndarray, centroids: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+    """Index of the nearest centroid (L2) to each row of data."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), batch_size):
+        block = data[start:start + batch_size]
+        # |x - c|^2 = |x|^2 - 2x.c + |c|^2, and |x|^2 does not change the argmin
+        assignments[start:start + batch_size] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; returns up to k centroids (fewer if data has fewer rows)."""
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = nearest(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        sums = np.add.reduceat(data[np.argsort(assignments, kind="stable")], starts)
+        centroids[filled] = sums / counts[filled, None]
+
+        # Re-seed clusters that lost every point
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(self, coarse: np.ndarray, codebooks: np.ndarray, trained_rows: int = 0):
+        self.coarse = np.asarray(coarse, dtype=np.float32)  # (nlist, d)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)  # (m, ksub, d / m)
+        self.trained_rows = trained_rows
+        nlist, m = len(self.coarse), len(self.codebooks)
+        self.list_ids: List[np.ndarray] = [np.empty((0, 16), dtype=np.uint8) for _ in range(nlist)]
+        self.list_codes: List[np.ndarray] = [np.empty((0, m), dtype=np.uint8) for _ in range(nlist)]
+
+    @classmethod
+    def train(
+        cls, vectors: np.ndarray, nlist: int, m: int, iterations: int = 20, seed: int = 0
+    ) -> "IVFPQIndex":
+        """Learn the coarse and residual quantizers from a sample; the index starts empty."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % m:
+            raise ValueError(f"Dimension {vectors.shape[1]} is not divisible into {m} sub-vectors")
+        coarse = kmeans(vectors, nlist, iterations, seed)
+        residuals = vectors - coarse[nearest(vectors, coarse)]
+        dsub = vectors.shape[1] // m
+        codebooks = np.stack([
+            kmeans(residuals[:, j * dsub:(j + 1) * dsub], PQ_CENTROIDS, iterations, seed + j)
+            for j in range(m)
+        ])
+        return cls(coarse, codebooks, trained_rows=len(vectors))
+
+    @property
+    def nlist(self) -> int:
+        return len(self.coarse)
+
+    @property
+    def m(self) -> int:
+        return len(self.codebooks)
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.list_ids)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (list number per vector, (n, m) uint8 residual codes)."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        lists = nearest(vectors, self.coarse)
+        residuals = vectors - self.coarse[lists]
+        dsub = vectors.shape[1] // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest(residuals[:, j * dsub:(j + 1) * dsub], self.codebooks[j])
+        return lists, codes
+
+    def add(self, ids: Sequence[Any], vectors: np.ndarray) -> None:
+        """Add vectors under UUID ids."""
+        if len(ids) == 0:
+            return
+        id_bytes = np.frombuffer(b"".join(uuid.UUID(str(i)).bytes for i in ids), dtype=np.uint8).reshape(-1, 16)
+        lists, codes = self.encode(vectors)
+        for list_no in np.unique(lists):
+            members = lists == list_no
+            self.list_ids[list_no] = np.concatenate([self.list_ids[list_no], id_bytes[members]])
+            self.list_codes[list_no] = np.concatenate([self.list_codes[list_no], codes[members]])
+
+    def contains(self, ids: Sequence[Any]) -> np.ndarray:
+        """Boolean mask of which ids are already indexed."""
+        def as_keys(id_bytes: np.ndarray) -> np.ndarray:
+            return np.ascontiguousarray(id_bytes).view(np.dtype((np.void, 16))).ravel()
+
+        wanted = np.frombuffer(b"".join(uuid.UUID(str(i)).bytes for i in ids), dtype=np.uint8).reshape(-1, 16)
+        return np.isin(as_keys(wanted), as_keys(np.concatenate(self.list_ids)))
+
+    def search(self, query: np.ndarray, k: int, nprobe: int) -> Tuple[List[uuid.UUID], np.ndarray, int]:
+        """
+        Approximate top-k by inner product.
+
+        Returns:
+            tuple: (ids best first, their approximate scores, vectors scanned)
+        """
+        query = np.asarray(query, dtype=np.float32)
+        coarse_scores = self.coarse @ query
+        nprobe = min(nprobe, self.nlist)
+        probed = np.argpartition(-coarse_scores, nprobe - 1)[:nprobe]
+
+        dsub = len(query) // self.m
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.m, dsub))
+        probed = [list_no for list_no in probed if len(self.list_ids[list_no])]
+        if not probed:
+            return [], np.empty(0, dtype=np.float32), 0
+
+        codes = np.concatenate([self.list_codes[list_no] for list_no in probed])
+        ids = np.concatenate([self.list_ids[list_no] for list_no in probed])
+        scores = np.repeat(coarse_scores[probed], [len(self.list_ids[list_no]) for list_no in probed])
+        scores += table[np.arange(self.m), codes].sum(axis=1)
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [uuid.UUID(bytes=ids[i].tobytes()) for i in top], scores[top], len(scores)
+
+    def save(self, path: str) -> None:
+        """Write atomically, so readers never load a half-written file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                coarse=self.coarse,
+                codebooks=self.codebooks,
+                trained_rows=np.int64(self.trained_rows),
+                counts=np.array([len(ids) for ids in self.list_ids], dtype=np.int64),
+                ids=np.concatenate(self.list_ids),
+                codes=np.concatenate(self.list_codes),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        with np.load(path) as data:
+            index = cls(data["coarse"], data["codebooks"], int(data["trained_rows"]))
+            bounds = np.cumsum(data["counts"])[:-1]
+            index.list_ids = np.split(data["ids"], bounds)
+            index.list_codes = np.split(data["codes"], bounds)
+        return index
+
+
+class AnnIndexStore:
+    """One IVF-PQ index file per tenant, cached in memory until the file changes."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._cache: Dict[str, Tuple[Tuple[int, int], IVFPQIndex]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, user_id) -> str:
+        return os.path.join(self.directory, f"{uuid.UUID(str(user_id)).hex}.npz")
+
+    def exists(self, user_id) -> bool:
+        return os.path.exists(self.path(user_id))
+
+    def tenants(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            str(uuid.UUID(name[:-len(".npz")]))
+            for name in os.listdir(self.directory)
+            if name.endswith(".npz")
+        ]
+
+    def get(self, user_id) -> Optional[IVFPQIndex]:
+        """The tenant's index, reloaded from disk only when the file has changed."""
+        path = self.path(user_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(str(user_id), None)
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(str(user_id))
+            if cached and cached[0] == version:
+                return cached[1]
+            index = IVFPQIndex.load(path)
+            self._cache[str(user_id)] = (version, index)
+            return index
+
+    @contextmanager
+    def lock(self, user_id) -> Iterator[None]:
+        # Several workers may write the same tenant's index
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.path(user_id)}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self, user_id, index: IVFPQIndex) -> None:
+        with self.lock(user_id):
+            index.save(self.path(user_id))
+
+    def add(self, user_id, ids: Sequence[Any], vectors: Sequence[np.ndarray]) -> int:
+        """Append new chunks to the tenant's index if it has one; returns how many were added."""
+        if not len(ids) or not self.exists(user_id):
+            return 0
+        with self.lock(user_id):
+            index = IVFPQIndex.load(self.path(user_id))
+            index.add(ids, np.vstack(vectors))
+            index.save(self.path(user_id))
+        return len(ids)
+
+    def remove(self, user_id) -> None:
+        with self.lock(user_id):
+            if self.exists(user_id):
+                os.remove(self.path(user_id))
+        self._cache.pop(str(user_id), None)
+
+
+ann_indexes = AnnIndexStore(settings.ANN_INDEX_DIR)
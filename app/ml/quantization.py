@@ -0,0 +1,39 @@
+"""
+Symmetric int8 quantization of embeddings.
+
+Each vector is stored as int8 codes plus one float scale, with
+``vector ~= codes * scale``. That is a quarter of the float32 size. Stored
+embeddings are unit length, so ``(codes @ query) * scale`` approximates
+their cosine similarity to a unit-length query without dequantizing.
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize a (n, d) float block.
+
+    Returns:
+        tuple: (codes as int8 (n, d), scales as float32 (n,))
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.asarray(codes, dtype=np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def codes_to_bytes(codes: np.ndarray) -> bytes:
+    return np.asarray(codes, dtype=np.int8).tobytes()
+
+
+def codes_from_bytes(blobs: Sequence[bytes], dimension: int) -> np.ndarray:
+    """Stack stored code blobs into one (n, dimension) int8 block."""
+    return np.frombuffer(b"".join(blobs), dtype=np.int8).reshape(len(blobs), dimension)
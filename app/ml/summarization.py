@@ -1,21 +1,92 @@
 """
 AI Summarization Module
 
-This module provides text summarization capabilities using Hugging Face transformers.
+Extractive summarization over the chunk embeddings already stored in
+doc_chunks, so summarizing needs no model passes:
+
+1. Chunks are ranked by TextRank on their cosine-similarity graph. The
+   graph is never materialised, so each iteration costs O(n * d), not
+   O(n^2). With a query, the random walk teleports towards chunks similar
+   to it.
+2. Chunks are picked in rank order with a maximal-marginal-relevance
+   penalty, so near-duplicate chunks do not crowd the summary.
+3. Each picked chunk contributes its leading sentences until the summary
+   reaches max_length words. Only the picked chunks' text is ever split.
+
 Supports both single document and multi-document RAG-style summarization.
 """
 
+import math
 import re
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Sequence, Tuple
 import logging
+
+import numpy as np
+
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def textrank(
+    embeddings: np.ndarray,
+    personalization: Optional[np.ndarray] = None,
+    damping: float = 0.85,
+    iterations: int = 50,
+    tolerance: float = 1e-6,
+) -> np.ndarray:
+    """
+    PageRank over the chunk similarity graph, for unit-length embeddings.
+
+    Edge weights are (1 + cos) / 2, which keeps them non-negative, and
+    there are no self-loops. W @ x is then (sum(x) + E @ (E.T @ x)) / 2 - x,
+    so the n x n matrix is never built.
+    """
+    n = len(embeddings)
+    if n <= 1:
+        return np.ones(n, dtype=np.float32)
+
+    def weigh(x: np.ndarray) -> np.ndarray:
+        return (x.sum() + embeddings @ (embeddings.T @ x)) / 2 - x
+
+    degree = np.maximum(weigh(np.ones(n, dtype=np.float32)), 1e-12)
+    teleport = np.full(n, 1.0 / n, dtype=np.float32)
+    if personalization is not None and personalization.sum() > 0:
+        teleport = personalization / personalization.sum()
+
+    rank = teleport.copy()
+    for _ in range(iterations):
+        updated = (1 - damping) * teleport + damping * weigh(rank / degree)
+        if np.abs(updated - rank).sum() < tolerance:
+            return updated
+        rank = updated
+    return rank
+
+
+def split_sentences(text: str, continues: bool = False) -> List[str]:
+    """Sentences of a chunk; a leading fragment carried over from the previous chunk is dropped."""
+    sentences = [sentence.strip() for sentence in _SENTENCE_END.split(text.strip()) if sentence.strip()]
+    if continues and sentences and not sentences[0][0].isupper() and not sentences[0][0].isdigit():
+        sentences = sentences[1:]
+    return sentences
+
+
+# Summary lengths are counted in words
+DEFAULT_MAX_LENGTH = 150
+DEFAULT_MIN_LENGTH = 30
+
+
+def _truncate_words(text: str, max_length: int) -> str:
+    words = text.split()
+    return " ".join(words[:max_length]) + "..." if len(words) > max_length else text
+
+
 class SummarizationGenerator:
     """
     Handles text summarization using extractive summarization.
-    For now, uses extractive summarization to avoid ML model dependencies.
+    Chunks are chosen from their stored embeddings; see the module docstring.
     """
     
     def __init__(self, model_name: str = "extractive"):
@@ -38,14 +109,14 @@ class SummarizationGenerator:
             logger.error(f"Failed to initialize summarization model: {e}")
             raise
     
-    def summarize_text(self, text: str, max_length: int = 150, min_length: int = 30) -> str:
+    def summarize_text(self, text: str, max_length: int = DEFAULT_MAX_LENGTH, min_length: int = DEFAULT_MIN_LENGTH) -> str:
         """
         Summarize a single text using extractive summarization.
         
         Args:
             text: Input text to summarize
-            max_length: Maximum length of summary
-            min_length: Minimum length of summary
+            max_length: Maximum summary length in words
+            min_length: Minimum summary length in words
             
         Returns:
             Generated summary
@@ -58,7 +129,7 @@ class SummarizationGenerator:
             sentences = self._extract_sentences(text)
             
             if len(sentences) <= 3:
-                return text[:max_length] + "..." if len(text) > max_length else text
+                return _truncate_words(text, max_length)
             
             # Select most important sentences (simple extractive approach)
             important_sentences = self._select_important_sentences(sentences, max_length)
@@ -66,10 +137,10 @@ class SummarizationGenerator:
             summary = " ".join(important_sentences)
             
             # Ensure minimum length
-            if len(summary) < min_length and len(sentences) > 1:
+            if len(summary.split()) < min_length and len(sentences) > 1:
                 summary = " ".join(sentences[:2])
             
-            return summary[:max_length] + "..." if len(summary) > max_length else summary
+            return _truncate_words(summary, max_length)
             
         except Exception as e:
             logger.error(f"Error in summarization: {e}")
@@ -83,7 +154,7 @@ class SummarizationGenerator:
         return sentences
     
     def _select_important_sentences(self, sentences: List[str], max_length: int) -> List[str]:
-        """Select the most important sentences for summarization."""
+        """Select the most important sentences for summarization, up to max_length words."""
         if not sentences:
             return []
         
@@ -106,26 +177,120 @@ class SummarizationGenerator:
         current_length = 0
         
         for score, sentence in scored_sentences:
-            if current_length + len(sentence) <= max_length:
+            words = len(sentence.split())
+            if current_length + words <= max_length:
                 selected.append(sentence)
-                current_length += len(sentence)
+                current_length += words
             else:
                 break
         
         return selected if selected else sentences[:2]
     
-    def summarize_chunks(self, chunks: List[Dict], query: Optional[str] = None) -> str:
+    def select_chunks(
+        self,
+        embeddings: Sequence[Any],
+        query_embedding: Optional[Any] = None,
+        max_length: int = DEFAULT_MAX_LENGTH,
+        diversity: float = settings.SUMMARY_DIVERSITY,
+    ) -> List[int]:
+        """
+        Indexes of the chunks to draw the summary from, best first.
+
+        Enough chunks are returned to fill max_length words even when
+        their sentences are short.
+        """
+        if len(embeddings) == 0:
+            return []
+        matrix = np.vstack([np.asarray(embedding, dtype=np.float32) for embedding in embeddings])
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        personalization = None
+        if query_embedding is not None:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            personalization = np.maximum(matrix @ (query / (np.linalg.norm(query) or 1.0)), 0)
+        rank = textrank(matrix, personalization)
+        relevance = rank / rank.max()
+
+        # Assume sentences of at least 5 words
+        limit = min(len(matrix), math.ceil(max_length / (5 * settings.SUMMARY_SENTENCES_PER_CHUNK)))
+        selected: List[int] = []
+        redundancy = np.zeros(len(matrix), dtype=np.float32)  # max similarity to any selected chunk
+        available = np.ones(len(matrix), dtype=bool)
+        while len(selected) < limit:
+            scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+            best = int(np.argmax(scores))
+            selected.append(best)
+            available[best] = False
+            redundancy = np.maximum(redundancy, matrix @ matrix[best])
+        return selected
+
+    def compose(
+        self,
+        ranked_texts: Sequence[Tuple[int, str, bool]],
+        max_length: int = DEFAULT_MAX_LENGTH,
+        min_length: int = DEFAULT_MIN_LENGTH,
+    ) -> str:
+        """
+        Build a summary of about max_length words (never under min_length if the text allows).
+
+        Args:
+            ranked_texts: (position, text, continues previous chunk) for the
+                selected chunks, best first; sentences are emitted in position order
+        """
+        picked: List[Tuple[int, int, str]] = []
+        words = 0
+        for position, text, continues in ranked_texts:
+            for order, sentence in enumerate(split_sentences(text, continues)[:settings.SUMMARY_SENTENCES_PER_CHUNK]):
+                count = len(sentence.split())
+                if words + count > max_length:
+                    if words < min_length:
+                        # A long sentence would overshoot; cut it rather than fall short
+                        sentence = " ".join(sentence.split()[:max_length - words]) + "..."
+                        picked.append((position, order, sentence))
+                    return " ".join(sentence for _, _, sentence in sorted(picked))
+                picked.append((position, order, sentence))
+                words += count
+        return " ".join(sentence for _, _, sentence in sorted(picked))
+
+    def summarize_chunks(
+        self,
+        chunks: List[Dict],
+        query: Optional[str] = None,
+        query_embedding: Optional[Any] = None,
+        max_length: int = DEFAULT_MAX_LENGTH,
+        min_length: int = DEFAULT_MIN_LENGTH,
+    ) -> str:
         """
         Summarize multiple document chunks with optional query context.
         
         Args:
-            chunks: List of document chunks with text and metadata
+            chunks: List of document chunks with text, metadata and, ideally,
+                embedding and chunk_index
             query: Optional query to provide context for summarization
+            query_embedding: Optional query vector; steers chunk ranking
+            max_length: Maximum summary length in words
+            min_length: Minimum summary length in words
             
         Returns:
             Generated summary
         """
         try:
+            embedded = [chunk for chunk in chunks if chunk.get("embedding") is not None]
+            if embedded:
+                order = self.select_chunks(
+                    [chunk["embedding"] for chunk in embedded], query_embedding, max_length
+                )
+                summary = self.compose(
+                    [
+                        (i, embedded[i].get("text", ""), embedded[i].get("chunk_index", 0) > 0)
+                        for i in order
+                    ],
+                    max_length,
+                    min_length,
+                )
+                if summary:
+                    return summary
+
             # Combine chunk texts
             combined_text = " ".join([chunk.get('text', '') for chunk in chunks])
             
@@ -138,7 +303,7 @@ class SummarizationGenerator:
             else:
                 context = combined_text
             
-            return self.summarize_text(context)
+            return self.summarize_text(context, max_length, min_length)
             
         except Exception as e:
             logger.error(f"Error in chunk summarization: {e}")
@@ -182,13 +347,17 @@ class SummarizationGenerator:
             logger.error(f"Error in document summarization: {e}")
             return f"Summarization failed: {str(e)}"
     
-    def get_model_info(self) -> Dict:
-        """Get information about the loaded model."""
+    def get_model_info(
+        self, max_length: int = DEFAULT_MAX_LENGTH, min_length: int = DEFAULT_MIN_LENGTH
+    ) -> Dict:
+        """Get information about the loaded model and the summary lengths used."""
         return {
             "model_name": self.model_name,
             "type": "extractive",
-            "max_length": 150,
-            "min_length": 30
+            "method": "textrank over stored chunk embeddings",
+            "length_unit": "words",
+            "max_length": max_length,
+            "min_length": min_length
         }
 
 # Global instance
@@ -12,6 +12,9 @@ class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1, description="User's question")
     history: List[ChatMessage] = Field(default_factory=list, description="Conversation history")
     document_ids: Optional[List[UUID]] = Field(default=None, description="Specific documents to chat about")
+    conversation_id: Optional[str] = Field(
+        default=None, max_length=128, description="Client-chosen id; follow-up turns re-rank the first turn's candidates"
+    )
     
 class ChatCitation(BaseModel):
     document_id: UUID
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, String, DateTime, Integer, JSON, ForeignKey, Index, Boolean
+from sqlalchemy import Column, DDL, String, Text, DateTime, Float, Integer, JSON, ForeignKey, Index, Boolean, LargeBinary, UniqueConstraint, event
 from sqlalchemy.dialects.postgresql import UUID
 from pgvector.sqlalchemy import Vector
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
+from app.core.config import settings
 from app.core.database import Base
 import uuid
 
@@ -24,20 +26,71 @@ class Document(Base):
     storage_path = Column(String)
     status = Column(String, default="uploaded")
     meta_info = Column(JSON)
+    # Normalised mean of the chunk embeddings, set once processing finishes.
+    # Deferred: only first-stage retrieval reads it, and it does so explicitly.
+    centroid = deferred(Column(Vector(384)))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Keyset pagination of a user's documents, newest first
+        Index("ix_documents_user_created", "user_id", "created_at", "id"),
+    )
+
+    # Fetch server defaults on INSERT so async handlers never lazy-load them
+    __mapper_args__ = {"eager_defaults": True}
+
 class DocumentChunk(Base):
     __tablename__ = "doc_chunks"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    # Copied from the owning document so tenant filters never need a join.
+    # Also the hash partition key, hence part of the primary key.
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True, nullable=False)
     chunk_index = Column(Integer)
     text = Column(String)
     embedding = Column(Vector(384))  # Dimension for all-MiniLM-L6-v2
+    # int8 copy of embedding (embedding ~= codes * scale) for first-pass scoring
+    embedding_q = Column(LargeBinary)
+    embedding_scale = Column(Float)
     meta_info = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     __table_args__ = (
+        # Unique constraints on a partitioned table must include the partition key
+        UniqueConstraint("user_id", "document_id", "chunk_index", name="uq_doc_chunks_document_chunk"),
+        Index("ix_doc_chunks_user_document", "user_id", "document_id"),
         Index("ix_doc_chunks_embedding", "embedding", postgresql_using="ivfflat", 
-              postgresql_with={"lists": 100}, postgresql_ops={"embedding": "vector_cosine_ops"}),
+              postgresql_with={"lists": 100}, postgresql_ops={"embedding": "vector_ip_ops"}),
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
+
+def chunk_partition_name(remainder: int) -> str:
+    return f"doc_chunks_p{remainder}"
+
+# Partitions are plain tables attached to doc_chunks; indexes declared above
+# are created on each of them by Postgres.
+for _remainder in range(settings.DOC_CHUNKS_PARTITIONS):
+    event.listen(DocumentChunk.__table__, "after_create", DDL(
+        f"CREATE TABLE IF NOT EXISTS {chunk_partition_name(_remainder)} PARTITION OF doc_chunks "
+        f"FOR VALUES WITH (MODULUS {settings.DOC_CHUNKS_PARTITIONS}, REMAINDER {_remainder})"
+    ))
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, default="queued", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_by = Column(String)
+    lease_expires_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_processing_jobs_claim", "status", "available_at"),
     )
@@ -47,6 +47,30 @@ class Document(DocumentBase):
         }
         return cls(**data)
 
+class BatchUploadError(BaseModel):
+    filename: str
+    detail: str
+
+class BatchUploadResponse(BaseModel):
+    documents: List[Document]
+    errors: List[BatchUploadError] = Field(default_factory=list)
+    total_pages: int
+
+class DocumentListItem(BaseModel):
+    """A document in a list page; only the requested fields are set."""
+    id: UUID
+    user_id: Optional[UUID] = None
+    title: Optional[str] = None
+    storage_path: Optional[str] = None
+    status: Optional[DocumentStatus] = None
+    created_at: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+class DocumentPage(BaseModel):
+    items: List[DocumentListItem]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
 class DocumentChunkBase(BaseModel):
     text: str
     metadata: Dict[str, Any] = Field(default_factory=dict)
@@ -67,7 +91,7 @@ class DocumentChunk(DocumentChunkBase):
             "document_id": obj.document_id,
             "chunk_index": obj.chunk_index,
             "text": obj.text,
-            "embedding": obj.embedding or [],
+            "embedding": [float(value) for value in obj.embedding] if obj.embedding is not None else [],
             "created_at": obj.created_at,
             "metadata": obj.meta_info or {}
         }
@@ -113,8 +137,8 @@ class SummarizeRequest(BaseModel):
     query: Optional[str] = None
     document_ids: Optional[List[UUID]] = None
     mode: str = Field(default="multi", description="single or multi document summarization")
-    max_length: int = Field(default=150, ge=30, le=500)
-    min_length: int = Field(default=30, ge=10, le=200)
+    max_length: int = Field(default=150, ge=30, le=500, description="Maximum summary length in words")
+    min_length: int = Field(default=30, ge=10, le=200, description="Minimum summary length in words")
 
 class SummarizeResponse(BaseModel):
     model_config = {"protected_namespaces": ()}
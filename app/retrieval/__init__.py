@@ -0,0 +1,16 @@
+"""Similarity retrieval over document chunks."""
+
+from app.retrieval.backends import BACKENDS, get_backend
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult, ScoredChunk
+from app.retrieval.retriever import Retriever, retriever
+
+__all__ = [
+    "BACKENDS",
+    "get_backend",
+    "RetrievalBackend",
+    "RetrievalQuery",
+    "RetrievalResult",
+    "ScoredChunk",
+    "Retriever",
+    "retriever",
+]
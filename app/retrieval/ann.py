@@ -0,0 +1,62 @@
+"""
+Serve very large tenants from their in-process IVF-PQ index.
+
+Tenants with an index file (see ``app.ml.ivfpq``) are answered without
+scanning doc_chunks. The index proposes ``k * VECTOR_RESCORE_FACTOR``
+candidates, and those are hydrated and re-scored exactly like the int8
+scan's. Queries narrowed to documents or metadata, and tenants without an
+index, go to the wrapped backend.
+"""
+
+import asyncio
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.ml.ivfpq import AnnIndexStore, ann_indexes
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult, ScoredChunk, hydrate
+
+
+class AnnBackend(RetrievalBackend):
+    def __init__(
+        self,
+        inner: RetrievalBackend,
+        store: AnnIndexStore = ann_indexes,
+        nprobe: int = settings.ANN_NPROBE,
+    ):
+        self.inner = inner
+        self.store = store
+        self.nprobe = nprobe
+        self.name = f"ann+{inner.name}"
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        index = None
+        if not query.document_ids and not query.filters:
+            # The first load of a large index reads it from disk
+            index = await asyncio.to_thread(self.store.get, query.user_id)
+        if index is None:
+            return await self.inner.search(db, query)
+
+        # Scoring nprobe lists of a large tenant would stall the event loop
+        candidates, _, scanned = await asyncio.to_thread(
+            index.search, query.embedding, query.k * settings.VECTOR_RESCORE_FACTOR, self.nprobe
+        )
+        # A chunk written during an index build can be added twice
+        candidates = list(dict.fromkeys(candidates))
+        rows_by_id = await hydrate(db, [(chunk_id, query.user_id) for chunk_id in candidates])
+
+        hits = []
+        for chunk_id in candidates:
+            # Chunks deleted since they were indexed are simply not hydrated
+            if chunk_id not in rows_by_id:
+                continue
+            chunk, document = rows_by_id[chunk_id]
+            score = float(np.asarray(chunk.embedding, dtype=np.float32) @ query.embedding)
+            if query.min_similarity is not None and score < query.min_similarity:
+                continue
+            hits.append(ScoredChunk(score, chunk, document))
+
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        # Only candidates are scored exactly, so matched counts those above the threshold
+        return RetrievalResult(hits=hits[:query.k], scanned=scanned, matched=len(hits))
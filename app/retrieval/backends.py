@@ -0,0 +1,153 @@
+"""
+Retrieval backends, selected with ``RETRIEVAL_BACKEND``.
+
+* ``python``: exact brute force, one dot product per row in plain Python.
+  Slow, but small enough to check by eye; the reference the others are
+  tested against.
+* ``numpy``: the streaming scan in ``app.retrieval.scan``. Exact scores,
+  scored a block at a time, optionally over int8 codes first.
+* ``pgvector``: ``ORDER BY embedding <#> query LIMIT k`` in Postgres, served
+  by the IVFFlat index. Approximate, and nothing but the winners leaves the
+  database.
+* ``sharded``: scatter-gather over the shard nodes of ``app.retrieval.shard_node``,
+  which keep each tenant's slices resident; see ``app.retrieval.sharded``.
+
+With ``RETRIEVAL_CENTROID_DOCUMENTS`` set, any of them is wrapped in the
+two-stage ``CentroidBackend``. With ``ANN_INDEX_MIN_ROWS`` set, tenants with
+an IVF-PQ index are answered from it by ``AnnBackend`` first.
+"""
+
+import heapq
+import itertools
+import math
+from typing import Dict, Optional, Type
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.database import Document, DocumentChunk
+from app.retrieval.ann import AnnBackend
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult, ScoredChunk, hydrate
+from app.retrieval.hierarchical import CentroidBackend
+from app.retrieval.scan import stream_top_k
+from app.retrieval.sharded import ShardedBackend
+
+
+class PythonBackend(RetrievalBackend):
+    name = "python"
+
+    def __init__(self, batch_size: int = settings.VECTOR_SCAN_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        vector = [float(x) for x in query.embedding]
+        result = RetrievalResult()
+        heap: list = []  # (score, tiebreak, chunk_id, user_id), worst on top
+        tiebreak = itertools.count()
+
+        stream = await db.stream(
+            select(DocumentChunk.id, DocumentChunk.user_id, DocumentChunk.embedding)
+            .where(DocumentChunk.embedding.is_not(None), *query.criteria())
+            .execution_options(yield_per=self.batch_size)
+        )
+        async for rows in stream.partitions():
+            for chunk_id, user_id, embedding in rows:
+                result.scanned += 1
+                score = math.fsum(a * float(b) for a, b in zip(vector, embedding))
+                if query.min_similarity is not None and score < query.min_similarity:
+                    continue
+                result.matched += 1
+                entry = (score, next(tiebreak), chunk_id, user_id)
+                if len(heap) < query.k:
+                    heapq.heappush(heap, entry)
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, entry)
+
+        rows_by_id = await hydrate(db, [(chunk_id, user_id) for _, _, chunk_id, user_id in heap])
+        result.hits = [
+            ScoredChunk(score, *rows_by_id[chunk_id])
+            for score, _, chunk_id, _ in sorted(heap, reverse=True)
+            if chunk_id in rows_by_id
+        ]
+        return result
+
+
+class NumpyBackend(RetrievalBackend):
+    name = "numpy"
+
+    def __init__(
+        self, batch_size: int = settings.VECTOR_SCAN_BATCH_SIZE, quantized: Optional[bool] = None
+    ):
+        self.batch_size = batch_size
+        self.quantized = quantized
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        return await stream_top_k(
+            db,
+            query.embedding,
+            query.k,
+            query.criteria(),
+            min_similarity=query.min_similarity,
+            batch_size=self.batch_size,
+            quantized=self.quantized,
+        )
+
+
+class PgvectorBackend(RetrievalBackend):
+    """
+    Ranks in Postgres with the inner-product operator.
+
+    Only the winners are read, so the counts describe them: ``matched`` is
+    the number of hits, and ``scanned`` is only guaranteed to be non-zero
+    when the scope holds any embedded chunk.
+    """
+
+    name = "pgvector"
+
+    def __init__(self, probes: int = settings.VECTOR_PROBES):
+        self.probes = probes
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        # More probes trade speed for recall; probes >= lists is an exact search
+        await db.execute(text(f"SET LOCAL ivfflat.probes = {int(self.probes)}"))
+
+        # <#> is the negated inner product, so ascending order is best first
+        distance = DocumentChunk.embedding.max_inner_product(query.embedding)
+        statement = (
+            select(DocumentChunk, Document, distance.label("distance"))
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .where(DocumentChunk.embedding.is_not(None), *query.criteria())
+        )
+        if query.min_similarity is not None:
+            statement = statement.where(distance <= -query.min_similarity)
+        rows = (await db.execute(statement.order_by(distance).limit(query.k))).all()
+
+        hits = [ScoredChunk(-float(distance), chunk, document) for chunk, document, distance in rows]
+        scanned = len(hits)
+        if not hits:
+            # Tell "nothing relevant" apart from "nothing to search"
+            scanned = len((await db.execute(
+                select(DocumentChunk.id)
+                .where(DocumentChunk.embedding.is_not(None), *query.criteria())
+                .limit(1)
+            )).all())
+        return RetrievalResult(hits=hits, scanned=scanned, matched=len(hits))
+
+
+BACKENDS: Dict[str, Type[RetrievalBackend]] = {
+    backend.name: backend for backend in (PythonBackend, NumpyBackend, PgvectorBackend, ShardedBackend)
+}
+
+
+def get_backend(name: Optional[str] = None) -> RetrievalBackend:
+    """Instantiate the named backend, RETRIEVAL_BACKEND by default."""
+    name = name or settings.RETRIEVAL_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown retrieval backend {name!r}; expected one of {sorted(BACKENDS)}")
+    backend = BACKENDS[name]()
+    if settings.RETRIEVAL_CENTROID_DOCUMENTS > 0:
+        backend = CentroidBackend(backend, settings.RETRIEVAL_CENTROID_DOCUMENTS)
+    if settings.ANN_INDEX_MIN_ROWS > 0:
+        backend = AnnBackend(backend)
+    return backend
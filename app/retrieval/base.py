@@ -0,0 +1,84 @@
+"""
+Types shared by the retrieval backends.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import Document, DocumentChunk
+
+
+@dataclass
+class RetrievalQuery:
+    """What to look for and where: the query vector, the tenant scope, filters, k and threshold."""
+
+    embedding: np.ndarray
+    user_id: str
+    k: int
+    min_similarity: Optional[float] = None
+    document_ids: Optional[Sequence[Any]] = None
+    filters: Optional[Dict[str, Any]] = None  # meta_info key -> value
+
+    def __post_init__(self):
+        # Stored embeddings are unit length; a unit query makes every score a cosine
+        self.embedding = np.asarray(self.embedding, dtype=np.float32)
+        norm = np.linalg.norm(self.embedding)
+        if norm:
+            self.embedding = self.embedding / norm
+
+    def criteria(self) -> List[Any]:
+        """WHERE clauses on DocumentChunk for the query's scope and filters."""
+        criteria = [DocumentChunk.user_id == self.user_id]
+        if self.document_ids:
+            criteria.append(DocumentChunk.document_id.in_(self.document_ids))
+        for key, value in (self.filters or {}).items():
+            criteria.append(DocumentChunk.meta_info[key].as_string() == str(value))
+        return criteria
+
+
+@dataclass
+class ScoredChunk:
+    score: float
+    chunk: DocumentChunk
+    document: Document
+
+
+@dataclass
+class RetrievalResult:
+    hits: List[ScoredChunk] = field(default_factory=list)
+    scanned: int = 0  # chunks with an embedding that passed the filters
+    matched: int = 0  # of those, chunks at or above min_similarity
+
+
+class RetrievalBackend(ABC):
+    """Finds the k chunks most similar to a query, best first."""
+
+    name: str
+
+    @abstractmethod
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        ...
+
+
+async def hydrate(
+    db: AsyncSession, keys: Iterable[Tuple[Any, Any]]
+) -> Dict[Any, Tuple[DocumentChunk, Document]]:
+    """Load chunks and their documents for (chunk_id, user_id) pairs, keyed by chunk id."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(DocumentChunk, Document)
+        .join(Document, DocumentChunk.document_id == Document.id)
+        .where(
+            # user_id lets Postgres prune to the partitions holding these chunks
+            DocumentChunk.user_id.in_({user_id for _, user_id in keys}),
+            DocumentChunk.id.in_([chunk_id for chunk_id, _ in keys]),
+        )
+    )
+    return {chunk.id: (chunk, document) for chunk, document in result.all()}
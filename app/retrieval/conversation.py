@@ -0,0 +1,136 @@
+"""
+Candidate pools for multi-turn conversations.
+
+Follow-up questions in a chat almost always land in the same few documents
+as the first one. On the first turn of a conversation, the best
+``CONVERSATION_POOL_SIZE`` chunks are fetched and their vectors kept.
+Later turns are ranked against that pool in memory, and only the chunks
+that make the answer are loaded from Postgres.
+
+The pool is replaced by a full search in three cases:
+* its k-th best score falls below ``CONVERSATION_POOL_MIN_SIMILARITY``;
+* the tenant's corpus has changed;
+* the document scope differs from the one the pool was built for.
+
+Pools live in the API process. A turn routed to another process simply
+builds a new pool there.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.retrieval.base import RetrievalQuery, RetrievalResult, ScoredChunk, hydrate
+from app.retrieval.events import corpus_version
+
+
+@dataclass
+class CandidatePool:
+    scope: Tuple[str, ...]
+    version: int
+    ids: List
+    embeddings: np.ndarray  # (n, d) float32, unit rows
+    expires_at: float
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        scores = self.embeddings @ query.embedding
+        rows = np.arange(len(scores))
+        if query.min_similarity is not None:
+            rows = rows[scores[rows] >= query.min_similarity]
+        matched = len(rows)
+        rows = rows[np.argsort(-scores[rows])][:query.k]
+
+        rows_by_id = await hydrate(db, [(self.ids[i], query.user_id) for i in rows])
+        hits = [
+            ScoredChunk(float(scores[i]), *rows_by_id[self.ids[i]])
+            for i in rows
+            # Deleted since the first turn
+            if self.ids[i] in rows_by_id
+        ]
+        return RetrievalResult(hits=hits, scanned=len(scores), matched=matched)
+
+
+class ConversationPools:
+    """Bounded LRU of candidate pools keyed by (user_id, conversation_id)."""
+
+    def __init__(
+        self,
+        size: int = settings.CONVERSATION_POOL_SIZE,
+        min_similarity: float = settings.CONVERSATION_POOL_MIN_SIMILARITY,
+        ttl: int = settings.CONVERSATION_POOL_TTL,
+        max_conversations: int = settings.CONVERSATION_POOL_MAX_CONVERSATIONS,
+        versions=None,
+    ):
+        self.size = size
+        self.min_similarity = min_similarity
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self._versions = versions
+        self._pools: "OrderedDict[Tuple[str, str], CandidatePool]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, conversation_id: str) -> Optional[CandidatePool]:
+        with self._lock:
+            pool = self._pools.get((str(user_id), conversation_id))
+            if pool is None:
+                return None
+            if pool.expires_at <= time.time():
+                del self._pools[(str(user_id), conversation_id)]
+                return None
+            self._pools.move_to_end((str(user_id), conversation_id))
+            return pool
+
+    def put(self, user_id: str, conversation_id: str, pool: CandidatePool) -> None:
+        with self._lock:
+            self._pools[(str(user_id), conversation_id)] = pool
+            self._pools.move_to_end((str(user_id), conversation_id))
+            while len(self._pools) > self.max_conversations:
+                self._pools.popitem(last=False)
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: RetrievalQuery,
+        conversation_id: str,
+        full_search: Callable[[AsyncSession, RetrievalQuery], Awaitable[RetrievalResult]],
+    ) -> RetrievalResult:
+        """Answer from the conversation's pool if it is good enough, else search fully and rebuild it."""
+        if self.size <= 0 or query.filters:
+            return await full_search(db, query)
+
+        scope = tuple(sorted(str(d) for d in query.document_ids or ()))
+        version = await corpus_version(query.user_id, self._versions)
+        pool = self.get(query.user_id, conversation_id)
+        if pool is not None and version is not None and (pool.scope, pool.version) == (scope, version):
+            result = await pool.search(db, replace(query, min_similarity=None))
+            if len(result.hits) >= query.k and result.hits[query.k - 1].score >= self.min_similarity:
+                return _threshold(result, query)
+
+        wide = await full_search(db, replace(query, k=max(self.size, query.k), min_similarity=None))
+        if version is not None:
+            self.put(query.user_id, conversation_id, CandidatePool(
+                scope=scope,
+                version=version,
+                ids=[hit.chunk.id for hit in wide.hits],
+                embeddings=np.vstack([
+                    np.asarray(hit.chunk.embedding, dtype=np.float32) for hit in wide.hits
+                ]) if wide.hits else np.empty((0, len(query.embedding)), dtype=np.float32),
+                expires_at=time.time() + self.ttl,
+            ))
+        return _threshold(wide, query)
+
+
+def _threshold(result: RetrievalResult, query: RetrievalQuery) -> RetrievalResult:
+    """Cut a result fetched without a threshold down to the query's k and min_similarity."""
+    hits = [
+        hit for hit in result.hits
+        if query.min_similarity is None or hit.score >= query.min_similarity
+    ]
+    # Counted among the fetched candidates only, so a lower bound for large scopes
+    return RetrievalResult(hits=hits[:query.k], scanned=result.scanned, matched=len(hits))
@@ -0,0 +1,153 @@
+"""
+Corpus change events, so resident vector caches can follow the database.
+
+Workers publish one event when a document's chunks are committed or
+removed. Each event carries the tenant's corpus version, a counter bumped
+once per event. A subscriber that holds data at version ``v`` can patch
+event ``v + 1`` in place. If it sees a larger jump, it missed an event and
+must reload.
+
+Subscribers can drop out of pub/sub for a while, during a Redis restart or
+a network blip. Whatever they hold is then reconciled against the stored
+versions when they reconnect.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "documind:corpus"
+CHANNEL = f"{KEY_PREFIX}:events"
+
+ADDED = "added"
+REMOVED = "removed"
+
+
+@dataclass
+class CorpusEvent:
+    user_id: str
+    document_id: str
+    corpus_version: int
+    action: str  # ADDED or REMOVED
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> "CorpusEvent":
+        return cls(**json.loads(raw))
+
+
+class InMemoryCorpusEvents:
+    """Process-local bus, used for tests and single-process deployments."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._handlers: List[Callable[[CorpusEvent], None]] = []
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, document_id, action: str) -> CorpusEvent:
+        with self._lock:
+            self._versions[str(user_id)] += 1
+            event = CorpusEvent(str(user_id), str(document_id), self._versions[str(user_id)], action)
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler(event)
+        return event
+
+    def version(self, user_id) -> int:
+        return self._versions.get(str(user_id), 0)
+
+    def listen(
+        self,
+        handler: Callable[[CorpusEvent], None],
+        on_connect: Callable[[], None],
+        stop_event: threading.Event,
+    ) -> None:
+        with self._lock:
+            self._handlers.append(handler)
+        on_connect()
+        stop_event.wait()
+        with self._lock:
+            self._handlers.remove(handler)
+
+
+class RedisCorpusEvents:
+    """Versions in Redis counters, events on a pub/sub channel."""
+
+    def __init__(self, connection: Redis):
+        self.redis = connection
+
+    def _version_key(self, user_id) -> str:
+        return f"{KEY_PREFIX}:{user_id}:version"
+
+    def publish(self, user_id, document_id, action: str) -> CorpusEvent:
+        event = CorpusEvent(str(user_id), str(document_id), self.redis.incr(self._version_key(user_id)), action)
+        self.redis.publish(CHANNEL, event.to_json())
+        return event
+
+    def version(self, user_id) -> int:
+        version = self.redis.get(self._version_key(user_id))
+        return int(version) if version else 0
+
+    def listen(
+        self,
+        handler: Callable[[CorpusEvent], None],
+        on_connect: Callable[[], None],
+        stop_event: threading.Event,
+    ) -> None:
+        """Deliver events to handler until stop_event is set, resubscribing after errors."""
+        while not stop_event.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                # Anything published while we were not subscribed is lost
+                on_connect()
+                while not stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    try:
+                        handler(CorpusEvent.from_json(message["data"]))
+                    except Exception as exc:  # noqa: BLE001
+                        logger.warning("Could not apply corpus event %s: %s", message["data"], exc)
+            except RedisError as exc:
+                logger.warning("Corpus event subscription lost, resubscribing: %s", exc)
+                stop_event.wait(1.0)
+            finally:
+                pubsub.close()
+
+
+_events: Optional[RedisCorpusEvents] = None
+
+
+def get_corpus_events() -> RedisCorpusEvents:
+    global _events
+    if _events is None:
+        _events = RedisCorpusEvents(Redis.from_url(settings.REDIS_URL))
+    return _events
+
+
+async def corpus_version(user_id, versions=None) -> Optional[int]:
+    """The tenant's current corpus version, or None when it cannot be read."""
+    if versions is None:
+        if not settings.CORPUS_EVENTS_ENABLED:
+            # Nothing bumps the version; callers bound staleness with a TTL
+            return 0
+        versions = get_corpus_events()
+    try:
+        return await asyncio.to_thread(versions.version, user_id)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Corpus version of %s unavailable: %s", user_id, exc)
+        return None
@@ -0,0 +1,54 @@
+"""
+Two-stage retrieval: rank documents by centroid, then score their chunks.
+
+The first stage orders the user's documents by ``centroid <#> query`` in
+Postgres and keeps the best ``documents``. The wrapped backend then scores
+only those documents' chunks, so a query over a library of thousands of
+documents touches a few percent of its chunks.
+
+``documents`` is the recall knob. A relevant chunk is missed only when its
+document's centroid ranks outside the top ``documents``, which gets rarer
+as it grows. Documents still being processed have no centroid yet and are
+always searched.
+"""
+
+import dataclasses
+from typing import Any, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import Document
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult
+
+
+class CentroidBackend(RetrievalBackend):
+    """Restricts another backend to the documents whose centroids best match the query."""
+
+    def __init__(self, inner: RetrievalBackend, documents: int):
+        self.inner = inner
+        self.documents = documents
+        self.name = f"centroid+{inner.name}"
+
+    async def candidate_documents(self, db: AsyncSession, query: RetrievalQuery) -> List[Any]:
+        scope = [Document.user_id == query.user_id]
+        if query.document_ids:
+            scope.append(Document.id.in_(query.document_ids))
+
+        ranked = await db.execute(
+            select(Document.id)
+            .where(*scope, Document.centroid.is_not(None))
+            .order_by(Document.centroid.max_inner_product(query.embedding))
+            .limit(self.documents)
+        )
+        pending = await db.execute(select(Document.id).where(*scope, Document.centroid.is_(None)))
+        return list(ranked.scalars().all()) + list(pending.scalars().all())
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        if query.document_ids and len(query.document_ids) <= self.documents:
+            return await self.inner.search(db, query)
+
+        candidates = await self.candidate_documents(db, query)
+        if not candidates:
+            return RetrievalResult()
+        return await self.inner.search(db, dataclasses.replace(query, document_ids=candidates))
@@ -0,0 +1,70 @@
+"""
+The retrieval entry point used by the search, summarize and chat endpoints.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.ml.embeddings import EmbeddingGenerator
+from app.retrieval.backends import get_backend
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult
+from app.retrieval.conversation import ConversationPools
+
+
+class Retriever:
+    """Embeds a query and finds the most similar chunks in a user's documents."""
+
+    def __init__(
+        self,
+        backend: Optional[RetrievalBackend] = None,
+        embedding_generator: Optional[EmbeddingGenerator] = None,
+        conversations: Optional[ConversationPools] = None,
+    ):
+        self.backend = backend or get_backend()
+        self.embedding_generator = embedding_generator or EmbeddingGenerator(settings.EMBEDDING_MODEL)
+        self.conversations = conversations or ConversationPools()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embedding_generator.generate_embeddings([text])[0]
+
+    async def retrieve(
+        self,
+        db: AsyncSession,
+        query: str,
+        user_id: str,
+        k: int,
+        min_similarity: Optional[float] = None,
+        document_ids: Optional[Sequence[Any]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> RetrievalResult:
+        """
+        Return the k chunks most similar to query, best first.
+
+        Args:
+            user_id: only this user's chunks are searched
+            min_similarity: drop chunks scoring below this
+            document_ids: further restrict to these documents
+            filters: exact matches on chunk meta_info keys
+        """
+        return await self.search(db, RetrievalQuery(
+            embedding=self.embed(query),
+            user_id=user_id,
+            k=k,
+            min_similarity=min_similarity,
+            document_ids=document_ids,
+            filters=filters,
+        ))
+
+    async def search(
+        self, db: AsyncSession, query: RetrievalQuery, conversation_id: Optional[str] = None
+    ) -> RetrievalResult:
+        """Run query on the backend; turns of one conversation re-rank its candidate pool first."""
+        if conversation_id is not None:
+            return await self.conversations.search(db, query, conversation_id, self.backend.search)
+        return await self.backend.search(db, query)
+
+
+retriever = Retriever()
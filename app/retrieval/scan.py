@@ -0,0 +1,126 @@
+"""
+Streaming top-k similarity scan over doc_chunks, used by the ``numpy`` backend.
+
+Only ``(id, user_id, <vector>)`` is read, through a server-side cursor in
+batches of ``VECTOR_SCAN_BATCH_SIZE``. Each batch is scored as one NumPy
+block and merged into a bounded min-heap, and text and document rows are
+loaded only for the winners. Memory stays O(batch + k) however many chunks
+match the filters. Stored embeddings are unit length (see
+``EmbeddingGenerator``), so similarity is a plain dot product with no
+per-row norm.
+
+With ``VECTOR_QUANTIZATION = "int8"`` the scan reads the int8 codes and
+their scale (about a quarter of the float32 payload) and keeps
+``k * VECTOR_RESCORE_FACTOR`` candidates. Those candidates are hydrated with
+their full-precision embeddings and re-scored exactly before the final top
+k is taken.
+"""
+
+import heapq
+import itertools
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.ml.quantization import codes_from_bytes
+from app.models.database import DocumentChunk
+from app.retrieval.base import RetrievalResult, ScoredChunk, hydrate
+
+# Quantized scores may sit slightly below the exact ones; keep borderline
+# candidates for re-scoring instead of dropping them on the first pass
+QUANTIZED_SCORE_MARGIN = 0.02
+
+
+def score_block(query: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """Cosine similarity of a unit-length query against each unit-length row of block."""
+    return block @ query
+
+
+async def stream_top_k(
+    db: AsyncSession,
+    query_embedding: Any,
+    k: int,
+    criteria: Sequence[Any] = (),
+    min_similarity: Optional[float] = None,
+    batch_size: int = settings.VECTOR_SCAN_BATCH_SIZE,
+    quantized: Optional[bool] = None,
+) -> RetrievalResult:
+    """
+    Return the k chunks most similar to query_embedding, best first.
+
+    Args:
+        criteria: WHERE clauses on DocumentChunk, e.g. the user_id filter
+        min_similarity: drop chunks scoring below this
+        quantized: scan int8 codes and re-score (defaults to VECTOR_QUANTIZATION)
+    """
+    if quantized is None:
+        quantized = settings.VECTOR_QUANTIZATION == "int8"
+    # Queries come from the same generator, but normalising one vector is free
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm:
+        query = query / query_norm
+
+    result = RetrievalResult()
+    keep = k * settings.VECTOR_RESCORE_FACTOR if quantized else k
+    first_pass_min = min_similarity
+    if quantized and min_similarity is not None:
+        first_pass_min = min_similarity - QUANTIZED_SCORE_MARGIN
+    heap: list = []  # (score, tiebreak, chunk_id, user_id), worst on top
+    tiebreak = itertools.count()
+
+    vector_column = DocumentChunk.embedding_q if quantized else DocumentChunk.embedding
+    columns = [DocumentChunk.id, DocumentChunk.user_id, vector_column]
+    if quantized:
+        columns.append(DocumentChunk.embedding_scale)
+    stream = await db.stream(
+        select(*columns)
+        .where(vector_column.is_not(None), *criteria)
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in stream.partitions():
+        if quantized:
+            codes = codes_from_bytes([row[2] for row in rows], len(query)).astype(np.float32)
+            scores = score_block(query, codes) * np.array([row[3] for row in rows], dtype=np.float32)
+        else:
+            block = np.vstack([np.asarray(row[2], dtype=np.float32) for row in rows])
+            scores = score_block(query, block)
+        result.scanned += len(rows)
+        if min_similarity is not None:
+            result.matched += int(np.count_nonzero(scores >= min_similarity))
+        else:
+            result.matched += len(rows)
+
+        candidates = np.arange(len(rows))
+        if first_pass_min is not None:
+            candidates = candidates[scores >= first_pass_min]
+
+        # Only the block's own top candidates can enter the heap
+        if len(candidates) > keep:
+            candidates = candidates[np.argpartition(scores[candidates], -keep)[-keep:]]
+        for i in candidates:
+            entry = (float(scores[i]), next(tiebreak), rows[i][0], rows[i][1])
+            if len(heap) < keep:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+    rows_by_id = await hydrate(db, [(chunk_id, user_id) for _, _, chunk_id, user_id in heap])
+
+    hits = []
+    for score, _, chunk_id, _ in heap:
+        if chunk_id not in rows_by_id:
+            continue
+        chunk, document = rows_by_id[chunk_id]
+        if quantized:
+            score = float(np.asarray(chunk.embedding, dtype=np.float32) @ query)
+            if min_similarity is not None and score < min_similarity:
+                continue
+        hits.append(ScoredChunk(score, chunk, document))
+
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    result.hits = hits[:k]
+    return result
@@ -0,0 +1,354 @@
+"""
+Shard node for the sharded retrieval tier.
+
+A node holds the tenant slices that the hash ring assigns to it, as
+resident float32 matrices, and answers top-k queries for them over HTTP:
+
+    python -m app.retrieval.shard_node --port 8101 --url http://10.0.0.5:8101
+
+How slices are kept:
+
+* A slice is loaded on its first query and reloaded once it is older than
+  ``RETRIEVAL_SHARD_REFRESH_SECONDS``.
+* Past ``RETRIEVAL_SHARD_MEMORY_MB``, the least recently used slices are
+  evicted.
+* Slices the ring has moved to another node are dropped at the next
+  heartbeat, so memory follows ownership as nodes join and leave.
+* Corpus events from the workers (``app.retrieval.events``) patch the
+  affected document's rows into resident slices. A slice that missed an
+  event is dropped and reloaded on its next query.
+"""
+
+import argparse
+import hmac
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import Depends, FastAPI, Header, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.database import DocumentChunk
+from app.retrieval.events import ADDED, CorpusEvent, get_corpus_events
+from app.retrieval.sharding import SECRET_HEADER, HashRing, get_registry, slice_clause
+
+logger = logging.getLogger(__name__)
+
+
+class SliceSearchRequest(BaseModel):
+    user_id: uuid.UUID
+    slice: int
+    slices: int
+    embedding: List[float]
+    k: int
+    min_similarity: Optional[float] = None
+    document_ids: Optional[List[uuid.UUID]] = None
+
+
+class SliceHit(BaseModel):
+    chunk_id: uuid.UUID
+    score: float
+
+
+class SliceSearchResponse(BaseModel):
+    hits: List[SliceHit]
+    scanned: int
+    matched: int
+
+
+@dataclass
+class ResidentSlice:
+    ids: List[uuid.UUID]
+    document_codes: np.ndarray  # per row, an index into document_index
+    document_index: Dict[uuid.UUID, int]
+    matrix: np.ndarray  # (n, d) float32, unit-length rows
+    loaded_at: float
+    slices: int = 1
+    version: int = 0  # corpus version the rows reflect
+
+    @property
+    def nbytes(self) -> int:
+        # UUID objects dominate the per-row overhead next to the matrix
+        return self.matrix.nbytes + self.document_codes.nbytes + len(self.ids) * 100
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        min_similarity: Optional[float] = None,
+        document_ids: Optional[List[uuid.UUID]] = None,
+    ) -> Tuple[List[Tuple[uuid.UUID, float]], int, int]:
+        """Exact top-k; returns (hits best first, rows scanned, rows at or above min_similarity)."""
+        scores = self.matrix @ query
+        rows = np.arange(len(scores))
+        if document_ids is not None:
+            wanted = [self.document_index[d] for d in document_ids if d in self.document_index]
+            rows = rows[np.isin(self.document_codes, wanted)]
+        scanned = len(rows)
+        if min_similarity is not None:
+            rows = rows[scores[rows] >= min_similarity]
+        matched = len(rows)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(self.ids[i], float(scores[i])) for i in rows], scanned, matched
+
+    def replace_document(
+        self, document_id: uuid.UUID, ids: List[uuid.UUID], matrix: np.ndarray, version: int
+    ) -> "ResidentSlice":
+        """A copy with the document's rows swapped for ids/matrix; readers keep the old one."""
+        keep = self.document_codes != self.document_index.get(document_id, -1)
+        document_index = dict(self.document_index)
+        code = document_index.setdefault(document_id, len(document_index))
+        return ResidentSlice(
+            [chunk_id for chunk_id, kept in zip(self.ids, keep) if kept] + list(ids),
+            np.concatenate([self.document_codes[keep], np.full(len(ids), code, dtype=np.int32)]),
+            document_index,
+            np.vstack([self.matrix[keep], matrix]),
+            self.loaded_at,
+            self.slices,
+            version,
+        )
+
+
+def _load_rows(*criteria) -> Tuple[List[uuid.UUID], List[uuid.UUID], np.ndarray]:
+    """Returns (chunk ids, their document ids, embedding matrix) for the matching chunks."""
+    ids: List[uuid.UUID] = []
+    document_ids: List[uuid.UUID] = []
+    blocks: List[np.ndarray] = []
+
+    # Server-side cursors need a transaction, hence a plain connection
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=settings.VECTOR_SCAN_BATCH_SIZE).execute(
+            select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.embedding).where(
+                DocumentChunk.embedding.is_not(None), *criteria
+            )
+        )
+        for rows in result.partitions():
+            for chunk_id, document_id, _ in rows:
+                ids.append(chunk_id)
+                document_ids.append(document_id)
+            blocks.append(np.vstack([np.asarray(embedding, dtype=np.float32) for _, _, embedding in rows]))
+
+    matrix = np.vstack(blocks) if blocks else np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+    return ids, document_ids, matrix
+
+
+def load_slice(user_id, slice_no: int, slices: int) -> ResidentSlice:
+    # Read before the rows: an event racing the load is then re-applied, which is harmless
+    version = get_corpus_events().version(user_id) if settings.CORPUS_EVENTS_ENABLED else 0
+    ids, document_ids, matrix = _load_rows(DocumentChunk.user_id == user_id, slice_clause(slice_no, slices))
+    document_index: Dict[uuid.UUID, int] = {}
+    codes = [document_index.setdefault(document_id, len(document_index)) for document_id in document_ids]
+    return ResidentSlice(
+        ids, np.array(codes, dtype=np.int32), document_index, matrix, time.time(), slices, version
+    )
+
+
+def load_document_rows(
+    user_id, document_id, slice_no: int, slices: int
+) -> Tuple[List[uuid.UUID], np.ndarray]:
+    ids, _, matrix = _load_rows(
+        DocumentChunk.user_id == user_id,
+        DocumentChunk.document_id == document_id,
+        slice_clause(slice_no, slices),
+    )
+    return ids, matrix
+
+
+class SliceCache:
+    """Resident slices keyed "<user_id>:<slice>", least recently used first out."""
+
+    def __init__(
+        self,
+        max_bytes: int = settings.RETRIEVAL_SHARD_MEMORY_MB * 1024 * 1024,
+        refresh_seconds: float = settings.RETRIEVAL_SHARD_REFRESH_SECONDS,
+        loader: Callable[[uuid.UUID, int, int], ResidentSlice] = load_slice,
+        document_loader: Callable[..., Tuple[List[uuid.UUID], np.ndarray]] = load_document_rows,
+    ):
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self.loader = loader
+        self.document_loader = document_loader
+        self._slices: "OrderedDict[str, ResidentSlice]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, slice_no: int, slices: int) -> ResidentSlice:
+        key = f"{user_id}:{slice_no}"
+        with self._lock:
+            resident = self._slices.get(key)
+            if resident and time.time() - resident.loaded_at < self.refresh_seconds:
+                self._slices.move_to_end(key)
+                return resident
+
+        # Load outside the lock so other tenants keep being served meanwhile
+        resident = self.loader(user_id, slice_no, slices)
+        with self._lock:
+            self._slices[key] = resident
+            self._slices.move_to_end(key)
+            while len(self._slices) > 1 and self.nbytes() > self.max_bytes:
+                evicted, _ = self._slices.popitem(last=False)
+                logger.info("Evicted slice %s", evicted)
+        return resident
+
+    def nbytes(self) -> int:
+        return sum(resident.nbytes for resident in self._slices.values())
+
+    def retain(self, keep: Callable[[str], bool]) -> List[str]:
+        """Drop every slice whose key keep() rejects; returns the dropped keys."""
+        with self._lock:
+            dropped = [key for key in self._slices if not keep(key)]
+            for key in dropped:
+                del self._slices[key]
+        return dropped
+
+    def apply(self, event: CorpusEvent) -> None:
+        """Patch the event's document into the tenant's resident slices, or drop slices that missed events."""
+        with self._lock:
+            keys = [key for key in self._slices if key.split(":")[0] == event.user_id]
+        for key in keys:
+            resident = self._slices.get(key)
+            if resident is None or event.corpus_version <= resident.version:
+                continue
+            if event.corpus_version > resident.version + 1:
+                logger.info("Slice %s is behind corpus version %d, dropping it", key, event.corpus_version)
+                self.retain(lambda other: other != key)
+                continue
+
+            document_id = uuid.UUID(event.document_id)
+            if event.action == ADDED:
+                ids, matrix = self.document_loader(event.user_id, document_id, int(key.split(":")[1]), resident.slices)
+            else:
+                ids, matrix = [], np.empty((0, resident.matrix.shape[1]), dtype=np.float32)
+            patched = resident.replace_document(document_id, ids, matrix, event.corpus_version)
+            with self._lock:
+                # Unless the slice was reloaded or dropped meanwhile
+                if self._slices.get(key) is resident:
+                    self._slices[key] = patched
+
+    def reconcile(self, version_of: Callable[[str], int]) -> List[str]:
+        """Drop slices whose version differs from the tenant's current one; returns the dropped keys."""
+        with self._lock:
+            residents = list(self._slices.items())
+        current: Dict[str, int] = {}
+        stale = set()
+        for key, resident in residents:
+            user_id = key.split(":")[0]
+            if user_id not in current:
+                current[user_id] = version_of(user_id)
+            if resident.version != current[user_id]:
+                stale.add(key)
+        return self.retain(lambda key: key not in stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"slices": len(self._slices), "bytes": self.nbytes()}
+
+
+class ShardNode:
+    def __init__(self, url: str, registry=None, cache: Optional[SliceCache] = None, events=None):
+        self.url = url
+        self.registry = registry or get_registry()
+        self.cache = cache or SliceCache()
+        self.events = events
+        if events is None and settings.CORPUS_EVENTS_ENABLED:
+            self.events = get_corpus_events()
+        self.ring = HashRing()
+
+    def heartbeat(self) -> None:
+        """Announce this node, refresh the ring and drop slices that moved elsewhere."""
+        self.registry.heartbeat(self.url)
+        ring = HashRing(self.registry.live_nodes())
+        if ring.nodes != self.ring.nodes:
+            logger.info("Shard ring changed: %s", ring.nodes)
+        self.ring = ring
+        dropped = self.cache.retain(lambda key: ring.node_for(key) == self.url)
+        if dropped:
+            logger.info("Released %d slices to other nodes", len(dropped))
+
+    def run_heartbeats(self, stop_event: threading.Event) -> None:
+        interval = self.registry.ttl / 3
+        while not stop_event.is_set():
+            try:
+                self.heartbeat()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Shard heartbeat failed: %s", exc)
+            stop_event.wait(interval)
+        self.registry.leave(self.url)
+
+    def run_events(self, stop_event: threading.Event) -> None:
+        def on_connect() -> None:
+            dropped = self.cache.reconcile(self.events.version)
+            if dropped:
+                logger.info("Dropped %d slices that missed corpus events", len(dropped))
+
+        self.events.listen(self.cache.apply, on_connect, stop_event)
+
+    def search(self, request: SliceSearchRequest) -> SliceSearchResponse:
+        resident = self.cache.get(request.user_id, request.slice, request.slices)
+        hits, scanned, matched = resident.search(
+            np.asarray(request.embedding, dtype=np.float32),
+            request.k,
+            request.min_similarity,
+            request.document_ids,
+        )
+        return SliceSearchResponse(
+            hits=[SliceHit(chunk_id=chunk_id, score=score) for chunk_id, score in hits],
+            scanned=scanned,
+            matched=matched,
+        )
+
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def create_app(node: ShardNode, secret: str = settings.RETRIEVAL_SHARD_SECRET) -> FastAPI:
+    shard_app = FastAPI(title="DocuMind retrieval shard")
+    stop_event = threading.Event()
+
+    def check_secret(provided: Optional[str] = Header(None, alias=SECRET_HEADER)) -> None:
+        # Search answers for any tenant, so only the API processes may call it
+        if secret and not hmac.compare_digest((provided or "").encode(), secret.encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid shard secret")
+
+    @shard_app.on_event("startup")
+    def start_heartbeats() -> None:
+        threading.Thread(target=node.run_heartbeats, args=(stop_event,), daemon=True).start()
+        if node.events is not None:
+            threading.Thread(target=node.run_events, args=(stop_event,), daemon=True).start()
+
+    @shard_app.on_event("shutdown")
+    def stop_heartbeats() -> None:
+        stop_event.set()
+
+    # Plain def: FastAPI runs it in its threadpool, off the event loop
+    @shard_app.post("/search", response_model=SliceSearchResponse, dependencies=[Depends(check_secret)])
+    def search(request: SliceSearchRequest) -> SliceSearchResponse:
+        return node.search(request)
+
+    @shard_app.get("/health")
+    def health():
+        return {"url": node.url, "ring": node.ring.nodes, **node.cache.stats()}
+
+    return shard_app
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Serve a shard of the retrieval tier")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on; others need RETRIEVAL_SHARD_SECRET")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--url", default=settings.RETRIEVAL_SHARD_NODE_URL, help="URL API processes reach this node at")
+    args = parser.parse_args()
+    if args.host not in LOOPBACK_HOSTS and not settings.RETRIEVAL_SHARD_SECRET:
+        parser.error("set RETRIEVAL_SHARD_SECRET before listening on a non-loopback --host")
+    uvicorn.run(create_app(ShardNode(args.url or f"http://localhost:{args.port}")), host=args.host, port=args.port)
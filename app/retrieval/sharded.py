@@ -0,0 +1,121 @@
+"""
+Scatter-gather over the shard nodes in ``app.retrieval.shard_node``.
+
+A query fans out to the owner of each of the tenant's slices. Each node
+returns its exact top-k, and the lists are merged into the global top-k.
+Only the winners are then hydrated from Postgres. Queries narrowed by
+metadata filters, and queries made while no node is live or a node fails,
+are answered by the local fallback backend instead, so a shard outage
+costs latency but never results.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.retrieval.base import RetrievalBackend, RetrievalQuery, RetrievalResult, ScoredChunk, hydrate
+from app.retrieval.sharding import SECRET_HEADER, HashRing, get_registry, slice_keys
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedBackend(RetrievalBackend):
+    name = "sharded"
+
+    def __init__(
+        self,
+        fallback: Optional[RetrievalBackend] = None,
+        registry=None,
+        slices: int = settings.RETRIEVAL_TENANT_SLICES,
+        timeout: float = settings.RETRIEVAL_SHARD_TIMEOUT,
+        secret: str = settings.RETRIEVAL_SHARD_SECRET,
+    ):
+        if fallback is None:
+            # Imported here: backends registers this class
+            from app.retrieval.backends import NumpyBackend
+
+            fallback = NumpyBackend()
+        self.fallback = fallback
+        self._registry = registry
+        self.slices = slices
+        self.timeout = timeout
+        self._headers = {SECRET_HEADER: secret} if secret else {}
+        self._ring = HashRing()
+        self._ring_checked = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def registry(self):
+        # Resolved on first use, so the backend can be built without Redis
+        if self._registry is None:
+            self._registry = get_registry()
+        return self._registry
+
+    async def ring(self) -> HashRing:
+        """The ring of live nodes, re-read from the registry a few times per TTL."""
+        if time.monotonic() - self._ring_checked >= self.registry.ttl / 3:
+            nodes = await asyncio.to_thread(self.registry.live_nodes)
+            if nodes != self._ring.nodes:
+                self._ring = HashRing(nodes)
+            self._ring_checked = time.monotonic()
+        return self._ring
+
+    async def _query(self, node: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.post(f"{node}/search", json=payload, headers=self._headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def search(self, db: AsyncSession, query: RetrievalQuery) -> RetrievalResult:
+        if query.filters:
+            return await self.fallback.search(db, query)
+        try:
+            ring = await self.ring()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Shard registry unavailable, scanning locally: %s", exc)
+            return await self.fallback.search(db, query)
+        if not ring.nodes:
+            return await self.fallback.search(db, query)
+
+        request = {
+            "user_id": str(query.user_id),
+            "slices": self.slices,
+            "embedding": query.embedding.tolist(),
+            "k": query.k,
+            "min_similarity": query.min_similarity,
+            "document_ids": [str(d) for d in query.document_ids] if query.document_ids is not None else None,
+        }
+        try:
+            responses = await asyncio.gather(*(
+                self._query(ring.node_for(key), {**request, "slice": slice_no})
+                for slice_no, key in enumerate(slice_keys(query.user_id, self.slices))
+            ))
+        except (httpx.HTTPError, ValueError) as exc:
+            logger.warning("Shard query failed, scanning locally: %s", exc)
+            return await self.fallback.search(db, query)
+
+        hits: List[Dict[str, Any]] = heapq.nlargest(
+            query.k, (hit for response in responses for hit in response["hits"]), key=lambda hit: hit["score"]
+        )
+        chunk_ids = [uuid.UUID(hit["chunk_id"]) for hit in hits]
+        rows_by_id = await hydrate(db, [(chunk_id, query.user_id) for chunk_id in chunk_ids])
+
+        scored = [
+            ScoredChunk(hit["score"], *rows_by_id[chunk_id])
+            for hit, chunk_id in zip(hits, chunk_ids)
+            # Slices lag Postgres by up to RETRIEVAL_SHARD_REFRESH_SECONDS, so skip deleted chunks
+            if chunk_id in rows_by_id
+        ]
+        return RetrievalResult(
+            hits=scored,
+            scanned=sum(response["scanned"] for response in responses),
+            matched=sum(response["matched"] for response in responses),
+        )
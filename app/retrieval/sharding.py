@@ -0,0 +1,112 @@
+"""
+Tenant placement for the sharded retrieval tier.
+
+Each tenant's chunks are split into ``RETRIEVAL_TENANT_SLICES`` slices by a
+hash of the chunk id. Each slice, keyed ``"<user_id>:<slice>"``, is placed
+on a shard node by consistent hashing. When a node joins or leaves, only
+the slices on the arcs next to it move, and every other node keeps its
+resident matrices.
+
+Nodes announce themselves in a registry with a heartbeat. A node missing
+heartbeats for ``RETRIEVAL_SHARD_TTL`` seconds drops out of everyone's ring.
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from redis import Redis
+from sqlalchemy import String, func
+
+from app.core.config import settings
+from app.models.database import DocumentChunk
+
+KEY_PREFIX = "documind:shards"
+# Carries RETRIEVAL_SHARD_SECRET from API processes to shard nodes
+SECRET_HEADER = "X-Shard-Secret"
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = settings.RETRIEVAL_SHARD_VNODES):
+        self.vnodes = vnodes
+        self.nodes = sorted(set(nodes))
+        ring = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        position = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[position]
+
+
+def slice_keys(user_id, slices: int = settings.RETRIEVAL_TENANT_SLICES) -> List[str]:
+    return [f"{user_id}:{i}" for i in range(slices)]
+
+
+def slice_clause(slice_no: int, slices: int):
+    """WHERE clause selecting one slice of doc_chunks."""
+    # Masking the sign bit instead of abs(): abs(-2^31) overflows int4
+    return func.hashtext(DocumentChunk.id.cast(String)).op("&")(0x7FFFFFFF) % slices == slice_no
+
+
+class InMemoryShardRegistry:
+    """Process-local registry, used for tests and single-host setups."""
+
+    def __init__(self, ttl: float = settings.RETRIEVAL_SHARD_TTL):
+        self.ttl = ttl
+        self._beats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self, url: str) -> None:
+        with self._lock:
+            self._beats[url] = time.time()
+
+    def leave(self, url: str) -> None:
+        with self._lock:
+            self._beats.pop(url, None)
+
+    def live_nodes(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            return sorted(url for url, beat in self._beats.items() if beat >= cutoff)
+
+
+class RedisShardRegistry:
+    """Heartbeats in a Redis sorted set, scored by the time of each node's last beat."""
+
+    def __init__(self, connection: Redis, ttl: float = settings.RETRIEVAL_SHARD_TTL):
+        self.redis = connection
+        self.ttl = ttl
+        self.key = f"{KEY_PREFIX}:nodes"
+
+    def heartbeat(self, url: str) -> None:
+        self.redis.zadd(self.key, {url: time.time()})
+
+    def leave(self, url: str) -> None:
+        self.redis.zrem(self.key, url)
+
+    def live_nodes(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        # Forget nodes that died without leaving
+        self.redis.zremrangebyscore(self.key, "-inf", cutoff)
+        return sorted(url.decode() for url in self.redis.zrangebyscore(self.key, cutoff, "+inf"))
+
+
+_registry: Optional[RedisShardRegistry] = None
+
+
+def get_registry() -> RedisShardRegistry:
+    global _registry
+    if _registry is None:
+        _registry = RedisShardRegistry(Redis.from_url(settings.REDIS_URL))
+    return _registry
@@ -0,0 +1,135 @@
+"""
+Semantic cache of chat and summarize responses.
+
+Users ask the same question in many phrasings. Each user's recent
+responses are kept with the embedding of the query that produced them. A
+new query reuses a response when all of these hold:
+
+* the two embeddings have cosine similarity of at least
+  ``ANSWER_CACHE_SIMILARITY``;
+* the scope matches (endpoint, documents, summary parameters);
+* the tenant's corpus version is unchanged (see ``app.retrieval.events``).
+
+A lookup is one matrix-vector product over at most
+``ANSWER_CACHE_MAX_ENTRIES`` rows.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.retrieval.events import corpus_version
+
+
+@dataclass
+class CacheLookup:
+    user_id: str
+    scope: str
+    version: Optional[int]  # None when the corpus version is unknown; nothing is cached then
+    embedding: np.ndarray
+    response: Optional[Any] = None
+
+
+@dataclass
+class _UserEntries:
+    scopes: List[str] = field(default_factory=list)
+    expires: List[float] = field(default_factory=list)
+    responses: List[Any] = field(default_factory=list)
+    embeddings: Optional[np.ndarray] = None  # (n, d) float32, unit rows
+    version: int = 0
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_entries: int = settings.ANSWER_CACHE_MAX_ENTRIES,
+        threshold: float = settings.ANSWER_CACHE_SIMILARITY,
+        ttl: int = settings.CACHE_TTL,
+        max_users: int = settings.ANSWER_CACHE_MAX_USERS,
+        versions=None,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_users = max_users
+        self._versions = versions
+        self._users: "OrderedDict[str, _UserEntries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def scope(kind: str, *parts: Any) -> str:
+        """Canonical scope key; lists are order-insensitive."""
+        def canonical(part: Any) -> str:
+            if isinstance(part, (list, tuple, set)):
+                return ",".join(sorted(str(item) for item in part))
+            return str(part)
+
+        return "|".join([kind, *(canonical(part) for part in parts)])
+
+    async def lookup(self, user_id: str, scope: str, embedding: np.ndarray) -> CacheLookup:
+        """Find a cached response for a near-duplicate query; pass the result to store() on a miss."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        if not self.enabled:
+            return CacheLookup(user_id, scope, None, embedding)
+
+        # Unknown (None) when Redis is unreachable; the cache is then bypassed
+        version = await corpus_version(user_id, self._versions)
+        lookup = CacheLookup(user_id, scope, version, embedding)
+        with self._lock:
+            entries = self._users.get(user_id)
+            if version is None or entries is None or entries.version != version:
+                return lookup
+            self._users.move_to_end(user_id)
+            scores = entries.embeddings @ embedding
+            # Other scopes and expired entries can never win
+            scores[[s != scope for s in entries.scopes]] = -np.inf
+            scores[np.asarray(entries.expires) <= time.time()] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                lookup.response = entries.responses[best]
+        return lookup
+
+    def store(self, lookup: CacheLookup, response: Any) -> None:
+        if not self.enabled or lookup.version is None:
+            return
+        with self._lock:
+            entries = self._users.get(lookup.user_id)
+            if entries is None or entries.version != lookup.version:
+                # Answers from an older corpus can never be served again
+                entries = _UserEntries(version=lookup.version)
+                self._users[lookup.user_id] = entries
+            self._users.move_to_end(lookup.user_id)
+
+            row = lookup.embedding[None, :]
+            entries.embeddings = row if entries.embeddings is None else np.vstack([entries.embeddings, row])
+            entries.scopes.append(lookup.scope)
+            entries.expires.append(time.time() + self.ttl)
+            entries.responses.append(response)
+            if len(entries.scopes) > self.max_entries:
+                drop = len(entries.scopes) - self.max_entries
+                entries.embeddings = entries.embeddings[drop:]
+                del entries.scopes[:drop], entries.expires[:drop], entries.responses[:drop]
+
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"users": len(self._users), "entries": sum(len(e.scopes) for e in self._users.values())}
+
+
+answer_cache = SemanticAnswerCache()
@@ -1,10 +1,15 @@
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import hashlib
 import logging
+import threading
+import time
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from gotrue import User as SupabaseUser
+from jose import ExpiredSignatureError, JWTError, jwt
 from supabase import create_client, Client
 
 from app.core.config import settings
@@ -39,64 +44,92 @@ class AuthError(HTTPException):
         ).dict()
         super().__init__(status_code=status_code, detail=detail)
 
+class ClaimsCache:
+    """Bounded LRU cache of verified token claims, keyed by token hash."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key: str, user: Dict[str, Any], token_exp: Optional[float] = None) -> None:
+        # Never cache past the token's own expiry
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
 # --- Start of the AuthService class definition ---
 class AuthService:
     """
     Service class for handling authentication logic.
     """
+    def __init__(self):
+        self.claims_cache = ClaimsCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL)
+
     async def get_current_user(
         self,
         credentials: HTTPAuthorizationCredentials = Depends(security)
-    ) -> SupabaseUser:
+    ) -> Dict[str, Any]:
         """
-        Validate JWT token and return Supabase user.
+        Validate JWT token and return the authenticated user.
+
+        Tokens are verified locally against SUPABASE_JWT_SECRET (signature,
+        exp, aud) and the result is cached by token hash, so most requests
+        make no network call. With AUTH_REMOTE_CHECK enabled, every request
+        is also confirmed with Supabase and the cache is bypassed, so a
+        revoked session is refused on its next request.
+
+        Returns:
+            dict: ``id``, ``email``, ``role`` and the raw ``claims``
         """
         try:
-            supabase_client = get_supabase_client()
-            if not supabase_client:
-                raise AuthError(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    message="Authentication service unavailable",
-                    error_code="SERVICE_UNAVAILABLE"
-                )
-            
             # Extract token and strip 'Bearer ' prefix if present
             token = credentials.credentials
             if token.startswith('Bearer '):
                 token = token[7:]  # Remove 'Bearer ' prefix
-            
-            logger.info(f"Validating token (length: {len(token)})")
-            
-            # Validate token with Supabase
-            user_response = supabase_client.auth.get_user(token)
-            logger.info(f"Got user_response: {type(user_response)}")
-            
-            if not user_response:
-                logger.error("user_response is None")
-                raise AuthError(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    message="User not found or token invalid",
-                    error_code="USER_NOT_FOUND"
-                )
-            
-            if not hasattr(user_response, 'user'):
-                logger.error(f"user_response has no 'user' attribute. Type: {type(user_response)}, Dir: {dir(user_response)}")
-                raise AuthError(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    message="Invalid user response structure",
-                    error_code="INVALID_USER_RESPONSE"
-                )
-            
-            if not user_response.user:
-                logger.error("user_response.user is None")
-                raise AuthError(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    message="User not found in response",
-                    error_code="USER_NOT_FOUND"
-                )
-            
-            logger.info(f"Successfully authenticated user: {user_response.user.id}")
-            return user_response
+
+            if settings.AUTH_REMOTE_CHECK:
+                # A cached answer could outlive a revocation, so always ask Supabase
+                claims = self.verify_token(token)
+                self.verify_token_remote(token)
+                return self._user_from_claims(claims)
+
+            cache_key = ClaimsCache.key_for(token)
+            cached_user = self.claims_cache.get(cache_key)
+            if cached_user is not None:
+                return cached_user
+
+            claims = self.verify_token(token)
+
+            user = self._user_from_claims(claims)
+            self.claims_cache.set(cache_key, user, token_exp=claims.get("exp"))
+            return user
         except AuthError:
             raise
         except Exception as e:
@@ -107,6 +140,62 @@ class AuthService:
                 error_code="AUTH_ERROR"
             )
 
+    @staticmethod
+    def _user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": claims["sub"],
+            "email": claims.get("email"),
+            "role": claims.get("role"),
+            "claims": claims,
+        }
+
+    def verify_token(self, token: str) -> Dict[str, Any]:
+        """
+        Verify a Supabase JWT locally and return its claims.
+        """
+        try:
+            claims = jwt.decode(
+                token,
+                settings.SUPABASE_JWT_SECRET,
+                algorithms=[settings.SUPABASE_JWT_ALGORITHM],
+                audience=settings.SUPABASE_JWT_AUDIENCE,
+                options={"require_exp": True, "require_sub": True},
+            )
+        except ExpiredSignatureError:
+            raise AuthError(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                message="Token has expired",
+                error_code="TOKEN_EXPIRED"
+            )
+        except JWTError as e:
+            logger.warning(f"Token verification failed: {str(e)}")
+            raise AuthError(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                message=f"Invalid token: {str(e)}",
+                error_code="INVALID_TOKEN"
+            )
+        return claims
+
+    def verify_token_remote(self, token: str) -> None:
+        """
+        Confirm with Supabase that the token's session is still valid.
+        """
+        supabase_client = get_supabase_client()
+        if not supabase_client:
+            raise AuthError(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                message="Authentication service unavailable",
+                error_code="SERVICE_UNAVAILABLE"
+            )
+
+        user_response = supabase_client.auth.get_user(token)
+        if not user_response or not getattr(user_response, "user", None):
+            raise AuthError(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                message="User not found or token revoked",
+                error_code="USER_NOT_FOUND"
+            )
+
     async def verify_document_access(
         self,
         user: SupabaseUser,
@@ -0,0 +1,224 @@
+"""
+Durable Postgres-backed job queue.
+
+Used when Redis is unavailable so document processing still runs outside the
+web process and survives restarts. Workers claim jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` and hold a lease while running; a job
+whose lease expires (e.g. the worker died) becomes claimable again.
+
+Run a worker with ``python -m app.workers.pg_queue``.
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import ProcessingJob
+from app.workers.tasks import process_document_task
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def enqueue_job(db: Session, document_id: str) -> ProcessingJob:
+    """Add a processing job to the session. The caller commits."""
+    job = ProcessingJob(
+        document_id=document_id,
+        status=JOB_QUEUED,
+        attempts=0,
+        max_attempts=settings.MAX_RETRIES,
+    )
+    db.add(job)
+    logger.info("Queued document %s in durable job table", document_id)
+    return job
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[ProcessingJob]:
+    """Atomically claim the next runnable job, or return None if there is none."""
+    now = func.now()
+    job = (
+        db.query(ProcessingJob)
+        .filter(
+            or_(
+                and_(ProcessingJob.status == JOB_QUEUED, ProcessingJob.available_at <= now),
+                and_(ProcessingJob.status == JOB_RUNNING, ProcessingJob.lease_expires_at < now),
+            )
+        )
+        .order_by(ProcessingJob.available_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+
+    if job.status == JOB_RUNNING:
+        logger.warning("Reclaiming job %s after expired lease held by %s", job.id, job.locked_by)
+
+    job.status = JOB_RUNNING
+    job.attempts += 1
+    job.locked_by = worker_id
+    job.lease_expires_at = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def renew_lease(db: Session, job_id, worker_id: str) -> bool:
+    """Extend the lease of a running job. Returns False if the job was lost."""
+    updated = (
+        db.query(ProcessingJob)
+        .filter(ProcessingJob.id == job_id, ProcessingJob.locked_by == worker_id)
+        .update(
+            {ProcessingJob.lease_expires_at: func.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return updated > 0
+
+
+def _update_if_held(db: Session, job: ProcessingJob, worker_id: str, values) -> bool:
+    """Write a job's outcome only while worker_id still holds its lease."""
+    updated = (
+        db.query(ProcessingJob)
+        .filter(ProcessingJob.id == job.id, ProcessingJob.locked_by == worker_id)
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    if not updated:
+        logger.warning("Dropping result of job %s: its lease passed from %s to another worker", job.id, worker_id)
+    return updated > 0
+
+
+def complete_job(db: Session, job: ProcessingJob, worker_id: str) -> bool:
+    """Mark a job done. Returns False, changing nothing, if the lease was lost."""
+    return _update_if_held(db, job, worker_id, {
+        ProcessingJob.status: JOB_DONE,
+        ProcessingJob.locked_by: None,
+        ProcessingJob.lease_expires_at: None,
+        ProcessingJob.last_error: None,
+    })
+
+
+def fail_job(db: Session, job: ProcessingJob, worker_id: str, error: Exception) -> bool:
+    """
+    Schedule a retry with a linear backoff, or give up after max_attempts.
+
+    Returns False, changing nothing, if the lease was lost: the worker that
+    reclaimed the job owns its outcome.
+    """
+    values = {
+        ProcessingJob.last_error: str(error),
+        ProcessingJob.locked_by: None,
+        ProcessingJob.lease_expires_at: None,
+    }
+    give_up = job.attempts >= job.max_attempts
+    if give_up:
+        values[ProcessingJob.status] = JOB_FAILED
+    else:
+        values[ProcessingJob.status] = JOB_QUEUED
+        values[ProcessingJob.available_at] = func.now() + timedelta(seconds=settings.RETRY_DELAY * job.attempts)
+    if not _update_if_held(db, job, worker_id, values):
+        return False
+
+    if give_up:
+        logger.error("Job %s failed permanently after %d attempts: %s", job.id, job.attempts, error)
+    else:
+        logger.warning("Job %s failed (attempt %d/%d), retrying: %s", job.id, job.attempts, job.max_attempts, error)
+    return True
+
+
+class _LeaseKeeper(threading.Thread):
+    """Renews a job's lease in the background while it runs."""
+
+    def __init__(self, job_id, worker_id: str):
+        super().__init__(daemon=True, name=f"lease-{job_id}")
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.lost = threading.Event()  # another worker reclaimed the job
+
+    def run(self) -> None:
+        interval = max(settings.JOB_LEASE_SECONDS / 3, 1)
+        while not self.stopped.wait(interval):
+            db = SessionLocal()
+            try:
+                if not renew_lease(db, self.job_id, self.worker_id):
+                    logger.warning("Lost lease on job %s", self.job_id)
+                    self.lost.set()
+                    return
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Failed renewing lease on job %s: %s", self.job_id, exc)
+            finally:
+                db.close()
+
+
+def run_next_job(
+    worker_id: str,
+    handler: Callable[[str], None] = process_document_task,
+) -> bool:
+    """Claim and run a single job. Returns False when the queue is empty."""
+    db = SessionLocal()
+    try:
+        job = claim_job(db, worker_id)
+        if job is None:
+            return False
+
+        if job.attempts > job.max_attempts:
+            fail_job(db, job, worker_id, Exception("Lease expired on final attempt"))
+            return True
+
+        keeper = _LeaseKeeper(job.id, worker_id)
+        keeper.start()
+        try:
+            handler(str(job.document_id))
+        except Exception as exc:  # noqa: BLE001
+            keeper.stopped.set()
+            if not keeper.lost.is_set():
+                fail_job(db, job, worker_id, exc)
+        else:
+            keeper.stopped.set()
+            if not keeper.lost.is_set():
+                complete_job(db, job, worker_id)
+        if keeper.lost.is_set():
+            logger.warning("Not recording the outcome of job %s: another worker reclaimed it", job.id)
+        return True
+    finally:
+        db.close()
+
+
+def run_worker(
+    worker_id: Optional[str] = None,
+    poll_interval: float = settings.JOB_POLL_INTERVAL,
+    stop_event: Optional[threading.Event] = None,
+) -> None:
+    """Poll the job table until stop_event is set."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    logger.info("Starting Postgres queue worker %s", worker_id)
+
+    while not stop_event.is_set():
+        try:
+            if run_next_job(worker_id):
+                continue
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Postgres queue worker error: %s", exc)
+        stop_event.wait(poll_interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    run_worker()
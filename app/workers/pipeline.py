@@ -0,0 +1,303 @@
+"""
+Pipelined ingestion engine.
+
+Documents flow through four stages connected by bounded queues so that
+network, CPU and database work overlap instead of running back to back:
+
+1. prefetch - a thread pool downloads the next documents' bytes
+2. parse    - PDF pages are split into chunks in a process pool
+3. embed    - a single loop batches chunk texts across documents
+4. write    - a writer thread commits chunk rows while embedding continues
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import Document as DBDocument
+from app.workers.processor import (
+    DocumentProcessor,
+    announce_chunks,
+    extract_chunks,
+    index_new_chunks,
+    read_document_bytes,
+    save_chunks,
+    store_centroid,
+)
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for a single pipeline stage."""
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    def record(self, count: int, seconds: float) -> None:
+        self.items += count
+        self.busy_seconds += seconds
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        wall = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 4),
+            "wall_seconds": round(wall, 4),
+            "throughput": round(self.items / wall, 2) if wall > 0 else 0.0,
+            "utilization": round(self.busy_seconds / wall, 3) if wall > 0 else 0.0,
+        }
+
+
+@dataclass
+class _ParsedDocument:
+    document_id: str
+    chunks: List[dict] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    embeddings: List[Any] = field(default_factory=list)
+    error: Optional[Exception] = None
+
+
+class IngestionPipeline:
+    """Overlaps download, parsing, embedding and DB writes for a batch of documents."""
+
+    def __init__(
+        self,
+        prefetch_workers: int = settings.PIPELINE_PREFETCH_WORKERS,
+        parse_workers: int = settings.PIPELINE_PARSE_WORKERS,
+        queue_size: int = settings.PIPELINE_QUEUE_SIZE,
+        embed_batch_size: int = settings.MODEL_BATCH_SIZE,
+        processor: Optional[DocumentProcessor] = None,
+    ):
+        self.prefetch_workers = prefetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.processor = processor or DocumentProcessor()
+        self.stats: Dict[str, StageStats] = {}
+
+    def run(self, document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Process documents through all stages.
+
+        Returns:
+            dict: per-stage throughput statistics
+        """
+        self.stats = {
+            name: StageStats(name) for name in ("prefetch", "parse", "embed", "write")
+        }
+        storage_paths = self._load_storage_paths(document_ids)
+
+        parse_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embed_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        write_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._prefetch_stage, args=(storage_paths, parse_queue), name="ingest-prefetch"),
+            threading.Thread(target=self._parse_stage, args=(parse_queue, embed_queue), name="ingest-parse"),
+            threading.Thread(target=self._embed_stage, args=(embed_queue, write_queue), name="ingest-embed"),
+            threading.Thread(target=self._write_stage, args=(write_queue,), name="ingest-write"),
+        ]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+
+        report = {name: stage_stats.to_dict() for name, stage_stats in self.stats.items()}
+        logger.info("Ingestion pipeline finished %d documents: %s", len(storage_paths), report)
+        return report
+
+    def _load_storage_paths(self, document_ids: List[str]) -> List[Tuple[str, str]]:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(DBDocument.id, DBDocument.storage_path, DBDocument.status)
+                .filter(DBDocument.id.in_(document_ids))
+                .all()
+            )
+        finally:
+            db.close()
+
+        # A retried batch skips documents an earlier attempt already finished
+        processed = {str(doc_id) for doc_id, _, doc_status in rows if doc_status == "processed"}
+        found = {str(doc_id): path for doc_id, path, doc_status in rows if doc_status != "processed"}
+
+        for doc_id in document_ids:
+            if str(doc_id) not in found and str(doc_id) not in processed:
+                logger.warning("Document %s not found during processing", doc_id)
+        return [(str(doc_id), found[str(doc_id)]) for doc_id in document_ids if str(doc_id) in found]
+
+    def _prefetch_stage(self, storage_paths: List[Tuple[str, str]], out: queue.Queue) -> None:
+        stats = self.stats["prefetch"]
+
+        def fetch(document_id: str, storage_path: str):
+            start = time.perf_counter()
+            try:
+                return document_id, read_document_bytes(storage_path), None
+            except Exception as exc:  # noqa: BLE001
+                return document_id, None, exc
+            finally:
+                stats.record(1, time.perf_counter() - start)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.prefetch_workers) as pool:
+                # Bound the read-ahead so large batches do not buffer every blob in memory
+                in_flight: deque = deque()
+                for document_id, storage_path in storage_paths:
+                    in_flight.append(pool.submit(fetch, document_id, storage_path))
+                    if len(in_flight) >= self.prefetch_workers * 2:
+                        out.put(in_flight.popleft().result())
+                while in_flight:
+                    out.put(in_flight.popleft().result())
+        finally:
+            stats.finish()
+            out.put(_DONE)
+
+    def _parse_stage(self, inbox: queue.Queue, out: queue.Queue) -> None:
+        stats = self.stats["parse"]
+        in_flight: deque = deque()
+
+        def drain_one() -> None:
+            document_id, future, submitted = in_flight.popleft()
+            try:
+                chunks, metadata = future.result()
+                out.put(_ParsedDocument(document_id, chunks=chunks, metadata=metadata))
+            except Exception as exc:  # noqa: BLE001
+                out.put(_ParsedDocument(document_id, error=exc))
+            stats.record(1, time.perf_counter() - submitted)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+                while True:
+                    item = inbox.get()
+                    if item is _DONE:
+                        break
+                    document_id, pdf_bytes, error = item
+                    if error is not None:
+                        out.put(_ParsedDocument(document_id, error=error))
+                        continue
+                    in_flight.append((document_id, pool.submit(extract_chunks, pdf_bytes), time.perf_counter()))
+                    # Keep at most two parses per worker outstanding
+                    while len(in_flight) >= self.parse_workers * 2:
+                        drain_one()
+                while in_flight:
+                    drain_one()
+        finally:
+            stats.finish()
+            out.put(_DONE)
+
+    def _embed_stage(self, inbox: queue.Queue, out: queue.Queue) -> None:
+        stats = self.stats["embed"]
+        pending: deque = deque()  # documents whose chunks are not fully embedded yet
+        texts: List[str] = []
+        owners: List[_ParsedDocument] = []
+
+        def flush(final: bool = False) -> None:
+            while texts and (final or len(texts) >= self.embed_batch_size):
+                batch_texts = texts[:self.embed_batch_size]
+                batch_owners = owners[:self.embed_batch_size]
+                del texts[:self.embed_batch_size]
+                del owners[:self.embed_batch_size]
+
+                start = time.perf_counter()
+                embeddings = self.processor.embedding_generator.generate_embeddings(
+                    batch_texts, batch_size=self.embed_batch_size
+                )
+                stats.record(len(batch_texts), time.perf_counter() - start)
+                for owner, embedding in zip(batch_owners, embeddings):
+                    owner.embeddings.append(embedding)
+
+            # Hand completed documents to the writer in arrival order
+            while pending and len(pending[0].embeddings) == len(pending[0].chunks):
+                out.put(pending.popleft())
+
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                if item.error is not None:
+                    out.put(item)
+                    continue
+                pending.append(item)
+                for chunk in item.chunks:
+                    texts.append(chunk["text"])
+                    owners.append(item)
+                flush()
+            flush(final=True)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Embedding stage failed: %s", exc)
+            while pending:
+                failed = pending.popleft()
+                failed.error = exc
+                out.put(failed)
+        finally:
+            stats.finish()
+            out.put(_DONE)
+
+    def _write_stage(self, inbox: queue.Queue) -> None:
+        stats = self.stats["write"]
+        db = SessionLocal()
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                try:
+                    self._write_document(db, item)
+                except Exception as exc:  # noqa: BLE001
+                    db.rollback()
+                    logger.exception("Failed writing document %s: %s", item.document_id, exc)
+                    self._mark_write_failed(db, item, exc)
+                stats.record(1, time.perf_counter() - start)
+        finally:
+            stats.finish()
+            db.close()
+
+    def _mark_write_failed(self, db, item: _ParsedDocument, error: Exception) -> None:
+        """Record a write failure on the document so it does not stay in its pre-processing status."""
+        try:
+            document = db.query(DBDocument).filter(DBDocument.id == item.document_id).first()
+            if document:
+                self.processor.mark_failed(document, error)
+                db.commit()
+        except Exception as exc:  # noqa: BLE001
+            db.rollback()
+            logger.exception("Failed marking document %s as failed: %s", item.document_id, exc)
+
+    def _write_document(self, db, item: _ParsedDocument) -> None:
+        document = db.query(DBDocument).filter(DBDocument.id == item.document_id).first()
+        if not document:
+            logger.warning("Document %s disappeared before write", item.document_id)
+            return
+
+        if item.error is not None:
+            self.processor.mark_failed(document, item.error)
+            db.commit()
+            logger.error("Failed processing document %s: %s", item.document_id, item.error)
+            return
+
+        # Chunk indexes restart at 0, so rows left by an earlier attempt are skipped
+        inserted = save_chunks(db, document, item.chunks, item.embeddings)
+        store_centroid(db, document)
+        self.processor.mark_processed(document, item.metadata, len(item.chunks))
+        db.commit()
+        index_new_chunks(document, inserted)
+        announce_chunks(document)
+        logger.info("Document %s processed with %d chunks", item.document_id, len(item.chunks))
@@ -1,16 +1,182 @@
+import logging
 import fitz
-from typing import List
+import uuid
+from typing import List, Optional, Tuple
 import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
+from app.ml.centroids import centroid
 from app.ml.embeddings import EmbeddingGenerator
+from app.ml.ivfpq import ann_indexes
+from app.ml.quantization import codes_to_bytes, quantize_int8
 from app.models.database import Document, DocumentChunk
 from app.core.config import settings
+from app.retrieval.events import ADDED, get_corpus_events
 from app.services.storage import (
     download_supabase_file,
     is_supabase_path,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def read_document_bytes(storage_path: str) -> bytes:
+    """Fetch the raw PDF bytes for a storage path (Supabase or local disk)."""
+    if is_supabase_path(storage_path):
+        pdf_bytes = download_supabase_file(storage_path)
+        if not pdf_bytes:
+            raise Exception("Unable to retrieve document from Supabase storage")
+        return pdf_bytes
+    with open(storage_path, "rb") as f:
+        return f.read()
+
+
+def extract_chunks(
+    pdf_bytes: bytes,
+    start_page: int = 0,
+    end_page: Optional[int] = None,
+) -> tuple[List[dict], dict]:
+    """
+    Split PDF bytes into paragraph chunks, optionally for a page range only.
+
+    Module-level so it can be shipped to a process pool by the ingestion pipeline.
+
+    Returns:
+        tuple: (chunks, metadata)
+    """
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        chunks = []
+        metadata = {
+            "page_count": len(doc),
+            "title": doc.metadata.get("title", ""),
+            "author": doc.metadata.get("author", ""),
+            "creation_date": doc.metadata.get("creationDate", ""),
+            "modification_date": doc.metadata.get("modDate", "")
+        }
+
+        end_page = len(doc) if end_page is None else min(end_page, len(doc))
+        for page_num in range(start_page, end_page):
+            text = doc[page_num].get_text()
+            # Split into semantic chunks (paragraphs)
+            page_chunks = []
+            current_chunk = []
+
+            for line in text.split('\n'):
+                line = line.strip()
+                if not line:  # Empty line indicates paragraph break
+                    if current_chunk:
+                        chunk_text = ' '.join(current_chunk)
+                        if len(chunk_text) >= 50:  # Minimum chunk size
+                            page_chunks.append({
+                                "text": chunk_text,
+                                "page": page_num + 1
+                            })
+                        current_chunk = []
+                else:
+                    current_chunk.append(line)
+
+            # Don't forget the last chunk
+            if current_chunk:
+                chunk_text = ' '.join(current_chunk)
+                if len(chunk_text) >= 50:
+                    page_chunks.append({
+                        "text": chunk_text,
+                        "page": page_num + 1
+                    })
+
+            chunks.extend(page_chunks)
+
+        return chunks, metadata
+
+    except Exception as e:
+        raise Exception(f"Error processing PDF: {str(e)}")
+
+    finally:
+        if 'doc' in locals():
+            doc.close()
+
+
+def save_chunks(
+    db: Session,
+    document: Document,
+    chunks: List[dict],
+    embeddings: List[np.ndarray],
+    start_index: int = 0,
+) -> List[Tuple[uuid.UUID, np.ndarray]]:
+    """
+    Insert chunk rows, skipping any (document_id, chunk_index) already stored.
+
+    Chunk indexes are deterministic, so re-running a page range after a
+    failure or a retry never duplicates rows.
+
+    Returns:
+        list: (chunk id, embedding) for the rows actually inserted
+    """
+    if not chunks:
+        return []
+    codes, scales = quantize_int8(np.vstack(embeddings))
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "document_id": document.id,
+            "user_id": document.user_id,
+            "chunk_index": start_index + idx,
+            "text": chunk["text"],
+            "embedding": embedding.tolist(),
+            "embedding_q": codes_to_bytes(codes[idx]),
+            "embedding_scale": float(scales[idx]),
+            "meta_info": {"page": chunk["page"]},
+        }
+        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+    ]
+    inserted = db.execute(
+        insert(DocumentChunk)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["user_id", "document_id", "chunk_index"])
+        .returning(DocumentChunk.id, DocumentChunk.chunk_index)
+    ).all()
+    return [(chunk_id, embeddings[chunk_index - start_index]) for chunk_id, chunk_index in inserted]
+
+
+def index_new_chunks(document: Document, inserted: List[Tuple[uuid.UUID, np.ndarray]]) -> None:
+    """Append committed chunks to the tenant's IVF-PQ index, if it has one."""
+    if settings.ANN_INDEX_MIN_ROWS <= 0 or not inserted:
+        return
+    try:
+        ann_indexes.add(document.user_id, [chunk_id for chunk_id, _ in inserted], [e for _, e in inserted])
+    except Exception as exc:  # noqa: BLE001
+        # The next index rebuild picks the chunks up; processing must not fail over it
+        logger.warning("Could not add chunks of %s to the ANN index: %s", document.id, exc)
+
+
+def announce_chunks(document: Document, action: str = ADDED) -> None:
+    """Tell resident vector caches that the document's committed chunks changed."""
+    if not settings.CORPUS_EVENTS_ENABLED:
+        return
+    try:
+        get_corpus_events().publish(document.user_id, document.id, action)
+    except Exception as exc:  # noqa: BLE001
+        # Subscribers reconcile versions when they reconnect; processing must not fail over it
+        logger.warning("Could not publish corpus event for %s: %s", document.id, exc)
+
+
+def store_centroid(db: Session, document: Document) -> None:
+    """Set the document's centroid from every chunk embedding stored for it."""
+    embeddings = db.execute(
+        select(DocumentChunk.embedding).where(
+            DocumentChunk.user_id == document.user_id,
+            DocumentChunk.document_id == document.id,
+            DocumentChunk.embedding.is_not(None),
+        )
+    ).scalars().all()
+    vector = centroid(embeddings)
+    document.centroid = None if vector is None else vector.tolist()
+
+
 class DocumentProcessor:
     def __init__(self):
         self.embedding_generator = EmbeddingGenerator(settings.EMBEDDING_MODEL)
@@ -18,108 +184,81 @@ class DocumentProcessor:
     def extract_text(self, pdf_path: str) -> tuple[List[str], dict]:
         """
         Extract text from PDF and split into chunks
-        
+
         Returns:
             tuple: (chunks, metadata)
         """
         try:
-            if is_supabase_path(pdf_path):
-                pdf_bytes = download_supabase_file(pdf_path)
-                if not pdf_bytes:
-                    raise Exception("Unable to retrieve document from Supabase storage")
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            else:
-                doc = fitz.open(pdf_path)
-            chunks = []
-            metadata = {
-                "page_count": len(doc),
-                "title": doc.metadata.get("title", ""),
-                "author": doc.metadata.get("author", ""),
-                "creation_date": doc.metadata.get("creationDate", ""),
-                "modification_date": doc.metadata.get("modDate", "")
-            }
-            
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                # Split into semantic chunks (paragraphs)
-                page_chunks = []
-                current_chunk = []
-                
-                for line in text.split('\n'):
-                    line = line.strip()
-                    if not line:  # Empty line indicates paragraph break
-                        if current_chunk:
-                            chunk_text = ' '.join(current_chunk)
-                            if len(chunk_text) >= 50:  # Minimum chunk size
-                                page_chunks.append({
-                                    "text": chunk_text,
-                                    "page": page_num + 1
-                                })
-                            current_chunk = []
-                    else:
-                        current_chunk.append(line)
-                
-                # Don't forget the last chunk
-                if current_chunk:
-                    chunk_text = ' '.join(current_chunk)
-                    if len(chunk_text) >= 50:
-                        page_chunks.append({
-                            "text": chunk_text,
-                            "page": page_num + 1
-                        })
-                
-                chunks.extend(page_chunks)
-            
-            return chunks, metadata
-            
+            pdf_bytes = read_document_bytes(pdf_path)
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
-            
-        finally:
-            if 'doc' in locals():
-                doc.close()
+        return extract_chunks(pdf_bytes)
 
-    def process_document(self, document: Document) -> List[DocumentChunk]:
-        """Process a document: extract text, create chunks, generate embeddings"""
-        try:
-            # Extract text and metadata
-            chunks, metadata = self.extract_text(document.storage_path)
-            
-            # Update document metadata
-            if document.meta_info is None:
-                document.meta_info = {}
-            document.meta_info.update(metadata)
-            flag_modified(document, "meta_info")
-            document.status = "processing"
-            
-            chunk_texts = [chunk["text"] for chunk in chunks]
-            embeddings = self.embedding_generator.generate_embeddings(chunk_texts)
-            
-            # Create document chunks with embeddings
-            doc_chunks = []
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc_chunk = DocumentChunk(
-                    document_id=document.id,
-                    chunk_index=idx,
-                    text=chunk["text"],
-                    embedding=embedding.tolist(),
-                    meta_info={"page": chunk["page"]}
-                )
-                doc_chunks.append(doc_chunk)
-            
-            # Update document status
-            document.status = "processed"
-            if document.meta_info is None:
-                document.meta_info = {}
-            document.meta_info["chunk_count"] = len(doc_chunks)
-            flag_modified(document, "meta_info")
-            
-            return doc_chunks
-            
-        except Exception as e:
-            document.status = "failed"
-            if document.meta_info is None:
-                document.meta_info = {}
-            document.meta_info["error"] = str(e)
+    def mark_processed(self, document: Document, metadata: dict, chunk_count: int) -> None:
+        """Record extracted metadata and mark the document processed."""
+        if document.meta_info is None:
+            document.meta_info = {}
+        document.meta_info.update(metadata)
+        document.meta_info["chunk_count"] = chunk_count
+        document.meta_info.pop("checkpoint", None)
+        document.meta_info.pop("error", None)
+        document.status = "processed"
+        flag_modified(document, "meta_info")
+
+    def mark_failed(self, document: Document, error: Exception) -> None:
+        """Record a processing failure on the document."""
+        document.status = "failed"
+        if document.meta_info is None:
+            document.meta_info = {}
+        document.meta_info["error"] = str(error)
+        flag_modified(document, "meta_info")
+
+    def process_document(self, db: Session, document: Document) -> int:
+        """
+        Extract, embed and store a document in page-range checkpoints.
+
+        Each range is committed together with the checkpoint that follows it, so
+        a retry resumes from the last committed range instead of page 1.
+
+        Returns:
+            int: total number of chunks stored for the document
+        """
+        pdf_bytes = read_document_bytes(document.storage_path)
+
+        if document.meta_info is None:
+            document.meta_info = {}
+        checkpoint = document.meta_info.get("checkpoint") or {"next_page": 0, "next_chunk_index": 0}
+        next_page = checkpoint["next_page"]
+        next_chunk_index = checkpoint["next_chunk_index"]
+        if next_page:
+            logger.info("Resuming document %s from page %d", document.id, next_page + 1)
+
+        _, metadata = extract_chunks(pdf_bytes, 0, 0)
+        page_count = metadata["page_count"]
+        document.status = "processing"
+        flag_modified(document, "meta_info")
+        db.commit()
+
+        while next_page < page_count:
+            end_page = min(next_page + settings.PROCESSING_CHECKPOINT_PAGES, page_count)
+            chunks, _ = extract_chunks(pdf_bytes, next_page, end_page)
+            embeddings = self.embedding_generator.generate_embeddings([chunk["text"] for chunk in chunks])
+            inserted = save_chunks(db, document, chunks, embeddings, start_index=next_chunk_index)
+
+            next_page = end_page
+            next_chunk_index += len(chunks)
+            document.meta_info["checkpoint"] = {
+                "next_page": next_page,
+                "next_chunk_index": next_chunk_index,
+            }
+            document.meta_info["processed_pages"] = next_page
             flag_modified(document, "meta_info")
-            raise
\ No newline at end of file
+            db.commit()
+            index_new_chunks(document, inserted)
+
+        # From the stored rows, so chunks committed before a resume are included
+        store_centroid(db, document)
+        self.mark_processed(document, metadata, next_chunk_index)
+        db.commit()
+        announce_chunks(document)
+        return next_chunk_index
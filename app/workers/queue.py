@@ -1,12 +1,13 @@
 import logging
-from typing import Optional
+from typing import List, Optional
 
 from redis import Redis
 from redis.exceptions import RedisError
-from rq import Queue
+from rq import Queue, Retry
 
 from app.core.config import settings
-from app.workers.tasks import process_document_task
+from app.workers.scheduler import get_scheduler
+from app.workers.tasks import batch_job_timeout, process_document_batch_task, process_document_task
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,11 @@ def _create_queue() -> Queue:
     )
 
 
+def get_retry_policy() -> Retry:
+    """Retries resume from the last committed checkpoint, so they are cheap."""
+    return Retry(max=settings.MAX_RETRIES, interval=settings.RETRY_DELAY)
+
+
 def get_queue() -> Queue:
     global _queue
     if _queue is None:
@@ -34,11 +40,49 @@ def get_queue() -> Queue:
     return _queue
 
 
-def enqueue_document_processing(document_id: str) -> None:
+def enqueue_document_processing(
+    document_id: str,
+    user_id: Optional[str] = None,
+    page_count: Optional[int] = None,
+) -> None:
+    """Queue a document, through the fair-share scheduler when it is enabled."""
     try:
+        if settings.ENABLE_FAIR_SCHEDULING and user_id:
+            lane = get_scheduler().submit(user_id, [document_id], page_count)
+            logger.info("Scheduled document %s for user %s in %s lane", document_id, user_id, lane)
+            return
         queue = get_queue()
-        queue.enqueue(process_document_task, document_id, job_timeout=settings.TASK_TIMEOUT)
+        queue.enqueue(
+            process_document_task,
+            document_id,
+            job_timeout=settings.TASK_TIMEOUT,
+            retry=get_retry_policy(),
+        )
         logger.info("Queued document %s for processing", document_id)
     except RedisError as exc:  # noqa: BLE001
-        logger.warning("Redis queue unavailable, falling back to background task: %s", exc)
+        logger.warning("Redis queue unavailable, falling back to Postgres job table: %s", exc)
+        raise QueueUnavailableError("Redis queue unavailable") from exc
+
+
+def enqueue_document_batch_processing(
+    document_ids: List[str],
+    user_id: Optional[str] = None,
+    page_count: Optional[int] = None,
+) -> None:
+    """Queue several documents as one coalesced pipeline job."""
+    try:
+        if settings.ENABLE_FAIR_SCHEDULING and user_id:
+            lane = get_scheduler().submit(user_id, document_ids, page_count)
+            logger.info("Scheduled batch of %d documents for user %s in %s lane", len(document_ids), user_id, lane)
+            return
+        queue = get_queue()
+        queue.enqueue(
+            process_document_batch_task,
+            document_ids,
+            job_timeout=batch_job_timeout(len(document_ids)),
+            retry=get_retry_policy(),
+        )
+        logger.info("Queued batch of %d documents for processing", len(document_ids))
+    except RedisError as exc:  # noqa: BLE001
+        logger.warning("Redis queue unavailable, falling back to Postgres job table: %s", exc)
         raise QueueUnavailableError("Redis queue unavailable") from exc
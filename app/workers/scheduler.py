@@ -0,0 +1,276 @@
+"""
+Per-tenant fair-share scheduling for document processing.
+
+Uploads are not pushed straight onto the RQ queue. They are parked in
+per-user lanes, and a dispatcher feeds the RQ queue a few jobs at a time,
+picking tenants with weighted round-robin. Small documents (by page count)
+go to a fast lane that is served first, so a single-page upload is not
+stuck behind another user's bulk import.
+
+Enable it with ``ENABLE_FAIR_SCHEDULING`` and run the dispatcher with
+``python -m app.workers.scheduler``; without a dispatcher, parked uploads
+are never processed.
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from redis import Redis
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.workers.tasks import batch_job_timeout, process_document_batch_task, process_document_task
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+NORMAL_LANE = "normal"
+LANES = (FAST_LANE, NORMAL_LANE)
+
+KEY_PREFIX = "documind:sched"
+
+
+class InMemorySchedulerStore:
+    """Process-local store, used for tests and single-process deployments."""
+
+    def __init__(self):
+        self._lanes: Dict[str, Dict[str, deque]] = {lane: defaultdict(deque) for lane in LANES}
+        self._weights: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def push(self, lane: str, tenant: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lanes[lane][tenant].append(payload)
+
+    def push_front(self, lane: str, tenant: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lanes[lane][tenant].appendleft(payload)
+
+    def pop(self, lane: str, tenant: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            items = self._lanes[lane].get(tenant)
+            if not items:
+                return None
+            payload = items.popleft()
+            if not items:
+                del self._lanes[lane][tenant]
+            return payload
+
+    def tenants(self, lane: str) -> List[str]:
+        with self._lock:
+            return [tenant for tenant, items in self._lanes[lane].items() if items]
+
+    def depth(self, lane: str, tenant: str) -> int:
+        with self._lock:
+            return len(self._lanes[lane].get(tenant, ()))
+
+    def get_weight(self, tenant: str) -> int:
+        return self._weights.get(tenant, 1)
+
+    def set_weight(self, tenant: str, weight: int) -> None:
+        self._weights[tenant] = weight
+
+
+class RedisSchedulerStore:
+    """Redis-backed store shared by every web process and dispatcher."""
+
+    def __init__(self, connection: Redis):
+        self.redis = connection
+
+    def _items_key(self, lane: str, tenant: str) -> str:
+        return f"{KEY_PREFIX}:{lane}:{tenant}"
+
+    def _tenants_key(self, lane: str) -> str:
+        return f"{KEY_PREFIX}:{lane}:tenants"
+
+    def push(self, lane: str, tenant: str, payload: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.rpush(self._items_key(lane, tenant), json.dumps(payload))
+        pipe.sadd(self._tenants_key(lane), tenant)
+        pipe.execute()
+
+    def push_front(self, lane: str, tenant: str, payload: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(self._items_key(lane, tenant), json.dumps(payload))
+        pipe.sadd(self._tenants_key(lane), tenant)
+        pipe.execute()
+
+    def pop(self, lane: str, tenant: str) -> Optional[Dict[str, Any]]:
+        items_key = self._items_key(lane, tenant)
+        raw = self.redis.lpop(items_key)
+        self._prune(lane, tenant)
+        return json.loads(raw) if raw else None
+
+    def _prune(self, lane: str, tenant: str) -> None:
+        # Drop the tenant from the active set only if no push raced in
+        items_key = self._items_key(lane, tenant)
+        with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(items_key)
+                if pipe.llen(items_key) == 0:
+                    pipe.multi()
+                    pipe.srem(self._tenants_key(lane), tenant)
+                    pipe.execute()
+            except WatchError:
+                pass
+
+    def tenants(self, lane: str) -> List[str]:
+        return [member.decode() for member in self.redis.smembers(self._tenants_key(lane))]
+
+    def depth(self, lane: str, tenant: str) -> int:
+        return self.redis.llen(self._items_key(lane, tenant))
+
+    def get_weight(self, tenant: str) -> int:
+        weight = self.redis.hget(f"{KEY_PREFIX}:weights", tenant)
+        return int(weight) if weight else 1
+
+    def set_weight(self, tenant: str, weight: int) -> None:
+        self.redis.hset(f"{KEY_PREFIX}:weights", tenant, weight)
+
+
+class FairShareScheduler:
+    """Weighted round-robin across tenants, with a fast lane for small documents."""
+
+    def __init__(
+        self,
+        store,
+        fast_lane_max_pages: int = settings.SCHEDULER_FAST_LANE_MAX_PAGES,
+        fast_lane_burst: int = settings.SCHEDULER_FAST_LANE_BURST,
+    ):
+        self.store = store
+        self.fast_lane_max_pages = fast_lane_max_pages
+        self.fast_lane_burst = fast_lane_burst
+        # Round-robin position per lane: (current tenant, credit left in its turn)
+        self._cursor: Dict[str, Optional[str]] = {lane: None for lane in LANES}
+        self._credit: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._fast_streak = 0
+
+    def lane_for(self, page_count: Optional[int]) -> str:
+        if page_count is not None and page_count <= self.fast_lane_max_pages:
+            return FAST_LANE
+        return NORMAL_LANE
+
+    def submit(self, user_id: str, document_ids: List[str], page_count: Optional[int] = None) -> str:
+        """Park a job in the tenant's lane. Returns the lane used."""
+        lane = self.lane_for(page_count)
+        self.store.push(lane, str(user_id), {
+            "user_id": str(user_id),
+            "document_ids": [str(document_id) for document_id in document_ids],
+            "page_count": page_count,
+        })
+        return lane
+
+    def requeue(self, payload: Dict[str, Any]) -> None:
+        """Put a job taken by next() back at the head of its lane, e.g. after a failed enqueue."""
+        self.store.push_front(self.lane_for(payload.get("page_count")), payload["user_id"], payload)
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        """Pick the next job to dispatch, or None if every lane is empty."""
+        # Serve the fast lane first, but yield to the normal lane after a burst
+        lanes = list(LANES)
+        if self._fast_streak >= self.fast_lane_burst:
+            lanes.reverse()
+
+        for lane in lanes:
+            payload = self._next_in_lane(lane)
+            if payload is not None:
+                self._fast_streak = self._fast_streak + 1 if lane == FAST_LANE else 0
+                return payload
+        self._fast_streak = 0
+        return None
+
+    def _next_in_lane(self, lane: str) -> Optional[Dict[str, Any]]:
+        tenants = sorted(self.store.tenants(lane))
+        if not tenants:
+            self._cursor[lane] = None
+            return None
+
+        current = self._cursor[lane]
+        if current in tenants and self._credit[lane] > 0:
+            order = [current] + [t for t in tenants if t != current]
+        else:
+            # Advance to the tenant after the current one, wrapping around
+            start = 0
+            if current is not None:
+                start = next((i for i, t in enumerate(tenants) if t > current), 0)
+            order = tenants[start:] + tenants[:start]
+            self._credit[lane] = 0
+
+        for tenant in order:
+            payload = self.store.pop(lane, tenant)
+            if payload is None:
+                continue
+            if tenant != current or self._credit[lane] <= 0:
+                self._credit[lane] = max(self.store.get_weight(tenant), 1)
+            self._cursor[lane] = tenant
+            self._credit[lane] -= 1
+            return payload
+        return None
+
+    def depths(self) -> Dict[str, Dict[str, int]]:
+        """Queue depth per tenant and lane, for monitoring."""
+        depths: Dict[str, Dict[str, int]] = defaultdict(lambda: {lane: 0 for lane in LANES})
+        for lane in LANES:
+            for tenant in self.store.tenants(lane):
+                depths[tenant][lane] = self.store.depth(lane, tenant)
+        return dict(depths)
+
+
+_scheduler: Optional[FairShareScheduler] = None
+
+
+def get_scheduler() -> FairShareScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairShareScheduler(RedisSchedulerStore(Redis.from_url(settings.REDIS_URL)))
+    return _scheduler
+
+
+def dispatch_pending(scheduler: FairShareScheduler, queue, retry=None) -> int:
+    """Top the RQ queue up to SCHEDULER_DISPATCH_DEPTH jobs. Returns jobs dispatched."""
+    dispatched = 0
+    while queue.count < settings.SCHEDULER_DISPATCH_DEPTH:
+        payload = scheduler.next()
+        if payload is None:
+            break
+        document_ids = payload["document_ids"]
+        try:
+            if len(document_ids) == 1:
+                queue.enqueue(process_document_task, document_ids[0], job_timeout=settings.TASK_TIMEOUT, retry=retry)
+            else:
+                queue.enqueue(
+                    process_document_batch_task, document_ids, job_timeout=batch_job_timeout(len(document_ids)), retry=retry
+                )
+        except Exception:
+            # The payload is already off its lane; put it back so the documents are not lost
+            scheduler.requeue(payload)
+            raise
+        logger.info("Dispatched %d document(s) for user %s", len(document_ids), payload["user_id"])
+        dispatched += 1
+    return dispatched
+
+
+def run_dispatcher(stop_event: Optional[threading.Event] = None) -> None:
+    """Feed the RQ queue from the tenant lanes until stop_event is set."""
+    from app.workers.queue import get_queue, get_retry_policy
+
+    stop_event = stop_event or threading.Event()
+    scheduler = get_scheduler()
+    queue = get_queue()
+    logger.info("Starting fair-share dispatcher")
+
+    while not stop_event.is_set():
+        try:
+            if dispatch_pending(scheduler, queue, retry=get_retry_policy()):
+                continue
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Dispatcher error: %s", exc)
+        stop_event.wait(settings.SCHEDULER_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    run_dispatcher()
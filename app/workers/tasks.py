@@ -1,10 +1,12 @@
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.models.database import Document as DBDocument
+from app.workers.pipeline import IngestionPipeline
 from app.workers.processor import DocumentProcessor
 
 logger = logging.getLogger(__name__)
@@ -12,9 +14,11 @@ logger = logging.getLogger(__name__)
 def process_document_task(document_id: str) -> None:
     """Entry point used by background workers to process uploaded documents."""
     db: Optional[Session] = None
+    document: Optional[DBDocument] = None
+    processor = DocumentProcessor()
     try:
         db = SessionLocal()
-        document: Optional[DBDocument] = (
+        document = (
             db.query(DBDocument).filter(DBDocument.id == document_id).first()
         )
 
@@ -22,19 +26,29 @@ def process_document_task(document_id: str) -> None:
             logger.warning("Document %s not found during processing", document_id)
             return
 
-        processor = DocumentProcessor()
-        chunks = processor.process_document(document)
-
-        for chunk in chunks:
-            db.add(chunk)
-
-        db.commit()
-        logger.info("Document %s processed with %d chunks", document_id, len(chunks))
+        chunk_count = processor.process_document(db, document)
+        logger.info("Document %s processed with %d chunks", document_id, chunk_count)
     except Exception as exc:  # noqa: BLE001
         if db is not None:
             db.rollback()
+            # Committed checkpoints survive; the retry resumes from them
+            if document is not None:
+                processor.mark_failed(document, exc)
+                db.commit()
         logger.exception("Failed processing document %s: %s", document_id, exc)
         raise
     finally:
         if db is not None:
             db.close()
+
+
+def batch_job_timeout(document_count: int) -> int:
+    """RQ timeout for a coalesced batch; the pipeline's time grows with the batch size."""
+    return settings.TASK_TIMEOUT + settings.BATCH_TASK_TIMEOUT_PER_DOCUMENT * document_count
+
+
+def process_document_batch_task(document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Process several documents through the pipelined ingestion engine."""
+    stats = IngestionPipeline().run(document_ids)
+    logger.info("Processed batch of %d documents", len(document_ids))
+    return stats
@@ -0,0 +1,372 @@
+"""
+Vector index maintenance.
+
+Two jobs keep the pgvector indexes on ``doc_chunks`` useful as data grows:
+
+* Per-tenant partial indexes. The global IVFFlat index cannot be restricted
+  to one tenant: pgvector scans lists holding every tenant's vectors and
+  drops the other tenants' rows afterwards, so a small tenant can get few or
+  no neighbours back. Tenants with at least ``TENANT_VECTOR_INDEX_MIN_ROWS``
+  chunks get their own partial index (``WHERE user_id = '<id>'``), which the
+  planner picks for queries filtering on ``doc_chunks.user_id``.
+* IVFFlat re-tuning. Centroids are fixed when an index is built, often on an
+  empty table, and ``lists`` is fixed too. Each index whose ``lists`` has
+  drifted from the recommendation for its current row count is rebuilt with
+  ``REINDEX INDEX CONCURRENTLY``, which builds a replacement and swaps it in
+  without blocking reads or writes. On the partitioned table this runs one
+  partition at a time.
+* In-process IVF-PQ indexes (``app.ml.ivfpq``). With ``ANN_INDEX_MIN_ROWS``
+  set, tenants at or above it get an index file trained on their stored
+  embeddings. It is retrained once it has grown by
+  ``VECTOR_INDEX_RETUNE_FACTOR``, and dropped below half the threshold.
+
+Run both once with ``python -m app.workers.vector_indexes``, or on a schedule
+with ``--loop`` (every ``VECTOR_INDEX_MAINTENANCE_INTERVAL`` seconds).
+"""
+
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.database import engine
+from app.ml.ivfpq import IVFPQIndex, ann_indexes
+from app.models.database import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+TENANT_INDEX_PREFIX = "ix_doc_chunks_embedding_u_"
+
+# Rows this much older than a build's scan may still have been invisible to
+# it (committed after the scan began), so they are re-checked before saving
+ANN_CATCH_UP_WINDOW = timedelta(minutes=5)
+ANN_BUILD_BATCH_SIZE = 10000
+
+
+def tenant_index_name(user_id) -> str:
+    return f"{TENANT_INDEX_PREFIX}{uuid.UUID(str(user_id)).hex}"
+
+
+def recommended_lists(rows: int) -> int:
+    """IVFFlat list count suggested by pgvector: rows/1000 up to 1M rows, sqrt(rows) above."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def tenant_chunk_counts(conn: Connection, min_rows: int = 0) -> Dict[str, int]:
+    """Chunk count per tenant, for tenants with at least min_rows chunks."""
+    rows = conn.execute(
+        text(
+            "SELECT user_id, count(*) FROM doc_chunks "
+            "GROUP BY user_id HAVING count(*) >= :min_rows"
+        ),
+        {"min_rows": min_rows},
+    )
+    return {str(user_id): count for user_id, count in rows}
+
+
+def existing_tenant_indexes(conn: Connection) -> List[str]:
+    rows = conn.execute(
+        text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE tablename LIKE 'doc_chunks%' AND indexname LIKE :prefix"
+        ),
+        {"prefix": f"{TENANT_INDEX_PREFIX}%"},
+    )
+    return [name for (name,) in rows]
+
+
+def tenant_partition(conn: Connection, user_id) -> str:
+    """Name of the doc_chunks hash partition holding a tenant's rows."""
+    return conn.execute(
+        text("SELECT tableoid::regclass::text FROM doc_chunks WHERE user_id = :user_id LIMIT 1"),
+        {"user_id": str(user_id)},
+    ).scalar_one()
+
+
+def create_tenant_index(conn: Connection, user_id, rows: int) -> str:
+    """Build a partial IVFFlat index over one tenant's chunks without blocking writes."""
+    name = tenant_index_name(user_id)
+    # CONCURRENTLY is not supported on the partitioned parent, so index the
+    # tenant's partition directly. user_id is round-tripped through uuid.UUID
+    # above, so it is safe to inline.
+    conn.execute(text(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {tenant_partition(conn, user_id)} "
+        f"USING ivfflat (embedding vector_ip_ops) WITH (lists = {recommended_lists(rows)}) "
+        f"WHERE user_id = '{uuid.UUID(str(user_id))}'"
+    ))
+    return name
+
+
+def drop_tenant_index(conn: Connection, name: str) -> None:
+    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+
+def sync_tenant_indexes(min_rows: Optional[int] = None, dry_run: bool = False) -> Dict[str, List[str]]:
+    """
+    Create partial indexes for large tenants and drop those no longer needed.
+
+    A tenant's index is only dropped once it falls below half the threshold,
+    so tenants hovering around it do not flap.
+
+    Returns:
+        dict: index names created and dropped
+    """
+    min_rows = settings.TENANT_VECTOR_INDEX_MIN_ROWS if min_rows is None else min_rows
+    created: List[str] = []
+    dropped: List[str] = []
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        counts = tenant_chunk_counts(conn, min_rows // 2)
+        existing = set(existing_tenant_indexes(conn))
+        keep = {tenant_index_name(user_id) for user_id in counts}
+
+        for user_id, rows in counts.items():
+            name = tenant_index_name(user_id)
+            if rows >= min_rows and name not in existing:
+                logger.info("Creating %s for %d chunks", name, rows)
+                if not dry_run:
+                    create_tenant_index(conn, user_id, rows)
+                created.append(name)
+
+        for name in sorted(existing - keep):
+            logger.info("Dropping %s", name)
+            if not dry_run:
+                drop_tenant_index(conn, name)
+            dropped.append(name)
+
+    return {"created": created, "dropped": dropped}
+
+
+def vector_indexes(conn: Connection) -> List[Dict[str, Any]]:
+    """
+    Every IVFFlat/HNSW index on doc_chunks or its partitions.
+
+    Partitioned parents are skipped: their per-partition children are listed
+    instead, since those are the indexes that hold data and can be rebuilt.
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname, t.relname, am.amname, c.reloptions, "
+        "pg_get_expr(i.indpred, i.indrelid), pg_relation_size(i.indexrelid) "
+        "FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_class t ON t.oid = i.indrelid "
+        "JOIN pg_am am ON am.oid = c.relam "
+        "WHERE t.relkind = 'r' AND t.relname ~ '^doc_chunks(_p[0-9]+)?$' "
+        "AND am.amname IN ('ivfflat', 'hnsw') "
+        "ORDER BY t.relname, c.relname"
+    ))
+    indexes = []
+    for name, table, method, reloptions, predicate, size in rows:
+        options = dict(option.split("=", 1) for option in reloptions or [])
+        indexes.append({
+            "name": name,
+            "table": table,
+            "method": method,
+            "lists": int(options["lists"]) if "lists" in options else None,
+            "predicate": predicate,
+            "size_bytes": size,
+        })
+    return indexes
+
+
+def indexed_rows(conn: Connection, index: Dict[str, Any]) -> int:
+    """Rows an index covers: its table's embedded rows, narrowed by any partial predicate."""
+    where = "embedding IS NOT NULL"
+    if index["predicate"]:
+        where += f" AND ({index['predicate']})"
+    return conn.execute(text(f'SELECT count(*) FROM "{index["table"]}" WHERE {where}')).scalar_one()
+
+
+def needs_retune(current_lists: Optional[int], rows: int, factor: float) -> bool:
+    """True when current_lists is more than factor away from the recommendation."""
+    # Lists track the row count, so with factor 2 an index is retrained
+    # roughly each time its data doubles
+    if current_lists is None:
+        return False
+    target = recommended_lists(rows)
+    return current_lists * factor < target or current_lists > target * factor
+
+
+def rebuild_index(conn: Connection, name: str, lists: int) -> None:
+    """Rebuild an IVFFlat index with a new list count, swapping it in concurrently."""
+    conn.execute(text(f'ALTER INDEX "{name}" SET (lists = {int(lists)})'))
+    conn.execute(text(f'REINDEX INDEX CONCURRENTLY "{name}"'))
+
+
+def retune_indexes(factor: Optional[float] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Rebuild IVFFlat indexes whose lists no longer suit their row count.
+
+    HNSW indexes need no retraining as rows arrive and are only reported.
+
+    Returns:
+        list: one entry per index with rows, lists before/after, size and build time
+    """
+    factor = settings.VECTOR_INDEX_RETUNE_FACTOR if factor is None else factor
+    report = []
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in vector_indexes(conn):
+            rows = indexed_rows(conn, index)
+            entry = {
+                "index": index["name"],
+                "table": index["table"],
+                "method": index["method"],
+                "rows": rows,
+                "lists": index["lists"],
+                "size_bytes": index["size_bytes"],
+                "action": "ok",
+            }
+            if index["method"] == "ivfflat" and needs_retune(index["lists"], rows, factor):
+                lists = recommended_lists(rows)
+                entry.update(action="rebuild", lists_before=index["lists"], lists=lists)
+                if not dry_run:
+                    start = time.perf_counter()
+                    rebuild_index(conn, index["name"], lists)
+                    entry["build_seconds"] = round(time.perf_counter() - start, 3)
+                    entry["size_bytes"] = conn.execute(
+                        text("SELECT pg_relation_size(CAST(:name AS regclass))"), {"name": index["name"]}
+                    ).scalar_one()
+                logger.info("Rebuilt %s: %s", index["name"], entry)
+            report.append(entry)
+
+    return report
+
+
+def ann_lists(rows: int, sample: int) -> int:
+    """Coarse lists for an IVF-PQ index: about 4*sqrt(rows), with 39+ training vectors each."""
+    return max(1, min(int(4 * math.sqrt(rows)), sample // 39))
+
+
+def _add_tenant_rows(conn: Connection, index: IVFPQIndex, user_id, *criteria) -> int:
+    result = conn.execution_options(yield_per=ANN_BUILD_BATCH_SIZE).execute(
+        select(DocumentChunk.id, DocumentChunk.embedding)
+        .where(DocumentChunk.user_id == user_id, DocumentChunk.embedding.is_not(None), *criteria)
+    )
+    added = 0
+    for rows in result.partitions():
+        ids = [chunk_id for chunk_id, _ in rows]
+        vectors = np.vstack([np.asarray(embedding, dtype=np.float32) for _, embedding in rows])
+        if criteria:
+            fresh = ~index.contains(ids)
+            ids, vectors = [chunk_id for chunk_id, keep in zip(ids, fresh) if keep], vectors[fresh]
+        index.add(ids, vectors)
+        added += len(ids)
+    return added
+
+
+def build_ann_index(user_id, rows: int) -> IVFPQIndex:
+    """Train an IVF-PQ index on a sample of the tenant's embeddings, fill it and save it."""
+    # Server-side cursors need a transaction, so not the AUTOCOMMIT connection
+    with engine.connect() as conn:
+        sample = conn.execute(
+            select(DocumentChunk.embedding)
+            .where(DocumentChunk.user_id == user_id, DocumentChunk.embedding.is_not(None))
+            .order_by(func.random())
+            .limit(settings.ANN_TRAIN_SAMPLE)
+        ).scalars().all()
+        sample = np.vstack([np.asarray(embedding, dtype=np.float32) for embedding in sample])
+        index = IVFPQIndex.train(sample, ann_lists(rows, len(sample)), settings.ANN_PQ_SUBQUANTIZERS)
+        index.trained_rows = rows
+
+        scan_started = conn.execute(select(func.now())).scalar_one()
+        _add_tenant_rows(conn, index, user_id)
+
+    # Workers append to the file under the same lock, so after this the index
+    # holds every row either the scan or a worker saw
+    with ann_indexes.lock(user_id), engine.connect() as conn:
+        caught_up = _add_tenant_rows(
+            conn, index, user_id, DocumentChunk.created_at >= scan_started - ANN_CATCH_UP_WINDOW
+        )
+        index.save(ann_indexes.path(user_id))
+    logger.info("Built ANN index for %s: %d vectors, %d lists (%d caught up)", user_id, len(index), index.nlist, caught_up)
+    return index
+
+
+def sync_ann_indexes(min_rows: Optional[int] = None, dry_run: bool = False) -> Dict[str, List[str]]:
+    """
+    Build IVF-PQ indexes for large tenants, retrain grown ones and drop unneeded ones.
+
+    Returns:
+        dict: tenant ids built (or rebuilt) and dropped
+    """
+    min_rows = settings.ANN_INDEX_MIN_ROWS if min_rows is None else min_rows
+    built: List[str] = []
+    dropped: List[str] = []
+    if min_rows <= 0:
+        return {"built": built, "dropped": dropped}
+
+    with engine.connect() as conn:
+        counts = tenant_chunk_counts(conn, min_rows // 2)
+
+    for user_id, rows in counts.items():
+        index = ann_indexes.get(user_id)
+        stale = index is not None and rows > index.trained_rows * settings.VECTOR_INDEX_RETUNE_FACTOR
+        if rows >= min_rows and (index is None or stale):
+            logger.info("Building ANN index for %s (%d chunks)", user_id, rows)
+            if not dry_run:
+                start = time.perf_counter()
+                build_ann_index(user_id, rows)
+                logger.info("ANN index for %s built in %.1fs", user_id, time.perf_counter() - start)
+            built.append(user_id)
+
+    for user_id in sorted(set(ann_indexes.tenants()) - set(counts)):
+        logger.info("Dropping ANN index for %s", user_id)
+        if not dry_run:
+            ann_indexes.remove(user_id)
+        dropped.append(user_id)
+
+    return {"built": built, "dropped": dropped}
+
+
+def run_maintenance(dry_run: bool = False, min_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Sync tenant indexes, then re-tune every vector index."""
+    return {
+        "tenant_indexes": sync_tenant_indexes(min_rows=min_rows, dry_run=dry_run),
+        "indexes": retune_indexes(dry_run=dry_run),
+        "ann_indexes": sync_ann_indexes(dry_run=dry_run),
+    }
+
+
+def run_maintenance_loop(
+    interval: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None,
+    min_rows: Optional[int] = None,
+) -> None:
+    """Run maintenance every interval seconds until stop_event is set."""
+    interval = settings.VECTOR_INDEX_MAINTENANCE_INTERVAL if interval is None else interval
+    stop_event = stop_event or threading.Event()
+    logger.info("Starting vector index maintenance every %ss", interval)
+
+    while not stop_event.is_set():
+        try:
+            logger.info("Vector index maintenance: %s", run_maintenance(min_rows=min_rows))
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Vector index maintenance failed: %s", exc)
+        stop_event.wait(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL, format=settings.LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Maintain pgvector indexes on doc_chunks")
+    parser.add_argument("--min-rows", type=int, default=None, help="chunk count that earns a tenant its own index")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without applying them")
+    parser.add_argument("--loop", action="store_true", help="repeat every VECTOR_INDEX_MAINTENANCE_INTERVAL seconds")
+    args = parser.parse_args()
+    if args.loop:
+        run_maintenance_loop(min_rows=args.min_rows)
+    else:
+        print(json.dumps(run_maintenance(dry_run=args.dry_run, min_rows=args.min_rows), indent=2))
@@ -15,20 +15,61 @@ CREATE TABLE IF NOT EXISTS documents (
     storage_path VARCHAR,
     status VARCHAR DEFAULT 'uploaded',
     meta_info JSON,
+    centroid VECTOR(384),  -- normalised mean of the chunk embeddings
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS doc_chunks (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     document_id UUID NOT NULL REFERENCES documents(id),
+    user_id UUID NOT NULL REFERENCES users(id),
     chunk_index INTEGER,
     text VARCHAR,
     embedding VECTOR(384),
+    embedding_q BYTEA,  -- int8 codes, embedding ~= codes * embedding_scale
+    embedding_scale FLOAT,
     meta_info JSON,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, user_id),
+    CONSTRAINT uq_doc_chunks_document_chunk UNIQUE (user_id, document_id, chunk_index)
+) PARTITION BY HASH (user_id);
+
+-- Postgres fallback for the document processing queue
+CREATE TABLE IF NOT EXISTS processing_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE
 );
 
--- Create vector index
+-- 16 hash partitions by tenant (keep in sync with DOC_CHUNKS_PARTITIONS)
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS doc_chunks_p%s PARTITION OF doc_chunks FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            i, i
+        );
+    END LOOP;
+END $$;
+
+-- Keyset pagination of a user's documents
+CREATE INDEX IF NOT EXISTS ix_documents_user_created ON documents(user_id, created_at, id);
+
+-- Claiming the next processing job
+CREATE INDEX IF NOT EXISTS ix_processing_jobs_claim ON processing_jobs(status, available_at);
+
+-- Tenant-scoped chunk lookups
+CREATE INDEX IF NOT EXISTS ix_doc_chunks_user_document ON doc_chunks(user_id, document_id);
+
+-- Create vector index (embeddings are unit length, so inner product ranks like cosine)
 CREATE INDEX IF NOT EXISTS ix_doc_chunks_embedding 
-ON doc_chunks USING ivfflat (embedding vector_cosine_ops) 
+ON doc_chunks USING ivfflat (embedding vector_ip_ops) 
 WITH (lists = 100);
@@ -133,8 +133,16 @@ function App() {
 
   const loadDocuments = async () => {
     try {
-      const response = await apiClient.get('/api/v1/documents');
-      setDocuments(response.data);
+      const loaded: Document[] = [];
+      let cursor: string | undefined;
+      do {
+        const response = await apiClient.get('/api/v1/documents', {
+          params: { limit: 200, cursor, include_total: false },
+        });
+        loaded.push(...response.data.items);
+        cursor = response.data.next_cursor ?? undefined;
+      } while (cursor);
+      setDocuments(loaded);
     } catch (error) {
       console.error('Failed to load documents:', error);
     }
@@ -0,0 +1,38 @@
+"""processing jobs
+
+Revision ID: 002_processing_jobs
+Revises: 001_initial_schema
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = '002_processing_jobs'
+down_revision = '001_initial_schema'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'processing_jobs',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True, server_default=sa.text('gen_random_uuid()')),
+        sa.Column('document_id', UUID(as_uuid=True), sa.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('available_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('locked_by', sa.String()),
+        sa.Column('lease_expires_at', sa.TIMESTAMP(timezone=True)),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True))
+    )
+
+    op.create_index('ix_processing_jobs_claim', 'processing_jobs', ['status', 'available_at'])
+
+def downgrade() -> None:
+    op.drop_index('ix_processing_jobs_claim', table_name='processing_jobs')
+    op.drop_table('processing_jobs')
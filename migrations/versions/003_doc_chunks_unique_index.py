@@ -0,0 +1,28 @@
+"""unique chunk index per document
+
+Revision ID: 003_doc_chunks_unique_index
+Revises: 002_processing_jobs
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003_doc_chunks_unique_index'
+down_revision = '002_processing_jobs'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Drop duplicates left by earlier non-idempotent retries, keeping the oldest row
+    op.execute(
+        'DELETE FROM doc_chunks a USING doc_chunks b '
+        'WHERE a.document_id = b.document_id AND a.chunk_index = b.chunk_index '
+        'AND (a.created_at, a.id) > (b.created_at, b.id);'
+    )
+    op.create_unique_constraint(
+        'uq_doc_chunks_document_chunk', 'doc_chunks', ['document_id', 'chunk_index']
+    )
+
+def downgrade() -> None:
+    op.drop_constraint('uq_doc_chunks_document_chunk', 'doc_chunks', type_='unique')
@@ -0,0 +1,35 @@
+"""denormalize user_id onto doc_chunks
+
+Revision ID: 004_doc_chunks_user_id
+Revises: 003_doc_chunks_unique_index
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = '004_doc_chunks_user_id'
+down_revision = '003_doc_chunks_unique_index'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        'doc_chunks',
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    )
+
+    # Backfill from the owning document, then enforce the column
+    op.execute(
+        'UPDATE doc_chunks SET user_id = documents.user_id '
+        'FROM documents WHERE documents.id = doc_chunks.document_id;'
+    )
+    op.alter_column('doc_chunks', 'user_id', nullable=False)
+
+    op.create_index('ix_doc_chunks_user_document', 'doc_chunks', ['user_id', 'document_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_doc_chunks_user_document', table_name='doc_chunks')
+    op.drop_column('doc_chunks', 'user_id')
@@ -0,0 +1,67 @@
+"""hash-partition doc_chunks by user_id
+
+Revision ID: 005_partition_doc_chunks
+Revises: 004_doc_chunks_user_id
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = '005_partition_doc_chunks'
+down_revision = '004_doc_chunks_user_id'
+branch_labels = None
+depends_on = None
+
+# Fixed here rather than read from settings, so the schema does not depend on
+# the environment the migration happens to run in. Override deliberately with
+# ``alembic -x doc_chunks_partitions=N upgrade head``.
+PARTITIONS = 16
+
+def _create_constraints_and_indexes(unique_columns) -> None:
+    op.create_unique_constraint('uq_doc_chunks_document_chunk', 'doc_chunks', unique_columns)
+    op.create_foreign_key(
+        'doc_chunks_document_id_fkey', 'doc_chunks', 'documents', ['document_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_foreign_key(
+        'doc_chunks_user_id_fkey', 'doc_chunks', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index('ix_doc_chunks_document_id', 'doc_chunks', ['document_id'])
+    op.create_index('ix_doc_chunks_user_document', 'doc_chunks', ['user_id', 'document_id'])
+    # On the partitioned table this builds one IVFFlat index per partition
+    op.execute(
+        'CREATE INDEX ix_doc_chunks_embedding ON doc_chunks '
+        'USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);'
+    )
+
+def upgrade() -> None:
+    partitions = int(context.get_x_argument(as_dictionary=True).get('doc_chunks_partitions', PARTITIONS))
+    if partitions < 1:
+        raise ValueError("doc_chunks_partitions must be at least 1")
+    op.execute('ALTER TABLE doc_chunks RENAME TO doc_chunks_legacy;')
+    op.execute(
+        'CREATE TABLE doc_chunks (LIKE doc_chunks_legacy INCLUDING DEFAULTS) '
+        'PARTITION BY HASH (user_id);'
+    )
+    for remainder in range(partitions):
+        op.execute(
+            f'CREATE TABLE doc_chunks_p{remainder} PARTITION OF doc_chunks '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder});'
+        )
+
+    # Copy rows before building indexes so each index is built once, on real data
+    op.execute('INSERT INTO doc_chunks SELECT * FROM doc_chunks_legacy;')
+    op.execute('DROP TABLE doc_chunks_legacy;')
+
+    # Primary and unique keys on a partitioned table must include the partition key
+    op.create_primary_key('doc_chunks_pkey', 'doc_chunks', ['id', 'user_id'])
+    _create_constraints_and_indexes(['user_id', 'document_id', 'chunk_index'])
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE doc_chunks RENAME TO doc_chunks_partitioned;')
+    op.execute('CREATE TABLE doc_chunks (LIKE doc_chunks_partitioned INCLUDING DEFAULTS);')
+    op.execute('INSERT INTO doc_chunks SELECT * FROM doc_chunks_partitioned;')
+    op.execute('DROP TABLE doc_chunks_partitioned;')
+
+    op.create_primary_key('doc_chunks_pkey', 'doc_chunks', ['id'])
+    _create_constraints_and_indexes(['document_id', 'chunk_index'])
@@ -0,0 +1,20 @@
+"""keyset pagination index on documents
+
+Revision ID: 006_documents_keyset_index
+Revises: 005_partition_doc_chunks
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006_documents_keyset_index'
+down_revision = '005_partition_doc_chunks'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index('ix_documents_user_created', 'documents', ['user_id', 'created_at', 'id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_user_created', table_name='documents')
@@ -0,0 +1,51 @@
+"""int8-quantized embedding columns on doc_chunks
+
+Revision ID: 007_doc_chunks_int8_embeddings
+Revises: 006_documents_keyset_index
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+from app.ml.quantization import codes_to_bytes, quantize_int8
+
+# revision identifiers, used by Alembic.
+revision = '007_doc_chunks_int8_embeddings'
+down_revision = '006_documents_keyset_index'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+def upgrade() -> None:
+    op.add_column('doc_chunks', sa.Column('embedding_q', sa.LargeBinary(), nullable=True))
+    op.add_column('doc_chunks', sa.Column('embedding_scale', sa.Float(), nullable=True))
+
+    # Quantize existing embeddings in batches; new rows are written quantized by save_chunks
+    conn = op.get_bind()
+    while True:
+        rows = conn.execute(sa.text(
+            'SELECT id, user_id, embedding::text FROM doc_chunks '
+            'WHERE embedding_q IS NULL AND embedding IS NOT NULL LIMIT :limit'
+        ), {'limit': BACKFILL_BATCH_SIZE}).all()
+        if not rows:
+            break
+        codes, scales = quantize_int8(np.array([json.loads(embedding) for _, _, embedding in rows]))
+        conn.execute(
+            sa.text(
+                'UPDATE doc_chunks SET embedding_q = :codes, embedding_scale = :scale '
+                'WHERE user_id = :user_id AND id = :id'
+            ),
+            [
+                {'codes': codes_to_bytes(codes[i]), 'scale': float(scales[i]), 'user_id': user_id, 'id': chunk_id}
+                for i, (chunk_id, user_id, _) in enumerate(rows)
+            ]
+        )
+
+def downgrade() -> None:
+    op.drop_column('doc_chunks', 'embedding_scale')
+    op.drop_column('doc_chunks', 'embedding_q')
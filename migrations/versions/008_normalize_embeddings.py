@@ -0,0 +1,82 @@
+"""unit-normalize doc_chunks embeddings and index them for inner product
+
+Revision ID: 008_normalize_embeddings
+Revises: 007_doc_chunks_int8_embeddings
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_normalize_embeddings'
+down_revision = '007_doc_chunks_int8_embeddings'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+def _normalize_embeddings(conn) -> None:
+    # Walk the table in (user_id, id) order so each row is visited once
+    last = None
+    while True:
+        keyset = 'AND (user_id, id) > (:user_id, :id) ' if last else ''
+        rows = conn.execute(sa.text(
+            'SELECT id, user_id, embedding::text FROM doc_chunks '
+            f'WHERE embedding IS NOT NULL {keyset}'
+            'ORDER BY user_id, id LIMIT :limit'
+        ), {'limit': BACKFILL_BATCH_SIZE, **(last or {})}).all()
+        if not rows:
+            break
+        last = {'user_id': rows[-1][1], 'id': rows[-1][0]}
+
+        vectors = np.array([json.loads(embedding) for _, _, embedding in rows], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        # Scaling a vector leaves its int8 codes unchanged, only the scale moves
+        conn.execute(
+            sa.text(
+                'UPDATE doc_chunks SET embedding = CAST(:embedding AS vector), '
+                'embedding_scale = embedding_scale / :norm '
+                'WHERE user_id = :user_id AND id = :id'
+            ),
+            [
+                {
+                    'embedding': json.dumps((vectors[i] / norms[i]).tolist()),
+                    'norm': float(norms[i]),
+                    'user_id': user_id,
+                    'id': chunk_id,
+                }
+                for i, (chunk_id, user_id, _) in enumerate(rows)
+            ]
+        )
+
+def _recreate_vector_indexes(opclass: str) -> None:
+    op.execute('DROP INDEX IF EXISTS ix_doc_chunks_embedding;')
+    # Per-tenant partial indexes are rebuilt by the next sync_tenant_indexes run
+    op.execute("""
+        DO $$
+        DECLARE name TEXT;
+        BEGIN
+            FOR name IN SELECT indexname FROM pg_indexes
+                        WHERE tablename LIKE 'doc_chunks%' AND indexname LIKE 'ix_doc_chunks_embedding_u_%'
+            LOOP
+                EXECUTE format('DROP INDEX IF EXISTS %I', name);
+            END LOOP;
+        END $$;
+    """)
+    op.execute(
+        'CREATE INDEX ix_doc_chunks_embedding ON doc_chunks '
+        f'USING ivfflat (embedding {opclass}) WITH (lists = 100);'
+    )
+
+def upgrade() -> None:
+    _normalize_embeddings(op.get_bind())
+    _recreate_vector_indexes('vector_ip_ops')
+
+def downgrade() -> None:
+    # Unit-length vectors rank the same under cosine, so only the index changes
+    _recreate_vector_indexes('vector_cosine_ops')
@@ -0,0 +1,66 @@
+"""per-document centroid embeddings
+
+Revision ID: 009_document_centroids
+Revises: 008_normalize_embeddings
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import json
+from collections import defaultdict
+
+from alembic import op
+from pgvector.sqlalchemy import Vector
+import sqlalchemy as sa
+
+from app.ml.centroids import centroid
+
+# revision identifiers, used by Alembic.
+revision = '009_document_centroids'
+down_revision = '008_normalize_embeddings'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 100  # documents per batch
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('centroid', Vector(384), nullable=True))
+
+    conn = op.get_bind()
+    last_id = None
+    while True:
+        keyset = 'WHERE id > :last_id ' if last_id else ''
+        documents = conn.execute(sa.text(
+            f'SELECT id, user_id FROM documents {keyset}ORDER BY id LIMIT :limit'
+        ), {'limit': BACKFILL_BATCH_SIZE, 'last_id': last_id}).all()
+        if not documents:
+            break
+        last_id = documents[-1][0]
+
+        embeddings = defaultdict(list)
+        rows = conn.execute(
+            sa.text(
+                'SELECT document_id, embedding::text FROM doc_chunks '
+                'WHERE user_id = ANY(CAST(:user_ids AS uuid[])) '
+                'AND document_id = ANY(CAST(:document_ids AS uuid[])) '
+                'AND embedding IS NOT NULL'
+            ),
+            {
+                'user_ids': list({str(user_id) for _, user_id in documents}),
+                'document_ids': [str(document_id) for document_id, _ in documents],
+            }
+        )
+        for document_id, embedding in rows:
+            embeddings[document_id].append(json.loads(embedding))
+
+        updates = [
+            {'centroid': json.dumps(centroid(vectors).tolist()), 'id': document_id}
+            for document_id, vectors in embeddings.items()
+        ]
+        if updates:
+            conn.execute(
+                sa.text('UPDATE documents SET centroid = CAST(:centroid AS vector) WHERE id = :id'),
+                updates
+            )
+
+def downgrade() -> None:
+    op.drop_column('documents', 'centroid')
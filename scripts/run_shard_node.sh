@@ -0,0 +1,14 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+if [ -f .env ]; then
+  # shellcheck disable=SC2046
+  export $(grep -v '^#' .env | xargs)
+fi
+
+PORT="${1:-8101}"
+# Listening beyond loopback (e.g. 0.0.0.0) requires RETRIEVAL_SHARD_SECRET
+HOST="${2:-127.0.0.1}"
+
+echo "Starting retrieval shard node on ${HOST}:${PORT}"
+python -m app.retrieval.shard_node --host "${HOST}" --port "${PORT}"
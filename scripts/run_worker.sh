@@ -11,5 +11,14 @@ if ! command -v rq >/dev/null 2>&1; then
   exit 1
 fi
 
+case "$(echo "${ENABLE_FAIR_SCHEDULING:-false}" | tr '[:upper:]' '[:lower:]')" in
+  true|1|yes|on)
+    echo "Starting fair-share dispatcher"
+    python -m app.workers.scheduler &
+    DISPATCHER_PID=$!
+    trap 'kill "$DISPATCHER_PID" 2>/dev/null || true' EXIT
+    ;;
+esac
+
 echo "Starting RQ worker on queue 'documents-processing'"
 rq worker documents-processing
@@ -21,31 +21,71 @@ CREATE TABLE IF NOT EXISTS documents (
     storage_path VARCHAR,
     status VARCHAR DEFAULT 'uploaded',
     meta_info JSON,
+    centroid VECTOR(384),  -- normalised mean of the chunk embeddings
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS doc_chunks (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     chunk_index INTEGER,
     text VARCHAR,
     embedding VECTOR(384),
+    embedding_q BYTEA,  -- int8 codes, embedding ~= codes * embedding_scale
+    embedding_scale FLOAT,
     meta_info JSON,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, user_id),
+    CONSTRAINT uq_doc_chunks_document_chunk UNIQUE (user_id, document_id, chunk_index)
+) PARTITION BY HASH (user_id);
+
+-- Postgres fallback for the document processing queue
+CREATE TABLE IF NOT EXISTS processing_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE
 );
 
+-- 16 hash partitions by tenant (keep in sync with DOC_CHUNKS_PARTITIONS)
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS doc_chunks_p%s PARTITION OF doc_chunks FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            i, i
+        );
+        -- Policies live on the parent; block direct access to partitions
+        EXECUTE format('ALTER TABLE doc_chunks_p%s ENABLE ROW LEVEL SECURITY', i);
+    END LOOP;
+END $$;
+
 -- Step 3: Create indexes
 CREATE INDEX IF NOT EXISTS ix_documents_user_id ON documents(user_id);
+CREATE INDEX IF NOT EXISTS ix_documents_user_created ON documents(user_id, created_at, id);
 CREATE INDEX IF NOT EXISTS ix_doc_chunks_document_id ON doc_chunks(document_id);
+CREATE INDEX IF NOT EXISTS ix_doc_chunks_user_document ON doc_chunks(user_id, document_id);
+CREATE INDEX IF NOT EXISTS ix_processing_jobs_claim ON processing_jobs(status, available_at);
 
--- Step 4: Create vector index (IVFFlat for fast similarity search)
+-- Step 4: Create vector index (IVFFlat for fast similarity search).
+-- Embeddings are stored unit length, so inner product ranks like cosine.
 CREATE INDEX IF NOT EXISTS ix_doc_chunks_embedding 
-ON doc_chunks USING ivfflat (embedding vector_cosine_ops) 
+ON doc_chunks USING ivfflat (embedding vector_ip_ops) 
 WITH (lists = 100);
 
 -- Step 5: Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
+-- Only the backend's service role touches the job queue, so it gets no policies
+ALTER TABLE processing_jobs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE doc_chunks ENABLE ROW LEVEL SECURITY;
 
 -- Step 6: Create RLS Policies
@@ -67,19 +107,13 @@ CREATE POLICY "Users can update own documents" ON documents
 CREATE POLICY "Users can delete own documents" ON documents
     FOR DELETE USING (auth.uid() = user_id);
 
--- Doc chunks policies (inherit from documents)
+-- Doc chunks policies (user_id is copied from the owning document)
 CREATE POLICY "Users can view own doc chunks" ON doc_chunks
-    FOR SELECT USING (
-        EXISTS (
-            SELECT 1 FROM documents 
-            WHERE documents.id = doc_chunks.document_id 
-            AND documents.user_id = auth.uid()
-        )
-    );
+    FOR SELECT USING (auth.uid() = user_id);
 
 CREATE POLICY "Users can insert own doc chunks" ON doc_chunks
     FOR INSERT WITH CHECK (
-        EXISTS (
+        auth.uid() = user_id AND EXISTS (
             SELECT 1 FROM documents 
             WHERE documents.id = doc_chunks.document_id 
             AND documents.user_id = auth.uid()
@@ -87,15 +121,9 @@ CREATE POLICY "Users can insert own doc chunks" ON doc_chunks
     );
 
 CREATE POLICY "Users can delete own doc chunks" ON doc_chunks
-    FOR DELETE USING (
-        EXISTS (
-            SELECT 1 FROM documents 
-            WHERE documents.id = doc_chunks.document_id 
-            AND documents.user_id = auth.uid()
-        )
-    );
+    FOR DELETE USING (auth.uid() = user_id);
 
 -- Verification queries
 SELECT 'Tables created successfully!' as status;
-SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename IN ('users', 'documents', 'doc_chunks');
-SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename IN ('users', 'documents', 'doc_chunks');
+SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename IN ('users', 'documents', 'doc_chunks', 'processing_jobs');
+SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename IN ('users', 'documents', 'doc_chunks', 'processing_jobs');
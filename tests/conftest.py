@@ -1,13 +1,16 @@
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import create_database, database_exists, drop_database
 from app.main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_async_db, get_async_database_url, get_db, get_read_db
 from app.services.auth import auth_service
 from app.models.database import User as DBUser
 from fpdf import FPDF
@@ -24,6 +27,10 @@ engine = create_engine(TEST_DATABASE_URL, pool_pre_ping=True)
 # Session factory
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request handlers; NullPool avoids sharing connections across event loops
+async_engine = create_async_engine(get_async_database_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 # --- Fixtures ---
 
 @pytest.fixture(scope="session")
@@ -85,6 +92,12 @@ def test_db(test_user_data: dict) -> Generator[Session, None, None]:
         session.rollback()
         session.close()
 
+@pytest_asyncio.fixture
+async def async_db(test_db: Session) -> AsyncGenerator[AsyncSession, None]:
+    """Async session on the same clean database, for code that runs on AsyncSession."""
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
 @pytest.fixture
 def client(test_db: Session, test_user_data: dict) -> Generator[TestClient, None, None]:
     """Provide an authenticated TestClient using the Postgres test database."""
@@ -95,10 +108,16 @@ def client(test_db: Session, test_user_data: dict) -> Generator[TestClient, None
         finally:
             pass
 
+    async def override_get_async_db() -> AsyncGenerator[AsyncSession, None]:
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     async def override_get_current_user():
         return test_user_data
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
     app.dependency_overrides[auth_service.get_current_user] = override_get_current_user
 
     with TestClient(app, raise_server_exceptions=True) as c:
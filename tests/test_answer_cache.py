@@ -0,0 +1,67 @@
+import pytest
+
+from app.retrieval.events import ADDED, InMemoryCorpusEvents
+from app.services.answer_cache import SemanticAnswerCache
+
+
+def _cache(events, **kwargs):
+    options = {"max_entries": 4, "threshold": 0.95, "ttl": 60, "max_users": 10}
+    options.update(kwargs)
+    return SemanticAnswerCache(versions=events, **options)
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_query_reuses_response():
+    events = InMemoryCorpusEvents()
+    cache = _cache(events)
+    scope = cache.scope("chat", ["b", "a"])
+
+    miss = await cache.lookup("user-1", scope, [1.0, 0.0, 0.0])
+    assert miss.response is None
+    cache.store(miss, "answer")
+
+    assert (await cache.lookup("user-1", scope, [0.99, 0.05, 0.0])).response == "answer"
+    assert (await cache.lookup("user-1", cache.scope("chat", ["a", "b"]), [1.0, 0.0, 0.0])).response == "answer"
+    # Different question, scope or user
+    assert (await cache.lookup("user-1", scope, [0.7, 0.7, 0.0])).response is None
+    assert (await cache.lookup("user-1", cache.scope("chat", ["a"]), [1.0, 0.0, 0.0])).response is None
+    assert (await cache.lookup("user-2", scope, [1.0, 0.0, 0.0])).response is None
+
+
+@pytest.mark.asyncio
+async def test_corpus_change_invalidates_user_entries():
+    events = InMemoryCorpusEvents()
+    cache = _cache(events)
+    scope = cache.scope("summarize", "multi", 150, 30)
+    cache.store(await cache.lookup("user-1", scope, [0.0, 1.0]), "old summary")
+    cache.store(await cache.lookup("user-2", scope, [0.0, 1.0]), "other user")
+
+    events.publish("user-1", "doc-1", ADDED)
+
+    stale = await cache.lookup("user-1", scope, [0.0, 1.0])
+    assert stale.response is None
+    cache.store(stale, "new summary")
+    assert (await cache.lookup("user-1", scope, [0.0, 1.0])).response == "new summary"
+    assert (await cache.lookup("user-2", scope, [0.0, 1.0])).response == "other user"
+
+
+@pytest.mark.asyncio
+async def test_entries_are_bounded_and_expire():
+    cache = _cache(InMemoryCorpusEvents(), max_entries=2)
+    for i, vector in enumerate([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]):
+        cache.store(await cache.lookup("user-1", "chat|", vector), f"answer {i}")
+
+    assert cache.stats() == {"users": 1, "entries": 2}
+    assert (await cache.lookup("user-1", "chat|", [1.0, 0.0, 0.0])).response is None
+    assert (await cache.lookup("user-1", "chat|", [0.0, 0.0, 1.0])).response == "answer 2"
+
+    expired = _cache(InMemoryCorpusEvents(), ttl=-1)
+    expired.store(await expired.lookup("user-1", "chat|", [1.0, 0.0]), "answer")
+    assert (await expired.lookup("user-1", "chat|", [1.0, 0.0])).response is None
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_stores_nothing():
+    cache = _cache(InMemoryCorpusEvents(), max_entries=0)
+    cache.store(await cache.lookup("user-1", "chat|", [1.0, 0.0]), "answer")
+    assert cache.stats()["entries"] == 0
@@ -1,3 +1,4 @@
+import pytest
 from fastapi import status
 
 def test_protected_route_without_token():
@@ -21,3 +22,83 @@ def test_protected_route_with_valid_token(client, auth_headers):
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert data["email"] == "test@example.com"
+
+def _make_token(**overrides):
+    import time
+    from jose import jwt
+    from app.core.config import settings
+
+    claims = {
+        "sub": "11111111-1111-1111-1111-111111111111",
+        "email": "jwt@example.com",
+        "role": "authenticated",
+        "aud": settings.SUPABASE_JWT_AUDIENCE,
+        "exp": int(time.time()) + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+def _credentials(token):
+    from fastapi.security import HTTPAuthorizationCredentials
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+@pytest.mark.asyncio
+async def test_local_jwt_verification_returns_user_dict():
+    """A valid token is verified locally and its claims map to the user."""
+    from app.services.auth import AuthService
+    from app.api.routers.documents import get_user_id
+
+    user = await AuthService().get_current_user(_credentials(_make_token()))
+
+    assert user["email"] == "jwt@example.com"
+    assert get_user_id(user) == "11111111-1111-1111-1111-111111111111"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("overrides, code", [
+    ({"exp": 1}, "TOKEN_EXPIRED"),
+    ({"aud": "someone-else"}, "INVALID_TOKEN"),
+])
+async def test_local_jwt_verification_rejects_bad_tokens(overrides, code):
+    """Expired tokens and tokens for another audience are rejected."""
+    from app.services.auth import AuthError, AuthService
+
+    with pytest.raises(AuthError) as exc_info:
+        await AuthService().get_current_user(_credentials(_make_token(**overrides)))
+
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert exc_info.value.detail["code"] == code
+
+@pytest.mark.asyncio
+async def test_verified_claims_are_cached(monkeypatch):
+    """A repeated token is served from the claims cache without re-verifying."""
+    from app.services.auth import AuthService
+
+    service = AuthService()
+    token = _make_token()
+    await service.get_current_user(_credentials(token))
+
+    def fail(_token):
+        raise AssertionError("token should come from the cache")
+
+    monkeypatch.setattr(service, "verify_token", fail)
+    user = await service.get_current_user(_credentials(token))
+    assert user["id"] == "11111111-1111-1111-1111-111111111111"
+
+@pytest.mark.asyncio
+async def test_remote_check_mode_bypasses_claims_cache(monkeypatch):
+    """With AUTH_REMOTE_CHECK, a session revoked after its first use is refused."""
+    from app.core.config import settings
+    from app.services.auth import AuthError, AuthService
+
+    monkeypatch.setattr(settings, "AUTH_REMOTE_CHECK", True)
+    service = AuthService()
+    token = _make_token()
+    monkeypatch.setattr(service, "verify_token_remote", lambda _token: None)
+    await service.get_current_user(_credentials(token))
+
+    def revoked(_token):
+        raise AuthError(status_code=status.HTTP_401_UNAUTHORIZED, message="revoked", error_code="USER_NOT_FOUND")
+
+    monkeypatch.setattr(service, "verify_token_remote", revoked)
+    with pytest.raises(AuthError):
+        await service.get_current_user(_credentials(token))
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routers import chat
+from app.core.database import get_read_db
+from app.core.sql_stats import current_request_sql, endpoint_sql_stats
+from app.main import app
+from app.retrieval import RetrievalResult, ScoredChunk
+from app.services.answer_cache import CacheLookup
+from app.services.auth import auth_service
+
+
+def _hit(text, score):
+    chunk = SimpleNamespace(id=uuid.uuid4(), text=text, meta_info={"page_number": 2})
+    return ScoredChunk(score, chunk, SimpleNamespace(id=uuid.uuid4()))
+
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    async def current_user():
+        return {"id": str(uuid.uuid4())}
+
+    app.dependency_overrides[auth_service.get_current_user] = current_user
+    app.dependency_overrides[get_read_db] = lambda: None
+    yield monkeypatch
+    app.dependency_overrides.clear()
+
+
+def test_stream_sends_citations_then_the_same_answer(chat_app):
+    async def find_passages(db, request, user_id):
+        top = RetrievalResult(hits=[_hit("first passage", 0.9), _hit("second passage", 0.8)], scanned=10)
+        return CacheLookup(user_id, "chat|", None, None), top
+
+    chat_app.setattr(chat, "_find_passages", find_passages)
+    client = TestClient(app)
+
+    response = client.post("/api/v1/chat/stream", json={"query": "what?"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [event["event"] for event in events] == ["citations", "delta", "delta", "delta", "delta", "done"]
+    assert [c["page_number"] for c in events[0]["citations"]] == [2, 2]
+    answer = client.post("/api/v1/chat", json={"query": "what?"}).json()["answer"]
+    assert "".join(event["text"] for event in events if event["event"] == "delta") == answer
+
+    sse = client.post("/api/v1/chat/stream", json={"query": "what?"}, headers={"Accept": "text/event-stream"})
+    assert sse.text.startswith("event: citations\ndata: {")
+
+
+def test_stream_sql_is_recorded_for_the_endpoint(chat_app):
+    """Queries issued while the stream body runs still count toward /chat/stream."""
+    async def find_passages(db, request, user_id):
+        await asyncio.sleep(0.05)  # retrieval is still running once the headers are out
+        # What the engine's cursor hooks do for each statement
+        current_request_sql.get().record("SELECT id FROM doc_chunks WHERE user_id = $1", 12.0, 5)
+        return CacheLookup(user_id, "chat|", None, None), RetrievalResult(hits=[_hit("passage", 0.9)], scanned=1)
+
+    chat_app.setattr(chat, "_find_passages", find_passages)
+    endpoint_sql_stats.reset()
+
+    TestClient(app).post("/api/v1/chat/stream", json={"query": "what?"})
+
+    report = endpoint_sql_stats.snapshot()["POST /api/v1/chat/stream"]
+    assert report["requests"] == 1
+    assert report["avg_statements"] == 1
+    assert report["avg_sql_ms"] == 12.0
+
+
+@pytest.mark.asyncio
+async def test_stream_cancels_retrieval_when_the_client_leaves(chat_app):
+    cancelled = asyncio.Event()
+
+    async def find_passages(db, request, user_id):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    chat_app.setattr(chat, "_find_passages", find_passages)
+    body = json.dumps({"query": "what?"}).encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/v1/chat/stream", "raw_path": b"/api/v1/chat/stream",
+        "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    assert cancelled.is_set()
@@ -52,6 +52,50 @@ def test_get_document_success(client, auth_headers, test_pdf):
     assert data["id"] == document_id
     assert "title" in data
 
+def test_list_documents_keyset_pages(client, auth_headers, test_pdf):
+    """Pages follow next_cursor without repeats and honour the field projection."""
+    uploaded = set()
+    for _ in range(3):
+        with open(test_pdf, "rb") as f:
+            response = client.post(
+                "/api/v1/documents/upload",
+                files={"file": ("test.pdf", f, "application/pdf")},
+                headers=auth_headers
+            )
+        assert response.status_code == status.HTTP_200_OK, response.text
+        uploaded.add(response.json()["id"])
+
+    first = client.get("/api/v1/documents", params={"limit": 2}, headers=auth_headers)
+    assert first.status_code == status.HTTP_200_OK, first.text
+    first_page = first.json()
+    assert len(first_page["items"]) == 2
+    assert first_page["total"] >= 3
+    assert first_page["next_cursor"]
+
+    seen = [item["id"] for item in first_page["items"]]
+    cursor = first_page["next_cursor"]
+    while cursor:
+        response = client.get(
+            "/api/v1/documents",
+            params={"limit": 2, "cursor": cursor, "fields": "id,title", "include_total": False},
+            headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK, response.text
+        page = response.json()
+        assert "total" not in page
+        for item in page["items"]:
+            assert set(item) == {"id", "title"}
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+
+    assert len(seen) == len(set(seen))
+    assert uploaded <= set(seen)
+
+def test_list_documents_rejects_unknown_fields(client, auth_headers):
+    """Unknown projection fields are a client error."""
+    response = client.get("/api/v1/documents", params={"fields": "id,secret"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
 def test_get_nonexistent_document(client, auth_headers):
     """Test getting a document that doesn't exist."""
     response = client.get(
@@ -88,3 +132,33 @@ def test_search_documents(client, auth_headers, test_pdf):
     assert "results" in data
     assert "total_results" in data
 
+
+def test_batch_upload_accepts_pdfs_and_zip(client, auth_headers, test_pdf):
+    """Batch upload stores every PDF, expands zips and reports invalid files."""
+    import io
+    import zipfile
+
+    with open(test_pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("folder/zipped.pdf", pdf_bytes)
+        zf.writestr("readme.txt", "not a pdf")
+
+    response = client.post(
+        "/api/v1/documents/upload/batch",
+        files=[
+            ("files", ("first.pdf", pdf_bytes, "application/pdf")),
+            ("files", ("archive.zip", archive.getvalue(), "application/zip")),
+            ("files", ("notes.txt", b"text", "text/plain")),
+        ],
+        headers=auth_headers
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert sorted(doc["title"] for doc in data["documents"]) == ["first.pdf", "zipped.pdf"]
+    assert all(doc["status"] == "uploaded" for doc in data["documents"])
+    assert [error["filename"] for error in data["errors"]] == ["notes.txt"]
+    assert data["total_pages"] == 2
@@ -0,0 +1,101 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from app.ml.ivfpq import AnnIndexStore, IVFPQIndex, kmeans
+from app.retrieval import RetrievalQuery, RetrievalResult
+from app.retrieval.ann import AnnBackend
+from tests.utils.vectors import FakeVectorSession
+
+
+def _clustered(rng, n, dimension=64, clusters=50):
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(0, clusters, size=n)] + 0.4 * rng.normal(size=(n, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32), centers
+
+
+def test_kmeans_recovers_separated_clusters():
+    rng = np.random.default_rng(0)
+    centers = np.array([[10.0, 0.0], [0.0, 10.0], [-10.0, -10.0]])
+    data = np.vstack([center + rng.normal(size=(100, 2)) for center in centers])
+
+    found = kmeans(data, 3, seed=1)
+
+    assert sorted(np.round(found).tolist()) == sorted(centers.tolist())
+
+
+def test_ivfpq_recall_with_exact_rescoring():
+    """Re-scoring 4k PQ candidates exactly recovers nearly all of the true top-k."""
+    rng = np.random.default_rng(1)
+    vectors, centers = _clustered(rng, 5000)
+    ids = [uuid.uuid4() for _ in range(len(vectors))]
+    index = IVFPQIndex.train(vectors, nlist=64, m=16)
+    index.add(ids, vectors)
+
+    recalls = []
+    for query in _clustered(rng, 20)[0]:
+        candidates, _, scanned = index.search(query, 40, nprobe=8)
+        assert scanned < len(vectors)
+        position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        rescored = sorted(candidates, key=lambda chunk_id: -(vectors[position[chunk_id]] @ query))[:10]
+        exact = {ids[i] for i in np.argsort(-(vectors @ query))[:10]}
+        recalls.append(len(exact & set(rescored)) / 10)
+
+    assert np.mean(recalls) >= 0.9
+
+
+def test_index_round_trips_through_disk_and_grows_incrementally(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors, _ = _clustered(rng, 600, dimension=32, clusters=10)
+    store = AnnIndexStore(str(tmp_path))
+    user_id = str(uuid.uuid4())
+    ids = [uuid.uuid4() for _ in range(500)]
+
+    assert store.add(user_id, ids[:1], vectors[:1]) == 0  # tenants without an index are skipped
+    index = IVFPQIndex.train(vectors[:500], nlist=8, m=8)
+    index.add(ids, vectors[:500])
+    store.save(user_id, index)
+
+    loaded = store.get(user_id)
+    assert len(loaded) == 500
+    assert loaded.search(vectors[3], 5, nprobe=8)[0] == index.search(vectors[3], 5, nprobe=8)[0]
+
+    new_ids = [uuid.uuid4() for _ in range(100)]
+    assert store.add(user_id, new_ids, list(vectors[500:])) == 100
+    reloaded = store.get(user_id)
+    assert reloaded is not loaded and len(reloaded) == 600
+    assert new_ids[7] in reloaded.search(vectors[507], 5, nprobe=8)[0]
+    assert reloaded.contains([new_ids[0], uuid.uuid4()]).tolist() == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_ann_backend_rescores_candidates_and_falls_back(tmp_path):
+    """Indexed tenants get exact scores for ANN candidates; scoped queries use the wrapped backend."""
+    rng = np.random.default_rng(3)
+    vectors, _ = _clustered(rng, 300, dimension=32, clusters=5)
+    db = FakeVectorSession(list(vectors), batch_size=100)
+    store = AnnIndexStore(str(tmp_path))
+    index = IVFPQIndex.train(vectors, nlist=4, m=8)
+    index.add(list(db.embeddings), vectors)
+    store.save(db.user_id, index)
+
+    class Fallback:
+        name = "fallback"
+        calls = 0
+
+        async def search(self, db, query):
+            self.calls += 1
+            return RetrievalResult()
+
+    inner = Fallback()
+    backend = AnnBackend(inner, store, nprobe=4)
+    result = await backend.search(db, RetrievalQuery(vectors[10], str(db.user_id), 5))
+
+    assert result.hits[0].chunk.id == db.rows[10][0]
+    assert result.hits[0].score == pytest.approx(1.0, abs=1e-5)
+    assert inner.calls == 0
+
+    await backend.search(db, RetrievalQuery(vectors[10], str(db.user_id), 5, document_ids=[uuid.uuid4()]))
+    await backend.search(db, RetrievalQuery(vectors[10], str(uuid.uuid4()), 5))
+    assert inner.calls == 2
@@ -0,0 +1,70 @@
+from app.models.database import ProcessingJob
+from app.workers import pg_queue
+from tests.utils.documents import create_document
+
+
+def test_claim_marks_job_running(test_db, test_user_data):
+    """A claimed job is leased to the worker and counts an attempt."""
+    document = create_document(test_db, test_user_data["id"])
+    pg_queue.enqueue_job(test_db, document.id)
+    test_db.commit()
+
+    job = pg_queue.claim_job(test_db, "worker-1")
+
+    assert job is not None
+    assert job.document_id == document.id
+    assert job.status == pg_queue.JOB_RUNNING
+    assert job.attempts == 1
+    assert job.locked_by == "worker-1"
+    assert job.lease_expires_at is not None
+    # Nothing else is runnable while the lease is held
+    assert pg_queue.claim_job(test_db, "worker-2") is None
+
+
+def test_failed_job_is_retried_then_given_up(test_db, test_user_data):
+    """Failures back off until max_attempts, then the job is marked failed."""
+    document = create_document(test_db, test_user_data["id"])
+    job = pg_queue.enqueue_job(test_db, document.id)
+    job.max_attempts = 2
+    test_db.commit()
+
+    job = pg_queue.claim_job(test_db, "worker-1")
+    pg_queue.fail_job(test_db, job, "worker-1", Exception("boom"))
+    test_db.refresh(job)
+    assert job.status == pg_queue.JOB_QUEUED
+    assert job.last_error == "boom"
+
+    # Make the retry runnable immediately instead of waiting RETRY_DELAY
+    test_db.query(ProcessingJob).update({ProcessingJob.available_at: job.created_at})
+    test_db.commit()
+
+    job = pg_queue.claim_job(test_db, "worker-1")
+    assert job.attempts == 2
+    pg_queue.fail_job(test_db, job, "worker-1", Exception("boom again"))
+    test_db.refresh(job)
+    assert job.status == pg_queue.JOB_FAILED
+    assert pg_queue.claim_job(test_db, "worker-1") is None
+
+
+def test_stalled_worker_cannot_touch_a_reclaimed_job(test_db, test_user_data):
+    """Once another worker reclaims an expired lease, the first worker's outcome is dropped."""
+    document = create_document(test_db, test_user_data["id"])
+    pg_queue.enqueue_job(test_db, document.id)
+    test_db.commit()
+
+    stalled = pg_queue.claim_job(test_db, "worker-1")
+    # worker-1 stops renewing and its lease runs out
+    test_db.query(ProcessingJob).update({ProcessingJob.lease_expires_at: stalled.created_at})
+    test_db.commit()
+    reclaimed = pg_queue.claim_job(test_db, "worker-2")
+    assert reclaimed.id == stalled.id
+
+    assert pg_queue.fail_job(test_db, stalled, "worker-1", Exception("late failure")) is False
+    assert pg_queue.complete_job(test_db, stalled, "worker-1") is False
+
+    test_db.refresh(reclaimed)
+    assert reclaimed.status == pg_queue.JOB_RUNNING
+    assert reclaimed.locked_by == "worker-2"
+    assert reclaimed.last_error is None
+    # Nobody else can claim it while worker-2 runs it
+    assert pg_queue.claim_job(test_db, "worker-3") is None
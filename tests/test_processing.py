@@ -0,0 +1,124 @@
+import queue
+
+import fitz
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models.database import DocumentChunk as DBDocumentChunk
+from app.workers import pipeline as pipeline_module, processor as processor_module
+from app.workers.processor import DocumentProcessor, save_chunks, store_centroid
+from tests.utils.documents import create_document
+
+
+class FlakyEmbeddings:
+    """Fails on the Nth call to simulate a worker dying mid-document."""
+
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def generate_embeddings(self, texts, batch_size=32):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("worker killed")
+        return [np.ones(384, dtype=np.float32) for _ in texts]
+
+
+def _pdf_bytes(pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i} paragraph with enough words to pass the minimum chunk size.")
+    return doc.tobytes()
+
+
+def test_save_chunks_is_idempotent(test_db, test_user_data):
+    """Re-inserting the same chunk indexes does not duplicate rows."""
+    document = create_document(test_db, test_user_data["id"])
+    chunks = [{"text": f"chunk {i}", "page": 1} for i in range(3)]
+    embeddings = [np.ones(384, dtype=np.float32)] * 3
+
+    save_chunks(test_db, document, chunks, embeddings)
+    save_chunks(test_db, document, chunks, embeddings)
+    test_db.commit()
+
+    count = test_db.query(DBDocumentChunk).filter(DBDocumentChunk.document_id == document.id).count()
+    assert count == 3
+
+
+def test_save_chunks_copies_document_owner(test_db, test_user_data):
+    """Chunks carry the owning document's user_id for tenant-scoped queries."""
+    document = create_document(test_db, test_user_data["id"])
+    save_chunks(test_db, document, [{"text": "chunk", "page": 1}], [np.ones(384, dtype=np.float32)])
+    test_db.commit()
+
+    chunk = test_db.query(DBDocumentChunk).filter(DBDocumentChunk.document_id == document.id).one()
+    assert chunk.user_id == document.user_id
+
+
+def test_processing_resumes_from_checkpoint(test_db, test_user_data, monkeypatch):
+    """A retry after a mid-document failure only processes the remaining pages."""
+    monkeypatch.setattr(settings, "PROCESSING_CHECKPOINT_PAGES", 2)
+    monkeypatch.setattr(processor_module, "read_document_bytes", lambda path: _pdf_bytes(5))
+    document = create_document(test_db, test_user_data["id"])
+
+    processor = DocumentProcessor()
+    processor.embedding_generator = FlakyEmbeddings(fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        processor.process_document(test_db, document)
+    test_db.rollback()
+    assert document.meta_info["checkpoint"] == {"next_page": 4, "next_chunk_index": 4}
+
+    processor.embedding_generator = FlakyEmbeddings()
+    assert processor.process_document(test_db, document) == 5
+    assert processor.embedding_generator.calls == 1
+    assert document.status == "processed"
+
+    indexes = [
+        row.chunk_index
+        for row in test_db.query(DBDocumentChunk.chunk_index)
+        .filter(DBDocumentChunk.document_id == document.id)
+        .order_by(DBDocumentChunk.chunk_index)
+    ]
+    assert indexes == [0, 1, 2, 3, 4]
+
+
+def test_store_centroid_averages_every_stored_chunk(test_db, test_user_data):
+    """The centroid is the unit mean of all chunk embeddings, including earlier checkpoints'."""
+    document = create_document(test_db, test_user_data["id"])
+    first, second = np.zeros(384, dtype=np.float32), np.zeros(384, dtype=np.float32)
+    first[0], second[1] = 1.0, 1.0
+    save_chunks(test_db, document, [{"text": "a", "page": 1}], [first])
+    test_db.commit()
+    save_chunks(test_db, document, [{"text": "b", "page": 2}], [second], start_index=1)
+
+    store_centroid(test_db, document)
+
+    assert np.asarray(document.centroid)[:2] == pytest.approx([2 ** -0.5, 2 ** -0.5])
+
+
+def test_pipeline_marks_document_failed_when_write_fails(test_db, test_user_data, monkeypatch):
+    """A document whose chunks cannot be saved ends up failed instead of stuck in its old status."""
+    document = create_document(test_db, test_user_data["id"])
+
+    def broken_save_chunks(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(pipeline_module, "save_chunks", broken_save_chunks)
+    monkeypatch.setattr(pipeline_module, "SessionLocal", lambda: test_db)
+    pipeline = pipeline_module.IngestionPipeline(processor=DocumentProcessor())
+    pipeline.stats = {"write": pipeline_module.StageStats("write")}
+    inbox = queue.Queue()
+    inbox.put(pipeline_module._ParsedDocument(
+        document_id=str(document.id),
+        chunks=[{"text": "chunk", "page": 1}],
+        embeddings=[np.ones(384, dtype=np.float32)],
+    ))
+    inbox.put(pipeline_module._DONE)
+
+    pipeline._write_stage(inbox)
+
+    test_db.refresh(document)
+    assert document.status == "failed"
+    assert document.meta_info["error"] == "disk full"
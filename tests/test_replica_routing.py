@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.core.database import ReplicaRouter
+
+
+def _router(lags, max_lag=5.0, check_interval=60.0):
+    """Router over placeholder engines whose lag is read from a dict."""
+    engines = list(lags)
+    router = ReplicaRouter(engines, max_lag=max_lag, check_interval=check_interval)
+    checks = []
+
+    async def measure(engine):
+        checks.append(engine)
+        lag = lags[engine]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    router._measure_lag = measure
+    return router, checks
+
+
+@pytest.mark.asyncio
+async def test_pick_skips_stale_and_unreachable_replicas():
+    """Only replicas within the lag tolerance serve reads."""
+    router, _ = _router({"fresh": 0.5, "stale": 30.0, "down": ConnectionError("refused")})
+    picks = {await router.pick() for _ in range(6)}
+    assert picks == {"fresh"}
+
+
+@pytest.mark.asyncio
+async def test_pick_falls_back_to_primary():
+    """With every replica too far behind, None routes the read to the primary."""
+    router, _ = _router({"stale": 30.0})
+    assert await router.pick() is None
+
+    no_replicas = ReplicaRouter([], max_lag=5.0, check_interval=5.0)
+    assert await no_replicas.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_lag_is_cached_between_checks():
+    """Replica lag is measured once per check interval, not per request."""
+    router, checks = _router({"a": 0.0, "b": 1.0})
+    for _ in range(10):
+        await router.pick()
+    assert sorted(checks) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_unresponsive_replica_times_out():
+    """A replica whose lag query hangs is treated as down after check_timeout."""
+    router = ReplicaRouter(["hung"], max_lag=5.0, check_interval=60.0, check_timeout=0.05)
+
+    async def hang(engine):
+        await asyncio.sleep(10)
+
+    router._measure_lag = hang
+    assert await asyncio.wait_for(router.pick(), timeout=1) is None
+
+
+@pytest.mark.asyncio
+async def test_expired_lag_is_refreshed_in_background():
+    """Requests keep the last known lag while a slow re-check is in flight."""
+    router, checks = _router({"a": 0.0}, check_interval=0.0)
+    assert await router.pick() == "a"
+
+    release = asyncio.Event()
+
+    async def slow(engine):
+        checks.append(engine)
+        await release.wait()
+        return 30.0
+
+    router._measure_lag = slow
+    for _ in range(5):
+        assert await asyncio.wait_for(router.pick(), timeout=1) == "a"
+    assert checks == ["a", "a"]  # one check in flight, not one per request
+
+    check = router._checks[0]
+    release.set()
+    await check
+    assert await router.pick() is None
@@ -0,0 +1,238 @@
+import uuid
+
+import httpx
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.ml.centroids import centroid
+from app.models.database import Document as DBDocument
+from app.retrieval import BACKENDS, RetrievalQuery, RetrievalResult, Retriever, get_backend
+from app.retrieval.backends import NumpyBackend, PgvectorBackend, PythonBackend
+from app.retrieval.conversation import ConversationPools
+from app.retrieval.events import ADDED, InMemoryCorpusEvents
+from app.retrieval import shard_node
+from app.retrieval.hierarchical import CentroidBackend
+from app.retrieval.sharded import ShardedBackend
+from app.retrieval.sharding import InMemoryShardRegistry
+from app.workers.processor import save_chunks, store_centroid
+from tests.utils.vectors import FakeVectorSession, unit
+
+# Backends scanning in Python can run against the in-memory session
+SCAN_BACKENDS = {
+    "python": lambda: PythonBackend(batch_size=64),
+    "numpy": lambda: NumpyBackend(batch_size=64, quantized=False),
+    "numpy-int8": lambda: NumpyBackend(batch_size=64, quantized=True),
+}
+
+
+class _NoFallback:
+    name = "no-fallback"
+
+    async def search(self, db, query):
+        raise AssertionError("the sharded backend should answer from its nodes")
+
+
+def _sharded_backend(monkeypatch, test_db):
+    """A sharded backend whose one in-process node loads slices from the test database."""
+    monkeypatch.setattr(shard_node, "engine", test_db.get_bind())
+    monkeypatch.setattr(settings, "CORPUS_EVENTS_ENABLED", False)
+    registry = InMemoryShardRegistry()
+    node = shard_node.ShardNode(
+        "http://shard-0", registry=registry, cache=shard_node.SliceCache(), events=InMemoryCorpusEvents()
+    )
+    node.heartbeat()
+    backend = ShardedBackend(_NoFallback(), registry, slices=2)
+    backend._client = httpx.AsyncClient(app=shard_node.create_app(node, secret=""))
+    return backend
+
+
+class _Recording:
+    name = "recording"
+
+    async def search(self, db, query):
+        self.query = query
+        return RetrievalResult()
+
+
+def _exact_top_k(embeddings, query, k, min_similarity=None):
+    scores = np.vstack([unit(e) for e in embeddings]) @ unit(query)
+    order = [i for i in np.argsort(-scores) if min_similarity is None or scores[i] >= min_similarity]
+    return order[:k], scores
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", sorted(SCAN_BACKENDS))
+async def test_scan_backends_return_exact_top_k(backend):
+    """Every scanning backend returns the exact top-k, in order, with exact scores."""
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(10, 64))
+    embeddings = centers[rng.integers(0, 10, size=600)] + 0.5 * rng.normal(size=(600, 64))
+    query = centers[0] + 0.5 * rng.normal(size=64)
+    db = FakeVectorSession(list(embeddings), batch_size=64)
+
+    result = await SCAN_BACKENDS[backend]().search(db, RetrievalQuery(query, str(db.user_id), 8))
+
+    expected, scores = _exact_top_k(embeddings, query, 8)
+    assert [hit.chunk.id for hit in result.hits] == [db.rows[i][0] for i in expected]
+    assert [hit.score for hit in result.hits] == pytest.approx([scores[i] for i in expected], abs=1e-5)
+    assert result.scanned == 600
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", sorted(SCAN_BACKENDS))
+async def test_scan_backends_apply_min_similarity(backend):
+    """The threshold drops the same chunks, and counts the same matches, everywhere."""
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [0.9, 0.1], [0.6, 0.8]]
+    db = FakeVectorSession(embeddings, batch_size=3)
+
+    result = await SCAN_BACKENDS[backend]().search(
+        db, RetrievalQuery([1.0, 0.0], str(db.user_id), 5, min_similarity=0.5)
+    )
+
+    expected, _ = _exact_top_k(embeddings, [1.0, 0.0], 5, min_similarity=0.5)
+    assert [hit.chunk.id for hit in result.hits] == [db.rows[i][0] for i in expected]
+    assert result.matched == 3
+
+
+def test_get_backend_rejects_unknown_names():
+    assert set(BACKENDS) == {"python", "numpy", "pgvector", "sharded"}
+    assert isinstance(get_backend("pgvector"), PgvectorBackend)
+    with pytest.raises(ValueError):
+        get_backend("faiss")
+
+
+@pytest.mark.asyncio
+async def test_retriever_embeds_and_scopes_the_query():
+    """retrieve() embeds the text and hands the backend a unit query with the caller's scope."""
+
+    class Embeddings:
+        def generate_embeddings(self, texts, batch_size=32):
+            return [np.array([3.0, 4.0])]
+
+    backend = _Recording()
+    document_id = uuid.uuid4()
+    await Retriever(backend, Embeddings()).retrieve(
+        None, "question", "user-1", 3, min_similarity=0.2, document_ids=[document_id], filters={"page": 2}
+    )
+
+    assert backend.query.embedding.tolist() == pytest.approx([0.6, 0.8])
+    assert (backend.query.user_id, backend.query.k, backend.query.min_similarity) == ("user-1", 3, 0.2)
+    assert len(backend.query.criteria()) == 3
+
+
+def test_centroid_is_unit_mean():
+    assert centroid([]) is None
+    assert centroid([[1.0, 0.0], [0.0, 1.0]]).tolist() == pytest.approx([2 ** -0.5, 2 ** -0.5])
+
+
+@pytest.mark.asyncio
+async def test_centroid_backend_restricts_inner_backend_to_candidates():
+    """Only the first stage's documents reach the chunk scorer; small explicit scopes skip it."""
+    inner = _Recording()
+    backend = CentroidBackend(inner, documents=2)
+    candidates = [uuid.uuid4(), uuid.uuid4()]
+
+    async def candidate_documents(db, query):
+        return candidates
+
+    backend.candidate_documents = candidate_documents
+
+    await backend.search(None, RetrievalQuery([1.0, 0.0], "user-1", 3))
+    assert inner.query.document_ids == candidates
+
+    scoped = [uuid.uuid4()]
+    await backend.search(None, RetrievalQuery([1.0, 0.0], "user-1", 3, document_ids=scoped))
+    assert inner.query.document_ids == scoped
+
+
+@pytest.mark.asyncio
+async def test_conversation_follow_ups_rank_the_first_turn_pool():
+    """A follow-up near the first question is answered from the pool, with the same hits a full search gives."""
+    rng = np.random.default_rng(6)
+    centers = rng.normal(size=(20, 32))
+    embeddings = centers[rng.integers(0, 20, size=2000)] + 0.3 * rng.normal(size=(2000, 32))
+    db = FakeVectorSession(list(embeddings), batch_size=256)
+    events = InMemoryCorpusEvents()
+    pools = ConversationPools(size=100, min_similarity=0.5, ttl=60, max_conversations=10, versions=events)
+    backend = NumpyBackend(batch_size=256, quantized=False)
+    full_searches = []
+
+    async def full_search(db, query):
+        full_searches.append(query.k)
+        return await backend.search(db, query)
+
+    def ask(vector, conversation="c1", **kwargs):
+        return pools.search(db, RetrievalQuery(vector, str(db.user_id), 5, **kwargs), conversation, full_search)
+
+    first = await ask(centers[3])
+    assert full_searches == [100] and len(first.hits) == 5
+
+    follow_up = centers[3] + 0.2 * rng.normal(size=32)
+    pooled = await ask(follow_up)
+    assert full_searches == [100]
+    exact = await backend.search(db, RetrievalQuery(follow_up, str(db.user_id), 5))
+    assert [hit.chunk.id for hit in pooled.hits] == [hit.chunk.id for hit in exact.hits]
+    assert db.hydrated == 5
+
+    await ask(centers[11])  # a new topic scores poorly against the pool
+    await ask(centers[11], "c2")  # another conversation
+    events.publish(db.user_id, uuid.uuid4(), ADDED)
+    await ask(centers[11])  # the corpus changed
+    await ask(centers[11], document_ids=[uuid.uuid4()])  # another scope
+    assert len(full_searches) == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+async def test_backends_agree_on_postgres(backend, test_db, async_db, test_user_data, monkeypatch):
+    """All backends, pgvector included, return the same top-k from the real table."""
+    rng = np.random.default_rng(4)
+    embeddings = [unit(e) for e in rng.normal(size=(200, 384))]
+    document = DBDocument(
+        id=uuid.uuid4(), user_id=test_user_data["id"], title="a.pdf", storage_path="/tmp/a.pdf", status="completed"
+    )
+    test_db.add(document)
+    test_db.commit()
+    save_chunks(test_db, document, [{"text": f"chunk {i}", "page": 1} for i in range(200)], embeddings)
+    test_db.commit()
+    query = embeddings[7] + 0.1 * rng.normal(size=384)
+
+    # Probing all 100 lists makes the IVFFlat search exact
+    if backend == "pgvector":
+        instance = PgvectorBackend(probes=100)
+    elif backend == "sharded":
+        instance = _sharded_backend(monkeypatch, test_db)
+    else:
+        instance = BACKENDS[backend]()
+    result = await instance.search(async_db, RetrievalQuery(query, test_user_data["id"], 5))
+
+    expected, scores = _exact_top_k(embeddings, query, 5)
+    assert [hit.chunk.chunk_index for hit in result.hits] == [int(i) for i in expected]
+    assert [hit.score for hit in result.hits] == pytest.approx([scores[i] for i in expected], abs=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_centroid_backend_skips_distant_documents_on_postgres(test_db, async_db, test_user_data):
+    """With one candidate document, only the document nearest the query has its chunks scored."""
+    rng = np.random.default_rng(5)
+    documents = []
+    for center in rng.normal(size=(3, 384)):
+        document = DBDocument(
+            id=uuid.uuid4(), user_id=test_user_data["id"], title="a.pdf", storage_path="/tmp/a.pdf", status="completed"
+        )
+        test_db.add(document)
+        test_db.commit()
+        embeddings = [unit(center + 0.2 * rng.normal(size=384)) for _ in range(20)]
+        save_chunks(test_db, document, [{"text": f"chunk {i}", "page": 1} for i in range(20)], embeddings)
+        store_centroid(test_db, document)
+        test_db.commit()
+        documents.append((document.id, center))
+
+    target, center = documents[1]
+    result = await CentroidBackend(NumpyBackend(), documents=1).search(
+        async_db, RetrievalQuery(center, test_user_data["id"], 5)
+    )
+
+    assert result.scanned == 20
+    assert {hit.document.id for hit in result.hits} == {target}
@@ -0,0 +1,95 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.workers.scheduler import (
+    FAST_LANE,
+    NORMAL_LANE,
+    FairShareScheduler,
+    InMemorySchedulerStore,
+    dispatch_pending,
+)
+
+
+def _drain(scheduler):
+    order = []
+    while True:
+        payload = scheduler.next()
+        if payload is None:
+            return order
+        order.append(payload["user_id"])
+
+
+def test_bulk_upload_does_not_starve_other_tenants():
+    """A single-document upload is served right after the bulk tenant's first job."""
+    scheduler = FairShareScheduler(InMemorySchedulerStore(), fast_lane_max_pages=5)
+    for i in range(50):
+        scheduler.submit("bulk", [f"bulk-{i}"], page_count=100)
+    scheduler.submit("single", ["single-0"], page_count=100)
+
+    order = _drain(scheduler)
+
+    assert len(order) == 51
+    assert order.index("single") <= 1
+
+
+def test_weights_control_share_of_dispatches():
+    """A tenant with weight 3 gets three jobs per round to another tenant's one."""
+    store = InMemorySchedulerStore()
+    store.set_weight("a", 3)
+    scheduler = FairShareScheduler(store, fast_lane_max_pages=0)
+    for i in range(6):
+        scheduler.submit("a", [f"a-{i}"], page_count=10)
+        scheduler.submit("b", [f"b-{i}"], page_count=10)
+
+    order = _drain(scheduler)
+
+    assert order[:8] == ["a", "a", "a", "b", "a", "a", "a", "b"]
+
+
+def test_small_documents_use_fast_lane_without_starving_bulk():
+    """Small documents jump ahead, but the normal lane still gets a turn after each burst."""
+    scheduler = FairShareScheduler(InMemorySchedulerStore(), fast_lane_max_pages=5, fast_lane_burst=2)
+    scheduler.submit("bulk", ["big"], page_count=500)
+    assert scheduler.submit("bulk", ["small-0"], page_count=1) == FAST_LANE
+    scheduler.submit("other", ["small-1"], page_count=2)
+    scheduler.submit("other", ["small-2"], page_count=2)
+
+    dispatched = []
+    while True:
+        payload = scheduler.next()
+        if payload is None:
+            break
+        dispatched.extend(payload["document_ids"])
+
+    assert dispatched[:2] == ["small-0", "small-1"]
+    assert dispatched[2] == "big"
+    assert dispatched[3] == "small-2"
+
+
+def test_depths_reported_per_tenant_and_lane():
+    scheduler = FairShareScheduler(InMemorySchedulerStore(), fast_lane_max_pages=5)
+    scheduler.submit("a", ["1"], page_count=1)
+    scheduler.submit("a", ["2"], page_count=50)
+    scheduler.submit("a", ["3"], page_count=50)
+
+    assert scheduler.depths() == {"a": {FAST_LANE: 1, NORMAL_LANE: 2}}
+
+
+class BrokenQueue:
+    count = 0
+
+    def enqueue(self, *args, **kwargs):
+        raise RedisConnectionError("connection refused")
+
+
+def test_failed_enqueue_puts_job_back_at_head_of_lane():
+    """A job the RQ queue refuses is not lost, and is still dispatched first."""
+    scheduler = FairShareScheduler(InMemorySchedulerStore(), fast_lane_max_pages=0)
+    scheduler.submit("a", ["first"], page_count=10)
+    scheduler.submit("a", ["second"], page_count=10)
+
+    with pytest.raises(RedisConnectionError):
+        dispatch_pending(scheduler, BrokenQueue())
+
+    assert scheduler.depths() == {"a": {FAST_LANE: 0, NORMAL_LANE: 2}}
+    assert scheduler.next()["document_ids"] == ["first"]
@@ -0,0 +1,220 @@
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+import pytest
+
+from app.retrieval import RetrievalQuery, RetrievalResult
+from app.retrieval.events import ADDED, REMOVED, InMemoryCorpusEvents
+from app.retrieval.shard_node import ResidentSlice, ShardNode, SliceCache, SliceSearchRequest, create_app
+from app.retrieval.sharded import ShardedBackend
+from app.retrieval.sharding import HashRing, InMemoryShardRegistry, slice_keys
+from tests.utils.vectors import FakeVectorSession, unit
+
+
+class _Fallback:
+    name = "fallback"
+    calls = 0
+
+    async def search(self, db, query):
+        self.calls += 1
+        return RetrievalResult()
+
+
+def _resident(embeddings, document_ids=None, version=0):
+    ids = [uuid.uuid4() for _ in embeddings]
+    document_ids = document_ids or [uuid.uuid4()] * len(embeddings)
+    index = {}
+    codes = [index.setdefault(d, len(index)) for d in document_ids]
+    matrix = np.vstack([unit(e) for e in embeddings]).astype(np.float32)
+    return ResidentSlice(ids, np.array(codes, dtype=np.int32), index, matrix, time.time(), version=version)
+
+
+def test_ring_spreads_slices_and_moves_few_when_a_node_joins():
+    keys = slice_keys(uuid.uuid4(), 2000)
+    before = HashRing([f"http://node-{i}" for i in range(4)])
+    after = HashRing([f"http://node-{i}" for i in range(5)])
+
+    owners = [before.node_for(key) for key in keys]
+    assert min(owners.count(node) for node in before.nodes) > 250
+
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+    # Only slices taken over by the new node move, about a fifth of them
+    assert all(after.node_for(key) == "http://node-4" for key in moved)
+    assert 200 < len(moved) < 700
+
+
+def test_registry_forgets_nodes_that_stop_beating():
+    registry = InMemoryShardRegistry(ttl=0.05)
+    registry.heartbeat("http://a")
+    registry.heartbeat("http://b")
+    registry.leave("http://b")
+    assert registry.live_nodes() == ["http://a"]
+
+    time.sleep(0.1)
+    assert registry.live_nodes() == []
+
+
+def test_resident_slice_search_is_exact_and_scoped():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 16))
+    documents = [uuid.uuid4(), uuid.uuid4()]
+    resident = _resident(embeddings, [documents[i % 2] for i in range(50)])
+    query = unit(embeddings[4])
+
+    hits, scanned, _ = resident.search(query, 3)
+    assert hits[0][0] == resident.ids[4]
+    assert scanned == 50
+
+    hits, scanned, _ = resident.search(query, 3, document_ids=[documents[1]])
+    assert scanned == 25
+    assert all(resident.ids.index(chunk_id) % 2 == 1 for chunk_id, _ in hits)
+
+
+def test_node_drops_slices_the_ring_moves_elsewhere():
+    registry = InMemoryShardRegistry()
+    loads = []
+
+    def loader(user_id, slice_no, slices):
+        loads.append(slice_no)
+        return _resident([[1.0, 0.0]])
+
+    node = ShardNode("http://a", registry, SliceCache(max_bytes=10 ** 9, loader=loader))
+    user_id = uuid.uuid4()
+    for slice_no in range(40):
+        node.search(SliceSearchRequest(user_id=user_id, slice=slice_no, slices=40, embedding=[1.0, 0.0], k=1))
+    node.heartbeat()
+    assert node.cache.stats()["slices"] == 40
+
+    registry.heartbeat("http://b")
+    node.heartbeat()
+    kept = node.cache.stats()["slices"]
+    assert 0 < kept < 40
+    assert kept == sum(node.ring.node_for(key) == "http://a" for key in slice_keys(user_id, 40))
+
+
+def test_slice_cache_evicts_least_recently_used():
+    cache = SliceCache(max_bytes=1, loader=lambda user_id, slice_no, slices: _resident([[1.0, 0.0]]))
+    cache.get("u", 0, 2)
+    cache.get("u", 1, 2)
+    assert cache.stats()["slices"] == 1
+
+
+def test_corpus_events_patch_resident_slices():
+    """Added documents are appended, removed ones evicted, and a version gap forces a reload."""
+    events = InMemoryCorpusEvents()
+    user_id = uuid.uuid4()
+    old_document, new_document = uuid.uuid4(), uuid.uuid4()
+    new_ids = [uuid.uuid4()]
+    cache = SliceCache(
+        max_bytes=10 ** 9,
+        loader=lambda user_id, slice_no, slices: _resident([[1.0, 0.0], [0.0, 1.0]], [old_document] * 2),
+        document_loader=lambda user_id, document_id, slice_no, slices: (new_ids, np.array([[0.6, 0.8]], dtype=np.float32)),
+    )
+    node = ShardNode("http://a", InMemoryShardRegistry(), cache, events)
+    stop_event = threading.Event()
+    threading.Thread(target=node.run_events, args=(stop_event,), daemon=True).start()
+    cache.get(user_id, 0, 1)
+    time.sleep(0.05)
+
+    try:
+        events.publish(user_id, new_document, ADDED)
+        resident = cache.get(user_id, 0, 1)
+        assert resident.version == 1
+        assert resident.search(np.array([0.6, 0.8], dtype=np.float32), 1)[0][0][0] == new_ids[0]
+
+        events.publish(user_id, old_document, REMOVED)
+        assert cache.get(user_id, 0, 1).ids == new_ids
+
+        events.publish(uuid.uuid4(), uuid.uuid4(), ADDED)  # other tenants are untouched
+        events._versions[str(user_id)] += 1  # an event lost in transit
+        events.publish(user_id, new_document, ADDED)
+        assert cache.stats()["slices"] == 0
+    finally:
+        stop_event.set()
+
+
+def test_reconcile_drops_slices_behind_the_corpus():
+    cache = SliceCache(max_bytes=10 ** 9, loader=lambda user_id, slice_no, slices: _resident([[1.0, 0.0]], version=3))
+    cache.get("current", 0, 1)
+    cache.get("behind", 0, 1)
+
+    assert cache.reconcile(lambda user_id: 3 if user_id == "current" else 4) == ["behind:0"]
+
+
+@pytest.mark.asyncio
+async def test_sharded_backend_merges_node_top_k():
+    """Each slice's owner is asked once, and their lists merge into the global top-k."""
+    rng = np.random.default_rng(1)
+    embeddings = list(rng.normal(size=(40, 8)))
+    db = FakeVectorSession(embeddings, batch_size=16)
+    ids = [row[0] for row in db.rows]
+    query = unit(embeddings[0])
+    registry = InMemoryShardRegistry()
+    registry.heartbeat("http://a")
+    registry.heartbeat("http://b")
+    backend = ShardedBackend(_Fallback(), registry, slices=4)
+    asked = []
+
+    async def fake_query(node, payload):
+        asked.append((node, payload["slice"]))
+        members = range(payload["slice"], len(ids), payload["slices"])
+        scores = {i: float(unit(embeddings[i]) @ query) for i in members}
+        top = sorted(scores, key=scores.get, reverse=True)[:payload["k"]]
+        return {
+            "hits": [{"chunk_id": str(ids[i]), "score": scores[i]} for i in top],
+            "scanned": len(scores),
+            "matched": len(scores),
+        }
+
+    backend._query = fake_query
+    result = await backend.search(db, RetrievalQuery(query, str(db.user_id), 5))
+
+    exact = np.argsort(-(np.vstack([unit(e) for e in embeddings]) @ query))[:5]
+    assert [hit.chunk.id for hit in result.hits] == [ids[i] for i in exact]
+    assert result.scanned == 40
+    assert sorted(slice_no for _, slice_no in asked) == [0, 1, 2, 3]
+    assert {node for node, _ in asked} <= {"http://a", "http://b"}
+
+
+@pytest.mark.asyncio
+async def test_sharded_backend_falls_back_without_nodes_or_on_errors():
+    registry = InMemoryShardRegistry()
+    fallback = _Fallback()
+    backend = ShardedBackend(fallback, registry, slices=2)
+
+    await backend.search(None, RetrievalQuery([1.0, 0.0], "user-1", 3))
+    assert fallback.calls == 1
+
+    async def failing_query(node, payload):
+        raise httpx.ConnectError("refused")
+
+    registry.heartbeat("http://a")
+    backend._ring_checked = 0.0
+    backend._query = failing_query
+    await backend.search(None, RetrievalQuery([1.0, 0.0], "user-1", 3))
+    await backend.search(None, RetrievalQuery([1.0, 0.0], "user-1", 3, filters={"page": 1}))
+    assert fallback.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_shard_node_requires_the_shared_secret():
+    """Only callers holding RETRIEVAL_SHARD_SECRET can search a node, and the backend sends it."""
+    registry = InMemoryShardRegistry()
+    node = ShardNode(
+        "http://a",
+        registry=registry,
+        cache=SliceCache(max_bytes=10 ** 9, loader=lambda user_id, slice_no, slices: _resident([[1.0, 0.0]])),
+        events=InMemoryCorpusEvents(),
+    )
+    node.heartbeat()
+    payload = {"user_id": str(uuid.uuid4()), "slice": 0, "slices": 1, "embedding": [1.0, 0.0], "k": 1}
+
+    async with httpx.AsyncClient(app=create_app(node, secret="s3cret")) as client:
+        assert (await client.post("http://a/search", json=payload)).status_code == 401
+
+        backend = ShardedBackend(_Fallback(), registry, slices=1, secret="s3cret")
+        backend._client = client
+        assert len((await backend._query("http://a", payload))["hits"]) == 1
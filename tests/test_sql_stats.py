@@ -0,0 +1,52 @@
+from app.core.sql_stats import EndpointSQLStats, RequestSQLStats, fingerprint, normalize_statement
+
+
+def test_fingerprint_ignores_literals_and_parameters():
+    """Queries differing only in values share a fingerprint."""
+    first = "SELECT * FROM documents WHERE user_id = %(user_id_1)s AND id IN (%(id_1)s, %(id_2)s) LIMIT 51"
+    second = "SELECT *  FROM documents\nWHERE user_id = $1 AND id IN ($2, $3, $4) LIMIT 11"
+    assert fingerprint(first) == fingerprint(second)
+    assert normalize_statement("SELECT 'a''b', x::uuid FROM t") == "SELECT ?, x::uuid FROM t"
+
+
+def test_endpoint_stats_aggregate_requests():
+    """Per-endpoint averages and heaviest statements accumulate across requests."""
+    registry = EndpointSQLStats()
+    for elapsed in (10.0, 30.0):
+        request = RequestSQLStats()
+        request.record("SELECT id FROM doc_chunks WHERE user_id = $1", elapsed, 5)
+        request.record("SELECT 1", 1.0, 1)
+        registry.record("POST /api/v1/chat", request, 100.0)
+
+    report = registry.snapshot()["POST /api/v1/chat"]
+    assert report["requests"] == 2
+    assert report["avg_sql_ms"] == 21.0
+    assert report["avg_statements"] == 2
+    heaviest = report["top_statements"][0]
+    assert heaviest["calls"] == 2
+    assert heaviest["max_ms"] == 30.0
+    assert heaviest["rows"] == 10
+
+
+def test_sql_report_requires_auth_and_debug(monkeypatch):
+    """The cross-endpoint SQL report is hidden from anonymous callers and outside DEBUG."""
+    from fastapi.testclient import TestClient
+
+    from app.core.config import settings
+    from app.main import app
+    from app.services.auth import auth_service
+
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "DEBUG", True)
+    assert client.get("/api/debug/debug/sql").status_code == 403
+
+    async def current_user():
+        return {"id": "user"}
+
+    app.dependency_overrides[auth_service.get_current_user] = current_user
+    try:
+        assert client.get("/api/debug/debug/sql").status_code == 200
+        monkeypatch.setattr(settings, "DEBUG", False)
+        assert client.get("/api/debug/debug/sql?reset=true").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
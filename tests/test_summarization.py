@@ -0,0 +1,85 @@
+import numpy as np
+
+from app.ml.summarization import SummarizationGenerator, split_sentences, textrank
+from tests.utils.vectors import unit
+
+generator = SummarizationGenerator()
+
+
+def _explicit_textrank(embeddings, personalization, damping=0.85):
+    weights = (1 + embeddings @ embeddings.T) / 2
+    np.fill_diagonal(weights, 0)
+    transition = weights / weights.sum(axis=0)  # column-stochastic
+    teleport = personalization / personalization.sum()
+    rank = np.full(len(embeddings), 1 / len(embeddings))
+    for _ in range(200):
+        rank = (1 - damping) * teleport + damping * transition @ rank
+    return rank
+
+
+def test_textrank_matches_the_explicit_graph():
+    rng = np.random.default_rng(0)
+    embeddings = np.vstack([unit(v) for v in rng.normal(size=(30, 8))])
+    personalization = np.maximum(embeddings @ unit(rng.normal(size=8)), 0)
+
+    np.testing.assert_allclose(
+        textrank(embeddings, personalization), _explicit_textrank(embeddings, personalization), atol=1e-5
+    )
+
+
+def test_select_chunks_prefers_central_then_novel_chunks():
+    rng = np.random.default_rng(1)
+    topic, other, outlier = (unit(v) for v in rng.normal(size=(3, 16)))
+    embeddings = [unit(topic + 0.05 * rng.normal(size=16)) for _ in range(6)]
+    embeddings += [unit(other + 0.05 * rng.normal(size=16)) for _ in range(3)]
+    embeddings.append(outlier)
+
+    order = generator.select_chunks(embeddings, max_length=30, diversity=0.5)
+
+    assert order[0] < 6  # from the largest cluster
+    assert 6 <= order[1] < 9  # the redundancy penalty moves on to the next topic
+    # A query pulls its own cluster to the front
+    assert generator.select_chunks(embeddings, query_embedding=outlier, max_length=10)[0] == 9
+
+
+def test_compose_honours_lengths_and_document_order():
+    chunks = [
+        (2, "Third chunk opens here. It has two sentences.", False),
+        (0, "carried over from before. The first chunk starts. Then it goes on.", True),
+    ]
+
+    summary = generator.compose(chunks, max_length=100, min_length=5)
+    assert summary == "The first chunk starts. Then it goes on. Third chunk opens here. It has two sentences."
+
+    assert generator.compose(chunks, max_length=8, min_length=5) == "Third chunk opens here. It has two sentences."
+    long_sentence = [(0, " ".join(["word"] * 50) + ".", False)]
+    assert len(generator.compose(long_sentence, max_length=20, min_length=10).split()) == 20
+
+
+def test_split_sentences_keeps_sentences_starting_a_chunk():
+    assert split_sentences("Already whole. Next one!", continues=True) == ["Already whole.", "Next one!"]
+    assert split_sentences("tail of a sentence. Next one.", continues=True) == ["Next one."]
+
+
+def test_summarize_chunks_uses_embeddings_and_falls_back_to_text():
+    rng = np.random.default_rng(2)
+    chunks = [
+        {"text": f"Sentence number {i} is here. Another sentence follows it.", "embedding": rng.normal(size=8), "chunk_index": i}
+        for i in range(5)
+    ]
+    summary = generator.summarize_chunks(chunks, max_length=12, min_length=5)
+    assert 5 <= len(summary.split()) <= 12
+
+    text_only = [{"text": chunk["text"]} for chunk in chunks]
+    assert generator.summarize_chunks(text_only, max_length=150, min_length=30)
+
+
+def test_text_fallback_counts_words_too():
+    """Without embeddings, max_length and min_length are still words, not characters."""
+    text = " ".join(f"Sentence {i} has exactly six words." for i in range(20))
+
+    summary = generator.summarize_chunks([{"text": text}], max_length=40, min_length=10)
+
+    assert 10 <= len(summary.split()) <= 40
+    assert len(summary) > 40
+    assert generator.get_model_info(40, 10)["max_length"] == 40
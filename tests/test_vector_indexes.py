@@ -0,0 +1,24 @@
+from app.workers.vector_indexes import needs_retune, recommended_lists, tenant_index_name
+
+
+def test_recommended_lists_scales_with_rows():
+    """rows/1000 up to a million rows, sqrt(rows) beyond."""
+    assert recommended_lists(0) == 1
+    assert recommended_lists(50_000) == 50
+    assert recommended_lists(1_000_000) == 1000
+    assert recommended_lists(4_000_000) == 2000
+
+
+def test_needs_retune_only_outside_factor():
+    """Indexes within the tolerance band are left alone."""
+    assert not needs_retune(100, 100_000, 2.0)
+    assert not needs_retune(100, 150_000, 2.0)
+    assert needs_retune(100, 500_000, 2.0)
+    assert needs_retune(100, 10_000, 2.0)
+    assert not needs_retune(None, 500_000, 2.0)
+
+
+def test_tenant_index_name_fits_postgres_identifier():
+    """Index names stay under Postgres' 63 character limit."""
+    name = tenant_index_name("8f14e45f-ceea-467f-a8b2-6f8c1c7d6e2a")
+    assert len(name) <= 63
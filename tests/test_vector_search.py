@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.ml.quantization import dequantize_int8, quantize_int8
+from app.retrieval.scan import stream_top_k
+from tests.utils.vectors import FakeVectorSession, unit
+
+
+@pytest.mark.asyncio
+async def test_stream_top_k_matches_brute_force():
+    """Batched heap selection returns the same winners as scoring everything at once."""
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(1000, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+    db = FakeVectorSession(list(embeddings), batch_size=64)
+
+    top = await stream_top_k(db, query, 7, batch_size=64, quantized=False)
+
+    scores = embeddings @ query / np.linalg.norm(embeddings, axis=1)
+    expected = [db.rows[i][0] for i in np.argsort(-scores)[:7]]
+    assert [hit.chunk.id for hit in top.hits] == expected
+    assert top.scanned == 1000
+    assert db.hydrated == 7
+
+
+@pytest.mark.asyncio
+async def test_stream_top_k_applies_min_similarity():
+    """Chunks below the threshold are neither returned nor counted as matches."""
+    embeddings = [np.array([1.0, 0.0]), np.array([0.0, 1.0]), np.array([0.9, 0.1])]
+    db = FakeVectorSession(embeddings, batch_size=2)
+
+    top = await stream_top_k(db, [1.0, 0.0], 5, min_similarity=0.5, batch_size=2, quantized=False)
+
+    assert [hit.chunk.id for hit in top.hits] == [db.rows[0][0], db.rows[2][0]]
+    assert top.matched == 2
+    assert top.scanned == 3
+
+
+def test_int8_quantization_round_trip():
+    """Dequantized vectors stay within half a quantization step of the original."""
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(50, 384)).astype(np.float32)
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert codes.nbytes * 4 == vectors.nbytes
+    assert np.all(np.abs(dequantize_int8(codes, scales) - vectors) <= scales[:, None] / 2 + 1e-6)
+
+
+@pytest.mark.asyncio
+async def test_quantized_scan_recall_matches_exact_search():
+    """int8 first pass plus exact re-scoring returns the exact top-k with exact scores."""
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(20, 384))
+    embeddings = (centers[rng.integers(0, 20, size=3000)] + 0.3 * rng.normal(size=(3000, 384))).astype(np.float32)
+    db = FakeVectorSession(list(embeddings), batch_size=500)
+
+    recalls = []
+    for query in centers[:10] + 0.3 * rng.normal(size=(10, 384)):
+        exact = await stream_top_k(db, query, 10, batch_size=500, quantized=False)
+        approx = await stream_top_k(db, query, 10, batch_size=500, quantized=True)
+        exact_ids = {hit.chunk.id for hit in exact.hits}
+        recalls.append(len(exact_ids & {hit.chunk.id for hit in approx.hits}) / 10)
+        for hit in approx.hits:
+            assert hit.score == pytest.approx(
+                float(db.embeddings[hit.chunk.id] @ unit(query)),
+                abs=1e-5,
+            )
+
+    assert np.mean(recalls) >= 0.99
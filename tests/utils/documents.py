@@ -0,0 +1,21 @@
+"""Test utility functions for document operations."""
+import uuid
+
+from app.models.database import Document
+
+
+def create_document(db, user_id, **overrides):
+    """Create and commit an uploaded document owned by user_id."""
+    fields = {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "title": "test.pdf",
+        "storage_path": "/tmp/test.pdf",
+        "status": "uploaded",
+        "meta_info": {},
+    }
+    fields.update(overrides)
+    document = Document(**fields)
+    db.add(document)
+    db.commit()
+    return document
@@ -0,0 +1,66 @@
+"""In-memory stand-in for an AsyncSession serving doc_chunks embeddings."""
+import uuid
+
+import numpy as np
+
+from app.ml.quantization import codes_to_bytes, quantize_int8
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _FakeStream:
+    def __init__(self, rows, batch_size):
+        self.rows = rows
+        self.batch_size = batch_size
+
+    async def partitions(self):
+        for start in range(0, len(self.rows), self.batch_size):
+            yield self.rows[start:start + self.batch_size]
+
+
+class _FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class _FakeChunk:
+    def __init__(self, chunk_id, embedding):
+        self.id = chunk_id
+        self.embedding = embedding
+
+
+class FakeVectorSession:
+    """Serves (id, user_id, vector) rows in batches and hydrates any requested id.
+
+    Embeddings are stored unit length, as EmbeddingGenerator produces them.
+    """
+
+    def __init__(self, embeddings, batch_size):
+        self.user_id = uuid.uuid4()
+        self.embeddings = {uuid.uuid4(): unit(embedding) for embedding in embeddings}
+        self.rows = [(chunk_id, self.user_id, embedding) for chunk_id, embedding in self.embeddings.items()]
+        codes, scales = quantize_int8(np.vstack(list(self.embeddings.values())))
+        self.quantized_rows = [
+            (chunk_id, self.user_id, codes_to_bytes(code), scale)
+            for chunk_id, code, scale in zip(self.embeddings, codes, scales)
+        ]
+        self.batch_size = batch_size
+        self.hydrated = 0
+
+    async def stream(self, statement):
+        quantized = statement.selected_columns[2].key == "embedding_q"
+        return _FakeStream(self.quantized_rows if quantized else self.rows, self.batch_size)
+
+    async def execute(self, statement):
+        ids = next(
+            clause.right.value for clause in statement.whereclause.clauses
+            if clause.left.key == "id"
+        )
+        self.hydrated = len(ids)
+        return _FakeResult([(_FakeChunk(chunk_id, self.embeddings[chunk_id]), None) for chunk_id in ids])